@@ -7,11 +7,14 @@ from copy import copy, deepcopy
 import numpy as np
 from itertools import chain
 from scipy.optimize import linear_sum_assignment
-from shapely import geometry, affinity
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 
 from cvat.apps.engine.models import ShapeType
 from cvat.apps.engine.serializers import LabeledDataSerializer
 
+from .similarity import shape_iou_candidates
+
 
 class AnnotationIR:
     def __init__(self, data=None):
@@ -100,15 +103,23 @@ class AnnotationIR:
                 track, start, stop)
             scoped_shapes = filter_track_shapes(interpolated_shapes)
 
+            # Keyframes of the segment get attributes carried forward
+            # from the keyframes of previous segments
+            keyframe_attributes = {shape['frame']: shape['attributes']
+                for shape in interpolated_shapes if shape['keyframe']}
+            for shape in segment_shapes:
+                shape['attributes'] = deepcopy(keyframe_attributes[shape['frame']])
+
+            # Interpolated shapes share nested values with the track keyframes
             if scoped_shapes:
                 if not scoped_shapes[0]['keyframe']:
-                    segment_shapes.insert(0, scoped_shapes[0])
+                    segment_shapes.insert(0, deepcopy(scoped_shapes[0]))
                 if not scoped_shapes[-1]['keyframe'] and \
                         scoped_shapes[-1]['outside']:
-                    segment_shapes.append(scoped_shapes[-1])
+                    segment_shapes.append(deepcopy(scoped_shapes[-1]))
                 elif stop + 1 < len(interpolated_shapes) and \
                         interpolated_shapes[stop + 1]['outside']:
-                    segment_shapes.append(interpolated_shapes[stop + 1])
+                    segment_shapes.append(deepcopy(interpolated_shapes[stop + 1]))
 
             for shape in segment_shapes:
                 shape.pop('keyframe', None)
@@ -125,15 +136,19 @@ class AnnotationIR:
             for t in self.tags if self._is_shape_inside(t, start, stop)]
         splitted_data.shapes = [deepcopy(s)
             for s in self.shapes if self._is_shape_inside(s, start, stop)]
+        splitted_data.tracks = self._slice_tracks(self.tracks, start, stop)
+
+        return splitted_data
+
+    @classmethod
+    def _slice_tracks(cls, tracks, start, stop):
         splitted_tracks = []
-        for t in self.tracks:
-            if self._is_track_inside(t, start, stop):
-                track = self._slice_track(t, start, stop)
+        for t in tracks:
+            if cls._is_track_inside(t, start, stop):
+                track = cls._slice_track(t, start, stop)
                 if 0 < len(track['shapes']):
                     splitted_tracks.append(track)
-        splitted_data.tracks = splitted_tracks
-
-        return splitted_data
+        return splitted_tracks
 
     def reset(self):
         self.version = 0
@@ -155,11 +170,22 @@ class AnnotationManager:
         tracks = TrackManager(self.data.tracks)
         tracks.merge(data.tracks, start_frame, overlap)
 
-    def to_shapes(self, end_frame):
+    def append(self, data, start_frame):
+        # The same as merge() for data which doesn't intersect with the
+        # existing one, e.g. segments without overlap. There is nothing
+        # to match, only open tracks are finished on the start frame.
+        for track in self.data.tracks:
+            TrackManager._modify_unmached_object(track, start_frame)
+
+        self.data.tags.extend(data.tags)
+        self.data.shapes.extend(data.shapes)
+        self.data.tracks.extend(data.tracks)
+
+    def to_shapes(self, end_frame, interpolation_cache=None):
         shapes = self.data.shapes
         tracks = TrackManager(self.data.tracks)
 
-        return shapes + tracks.to_shapes(end_frame)
+        return list(chain(shapes, tracks.to_shapes(end_frame, interpolation_cache)))
 
     def to_tracks(self):
         tracks = self.data.tracks
@@ -191,6 +217,27 @@ class ObjectManager:
     def _calc_objects_similarity(obj0, obj1, start_frame, overlap):
         raise NotImplementedError()
 
+    @classmethod
+    def _calc_objects_similarity_matrix(cls, objects0, objects1, start_frame, overlap):
+        similarity = np.empty(shape=(len(objects0), len(objects1)), dtype=float)
+        for i, obj0 in enumerate(objects0):
+            for j, obj1 in enumerate(objects1):
+                similarity[i][j] = cls._calc_objects_similarity(
+                    obj0, obj1, start_frame, overlap)
+        return similarity
+
+    def _match_objects(self, int_objects, old_objects, start_frame, overlap):
+        # 5. Construct cost matrix for the frame.
+        cost_matrix = 1 - self._calc_objects_similarity_matrix(
+            int_objects, old_objects, start_frame, overlap)
+
+        # 6. Find optimal solution using Hungarian algorithm. Reject
+        # the solution if the cost is too high.
+        min_cost_thresh = self._get_cost_threshold()
+        row_ind, col_ind = linear_sum_assignment(cost_matrix)
+        return [(i, j) for i, j in zip(row_ind, col_ind)
+            if cost_matrix[i][j] <= min_cost_thresh]
+
     @staticmethod
     def _unite_objects(obj0, obj1):
         raise NotImplementedError()
@@ -227,30 +274,19 @@ class ObjectManager:
         # 4. Build cost matrix for each frame and find correspondence using
         # Hungarian algorithm. In this case min_cost_thresh is stronger
         # because we compare only on one frame.
-        min_cost_thresh = self._get_cost_threshold()
         for frame in int_objects_by_frame:
             if frame in old_objects_by_frame:
                 int_objects = int_objects_by_frame[frame]
                 old_objects = old_objects_by_frame[frame]
-                cost_matrix = np.empty(shape=(len(int_objects), len(old_objects)),
-                    dtype=float)
-                # 5.1 Construct cost matrix for the frame.
-                for i, int_obj in enumerate(int_objects):
-                    for j, old_obj in enumerate(old_objects):
-                        cost_matrix[i][j] = 1 - self._calc_objects_similarity(
-                            int_obj, old_obj, start_frame, overlap)
-
-                # 6. Find optimal solution using Hungarian algorithm.
-                row_ind, col_ind = linear_sum_assignment(cost_matrix)
+                # 5-6. Find optimal solution for the frame.
                 old_objects_indexes = list(range(0, len(old_objects)))
                 int_objects_indexes = list(range(0, len(int_objects)))
-                for i, j in zip(row_ind, col_ind):
-                    # Reject the solution if the cost is too high. Remember
-                    # inside int_objects_indexes objects which were handled.
-                    if cost_matrix[i][j] <= min_cost_thresh:
-                        old_objects[j] = self._unite_objects(int_objects[i], old_objects[j])
-                        int_objects_indexes[i] = -1
-                        old_objects_indexes[j] = -1
+                for i, j in self._match_objects(int_objects, old_objects,
+                        start_frame, overlap):
+                    # Remember inside int_objects_indexes objects which were handled.
+                    old_objects[j] = self._unite_objects(int_objects[i], old_objects[j])
+                    int_objects_indexes[i] = -1
+                    old_objects_indexes[j] = -1
 
                 # 7. Add all new objects which were not processed.
                 for i in int_objects_indexes:
@@ -286,15 +322,6 @@ class TagManager(ObjectManager):
     def _modify_unmached_object(obj, end_frame):
         pass
 
-def pairwise(iterable):
-    a = iter(iterable)
-    return zip(a, a)
-
-def rotbox2Polygon(rbox):
-    cx, cy, ww, hh, angle = rbox
-    w, h = ww / 2, hh / 2
-    return affinity.rotate(geometry.box(cx-w, cy-h, cx+w, cy+h), angle, origin="centroid")
-
 class ShapeManager(ObjectManager):
     def to_tracks(self):
         tracks = []
@@ -326,37 +353,76 @@ class ShapeManager(ObjectManager):
 
     @staticmethod
     def _calc_objects_similarity(obj0, obj1, start_frame, overlap):
-        def _calc_polygons_similarity(p0, p1):
-            if p0.is_valid and p1.is_valid: # check validity of polygons
-                overlap_area = p0.intersection(p1).area
-                if p0.area == 0 or p1.area == 0: # a line with many points
-                    return 0
-                else:
-                    return overlap_area / (p0.area + p1.area - overlap_area)
-            else:
-                return 0 # if there's invalid polygon, assume similarity is 0
-
-        has_same_type  = obj0["type"] == obj1["type"]
-        has_same_label = obj0.get("label_id") == obj1.get("label_id")
-        if has_same_type and has_same_label:
-            if obj0["type"] == ShapeType.RECTANGLE:
-                p0 = geometry.box(*obj0["points"])
-                p1 = geometry.box(*obj1["points"])
-
-                return _calc_polygons_similarity(p0, p1)
-            elif obj0["type"] == ShapeType.POLYGON:
-                p0 = geometry.Polygon(pairwise(obj0["points"]))
-                p1 = geometry.Polygon(pairwise(obj1["points"]))
-
-                return _calc_polygons_similarity(p0, p1)
-            elif obj0["type"] == ShapeType.ROTBOX:
-                p0 = geometry.Polygon(pairwise(obj0["points"]))
-                p1 = geometry.Polygon(pairwise(obj1["points"]))
-
-                return _calc_polygons_similarity(p0, p1)
-            else:
-                return 0 # FIXME: need some similarity for points and polylines
-        return 0
+        return ShapeManager._calc_objects_similarity_matrix(
+            [obj0], [obj1], start_frame, overlap)[0][0]
+
+    @staticmethod
+    def _calc_candidates_similarity(objects0, objects1):
+        # Only shapes of the same type and label with intersecting bounding
+        # boxes can be similar. Similarity of other pairs is 0.
+        rows, cols, similarity = [], [], []
+        types0 = np.array([obj["type"] for obj in objects0])
+        types1 = np.array([obj["type"] for obj in objects1])
+        labels0 = np.array([obj.get("label_id") for obj in objects0])
+        labels1 = np.array([obj.get("label_id") for obj in objects1])
+        for shape_type in set(types0) & set(types1):
+            type_rows = np.nonzero(types0 == shape_type)[0]
+            type_cols = np.nonzero(types1 == shape_type)[0]
+            r, c, iou = shape_iou_candidates(shape_type,
+                [objects0[i]["points"] for i in type_rows],
+                [objects1[j]["points"] for j in type_cols])
+            r, c = type_rows[r], type_cols[c]
+            same_label = labels0[r] == labels1[c]
+            rows.append(r[same_label])
+            cols.append(c[same_label])
+            similarity.append(iou[same_label])
+
+        if not rows:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0)
+        return np.concatenate(rows), np.concatenate(cols), np.concatenate(similarity)
+
+    @classmethod
+    def _calc_objects_similarity_matrix(cls, objects0, objects1, start_frame, overlap):
+        similarity = np.zeros(shape=(len(objects0), len(objects1)), dtype=float)
+        rows, cols, values = cls._calc_candidates_similarity(objects0, objects1)
+        similarity[rows, cols] = values
+        return similarity
+
+    def _match_objects(self, int_objects, old_objects, start_frame, overlap):
+        # Only pairs with an acceptable cost are considered. They form
+        # independent connected components, which are matched separately
+        # by small assignment problems instead of a dense cost matrix.
+        min_cost_thresh = self._get_cost_threshold()
+        rows, cols, similarity = self._calc_candidates_similarity(int_objects, old_objects)
+        costs = 1 - similarity
+        acceptable = costs <= min_cost_thresh
+        rows, cols, costs = rows[acceptable], cols[acceptable], costs[acceptable]
+        if not len(rows):
+            return []
+
+        rows_count = len(int_objects)
+        graph = coo_matrix((np.ones(len(rows)), (rows, rows_count + cols)),
+            shape=(rows_count + len(old_objects),) * 2)
+        _, components = connected_components(graph, directed=False)
+
+        matches = []
+        edges_by_component = np.argsort(components[rows], kind='stable')
+        split_points = np.nonzero(np.diff(components[rows][edges_by_component]))[0] + 1
+        for edges in np.split(edges_by_component, split_points):
+            if len(edges) == 1:
+                matches.append((rows[edges[0]], cols[edges[0]]))
+                continue
+
+            component_rows, edge_rows = np.unique(rows[edges], return_inverse=True)
+            component_cols, edge_cols = np.unique(cols[edges], return_inverse=True)
+            cost_matrix = np.ones((len(component_rows), len(component_cols)))
+            cost_matrix[edge_rows, edge_cols] = costs[edges]
+            row_ind, col_ind = linear_sum_assignment(cost_matrix)
+            matches.extend((component_rows[i], component_cols[j])
+                for i, j in zip(row_ind, col_ind)
+                if cost_matrix[i][j] <= min_cost_thresh)
+
+        return matches
 
     @staticmethod
     def _unite_objects(obj0, obj1):
@@ -368,14 +434,21 @@ class ShapeManager(ObjectManager):
         pass
 
 class TrackManager(ObjectManager):
-    def to_shapes(self, end_frame):
+    def to_shapes(self, end_frame, interpolation_cache=None):
         shapes = []
         for idx, track in enumerate(self.objects):
-            for shape in TrackManager.get_interpolated_shapes(track, 0, end_frame):
+            if interpolation_cache is not None:
+                track_shapes = interpolation_cache.get_interpolated_shapes(
+                    track, 0, end_frame)
+            else:
+                track_shapes = TrackManager.iter_interpolated_shapes(track, 0, end_frame)
+
+            for shape in track_shapes:
+                shape = copy(shape)
                 shape["label_id"] = track["label_id"]
                 shape["group"] = track["group"]
                 shape["track_id"] = idx
-                shape["attributes"] += track["attributes"]
+                shape["attributes"] = shape["attributes"] + track["attributes"]
                 shapes.append(shape)
         return shapes
 
@@ -399,34 +472,56 @@ class TrackManager(ObjectManager):
 
     @staticmethod
     def _calc_objects_similarity(obj0, obj1, start_frame, overlap):
-        if obj0["label_id"] == obj1["label_id"]:
-            # Here start_frame is the start frame of next segment
-            # and stop_frame is the stop frame of current segment
-            # end_frame == stop_frame + 1
-            end_frame = start_frame + overlap
-            obj0_shapes = TrackManager.get_interpolated_shapes(obj0, start_frame, end_frame)
-            obj1_shapes = TrackManager.get_interpolated_shapes(obj1, start_frame, end_frame)
-            obj0_shapes_by_frame = {shape["frame"]:shape for shape in obj0_shapes}
-            obj1_shapes_by_frame = {shape["frame"]:shape for shape in obj1_shapes}
-            assert obj0_shapes_by_frame and obj1_shapes_by_frame
-
-            count, error = 0, 0
-            for frame in range(start_frame, end_frame):
-                shape0 = obj0_shapes_by_frame.get(frame)
-                shape1 = obj1_shapes_by_frame.get(frame)
-                if shape0 and shape1:
-                    if shape0["outside"] != shape1["outside"]:
-                        error += 1
-                    else:
-                        error += 1 - ShapeManager._calc_objects_similarity(shape0, shape1, start_frame, overlap)
-                    count += 1
-                elif shape0 or shape1:
-                    error += 1
-                    count += 1
+        return TrackManager._calc_objects_similarity_matrix(
+            [obj0], [obj1], start_frame, overlap)[0][0]
 
-            return 1 - error / count
-        else:
-            return 0
+    @staticmethod
+    def _get_shapes_by_frame(track, start_frame, end_frame):
+        return {shape["frame"]: shape
+            for shape in TrackManager.get_interpolated_shapes(track, start_frame, end_frame)
+            if start_frame <= shape["frame"] < end_frame}
+
+    @classmethod
+    def _calc_objects_similarity_matrix(cls, objects0, objects1, start_frame, overlap):
+        # Here start_frame is the start frame of next segment
+        # and stop_frame is the stop frame of current segment
+        # end_frame == stop_frame + 1
+        end_frame = start_frame + overlap
+        # Each track is interpolated once, then shapes of all tracks
+        # are compared on each frame at once
+        shapes0 = [cls._get_shapes_by_frame(obj, start_frame, end_frame) for obj in objects0]
+        shapes1 = [cls._get_shapes_by_frame(obj, start_frame, end_frame) for obj in objects1]
+
+        error = np.zeros((len(objects0), len(objects1)))
+        count = np.zeros((len(objects0), len(objects1)))
+        for frame in range(start_frame, end_frame):
+            rows = [i for i, shapes in enumerate(shapes0) if frame in shapes]
+            cols = [j for j, shapes in enumerate(shapes1) if frame in shapes]
+            present0 = np.zeros(len(objects0), dtype=bool)
+            present0[rows] = True
+            present1 = np.zeros(len(objects1), dtype=bool)
+            present1[cols] = True
+            # A shape on the frame only in one of the tracks is an error
+            either = present0[:, None] | present1[None, :]
+            error += either
+            count += either
+
+            if rows and cols:
+                frame_shapes0 = [shapes0[i][frame] for i in rows]
+                frame_shapes1 = [shapes1[j][frame] for j in cols]
+                outside0 = np.array([shape["outside"] for shape in frame_shapes0])
+                outside1 = np.array([shape["outside"] for shape in frame_shapes1])
+                similarity = ShapeManager._calc_objects_similarity_matrix(
+                    frame_shapes0, frame_shapes1, start_frame, overlap)
+                error[np.ix_(rows, cols)] -= np.where(
+                    outside0[:, None] != outside1[None, :], 0, similarity)
+
+        similarity = np.zeros((len(objects0), len(objects1)))
+        np.divide(count - error, count, out=similarity, where=count > 0)
+        labels0 = np.array([obj["label_id"] for obj in objects0])
+        labels1 = np.array([obj["label_id"] for obj in objects1])
+        similarity[labels0[:, None] != labels1[None, :]] = 0
+        return similarity
 
     @staticmethod
     def _modify_unmached_object(obj, end_frame):
@@ -439,26 +534,33 @@ class TrackManager(ObjectManager):
 
     @staticmethod
     def get_interpolated_shapes(track, start_frame, end_frame):
-        def copy_shape(source, frame, points=None):
-            copied = deepcopy(source)
-            copied["keyframe"] = False
+        return list(TrackManager.iter_interpolated_shapes(track, start_frame, end_frame))
+
+    @staticmethod
+    def iter_interpolated_shapes(track, start_frame, end_frame):
+        # Returned shapes are shallow copies of the track keyframes,
+        # so they share attributes and other nested values with the track
+        # and must not be modified in place
+        def copy_shape(source, frame, points=None, keyframe=False, attributes=None):
+            copied = copy(source)
+            copied["keyframe"] = keyframe
             copied["frame"] = frame
             if points is not None:
                 copied["points"] = points
+            if attributes is not None:
+                copied["attributes"] = attributes
             return copied
 
         def simple_interpolation(shape0, shape1):
-            shapes = []
             distance = shape1["frame"] - shape0["frame"]
             diff = np.subtract(shape1["points"], shape0["points"])
+            # Points of all frames between the keyframes are computed at once
+            offsets = np.arange(1, distance)[:, np.newaxis] / distance
+            points = np.asarray(shape0["points"]) + diff * offsets
 
-            for frame in range(shape0["frame"] + 1, shape1["frame"]):
-                offset = (frame - shape0["frame"]) / distance
-                points = shape0["points"] + diff * offset
-
-                shapes.append(copy_shape(shape0, frame, points.tolist()))
-
-            return shapes
+            return (copy_shape(shape0, frame, frame_points)
+                for frame, frame_points in zip(
+                    range(shape0["frame"] + 1, shape1["frame"]), points.tolist()))
 
         def points_interpolation(shape0, shape1):
             if len(shape0["points"]) == 2 and len(shape1["points"]) == 2:
@@ -670,8 +772,10 @@ class TrackManager(ObjectManager):
             shapes = []
             is_polygon = shape0["type"] == ShapeType.POLYGON
             if is_polygon:
-                shape0["points"].extend(shape0["points"][:2])
-                shape1["points"].extend(shape1["points"][:2])
+                shape0 = copy(shape0)
+                shape0["points"] = shape0["points"] + shape0["points"][:2]
+                shape1 = copy(shape1)
+                shape1["points"] = shape1["points"] + shape1["points"][:2]
 
             distance = shape1["frame"] - shape0["frame"]
             for frame in range(shape0["frame"] + 1, shape1["frame"]):
@@ -681,8 +785,6 @@ class TrackManager(ObjectManager):
                 shapes.append(copy_shape(shape0, frame, points))
 
             if is_polygon:
-                shape0["points"] = shape0["points"][:-2]
-                shape1["points"] = shape1["points"][:-2]
                 for shape in shapes:
                     shape["points"] = shape["points"][:-2]
 
@@ -712,20 +814,24 @@ class TrackManager(ObjectManager):
 
             return shapes
 
-        shapes = []
         curr_frame = track["shapes"][0]["frame"]
         prev_shape = {}
         for shape in track["shapes"]:
+            attributes = shape["attributes"]
             if prev_shape:
                 assert shape["frame"] > curr_frame
-                for attr in prev_shape["attributes"]:
-                    if attr["spec_id"] not in map(lambda el: el["spec_id"], shape["attributes"]):
-                        shape["attributes"].append(deepcopy(attr))
-                if not prev_shape["outside"]:
-                    shapes.extend(interpolate(prev_shape, shape))
-
-            shape["keyframe"] = True
-            shapes.append(shape)
+                # Attributes are carried forward from the previous keyframe
+                # into a new list, the keyframe of the track isn't changed
+                spec_ids = {attr["spec_id"] for attr in attributes}
+                attributes = attributes + [attr for attr in prev_shape["attributes"]
+                    if attr["spec_id"] not in spec_ids]
+            shape = copy_shape(shape, shape["frame"], keyframe=True,
+                attributes=attributes)
+
+            if prev_shape and not prev_shape["outside"]:
+                yield from interpolate(prev_shape, shape)
+
+            yield shape
             curr_frame = shape["frame"]
             prev_shape = shape
 
@@ -734,11 +840,9 @@ class TrackManager(ObjectManager):
                 break
 
         if not prev_shape["outside"]:
-            shape = deepcopy(prev_shape)
+            shape = copy(prev_shape)
             shape["frame"] = end_frame
-            shapes.extend(interpolate(prev_shape, shape))
-
-        return shapes
+            yield from interpolate(prev_shape, shape)
 
     @staticmethod
     def _unite_objects(obj0, obj1):
@@ -756,3 +860,21 @@ class TrackManager(ObjectManager):
         track["shapes"] = list(sorted(shapes.values(), key=lambda shape: shape["frame"]))
 
         return track
+
+class InterpolationCache:
+    # Keeps interpolated shapes of the annotation tracks, so each track is
+    # interpolated once when an exporter reads the annotations several times.
+    # Cached shapes are shared between the readers and must not be modified.
+    def __init__(self, annotation_ir):
+        self._annotation_ir = annotation_ir
+        self._shapes = {}
+
+    def get_interpolated_shapes(self, track, start_frame, end_frame):
+        key = (id(track), self._annotation_ir.version, start_frame, end_frame)
+        cached = self._shapes.get(key)
+        # The track is kept in the cache, so its id can't be reused by another one
+        if cached is None or cached[0] is not track:
+            cached = (track, TrackManager.get_interpolated_shapes(
+                track, start_frame, end_frame))
+            self._shapes[key] = cached
+        return cached[1]
@@ -6,6 +6,7 @@
 import os.path as osp
 import sys
 from collections import namedtuple
+from copy import copy
 from pathlib import Path
 from typing import (Any, Callable, DefaultDict, Dict, List, Literal, Mapping,
     NamedTuple, OrderedDict, Tuple, Union)
@@ -21,7 +22,7 @@ from cvat.apps.engine.models import AttributeType, DimensionType
 from cvat.apps.engine.models import Image as Img
 from cvat.apps.engine.models import Label, Project, ShapeType, Task
 
-from .annotation import AnnotationIR, AnnotationManager, TrackManager
+from .annotation import AnnotationIR, AnnotationManager, InterpolationCache
 
 
 class InstanceLabelData:
@@ -121,6 +122,17 @@ class InstanceLabelData:
         return exported_attributes
 
 
+def _get_tracked_shape(shape, track, track_id):
+    # Interpolated shapes are shared, so track fields are set on a copy
+    tracked_shape = copy(shape)
+    tracked_shape["attributes"] = shape["attributes"] + track["attributes"]
+    tracked_shape["track_id"] = track_id
+    tracked_shape["group"] = track["group"]
+    tracked_shape["source"] = track["source"]
+    tracked_shape["label_id"] = track["label_id"]
+    return tracked_shape
+
+
 class TaskData(InstanceLabelData):
     Shape = namedtuple("Shape", 'id, label_id')  # 3d
     LabeledShape = namedtuple(
@@ -138,6 +150,7 @@ class TaskData(InstanceLabelData):
 
     def __init__(self, annotation_ir, db_task, host='', create_callback=None):
         self._annotation_ir = annotation_ir
+        self._interpolation_cache = InterpolationCache(annotation_ir)
         self._db_task = db_task
         self._host = host
         self._create_callback = create_callback
@@ -195,7 +208,7 @@ class TaskData(InstanceLabelData):
             ("overlap", str(db_task.overlap)),
             ("bugtracker", db_task.bug_tracker),
             ("created", str(timezone.localtime(db_task.created_date))),
-            ("updated", str(timezone.localtime(db_task.updated_date))),
+            ("updated", str(timezone.localtime(db_task.get_updated_date()))),
             ("subset", db_task.subset or datum_extractor.DEFAULT_SUBSET_NAME),
             ("start_frame", str(db_task.data.start_frame)),
             ("stop_frame", str(db_task.data.stop_frame)),
@@ -335,7 +348,8 @@ class TaskData(InstanceLabelData):
 
         anno_manager = AnnotationManager(self._annotation_ir)
         shape_data = ''
-        for shape in sorted(anno_manager.to_shapes(self._db_task.data.size),
+        for shape in sorted(anno_manager.to_shapes(self._db_task.data.size,
+                    self._interpolation_cache),
                 key=lambda shape: shape.get("z_order", 0)):
             if shape['frame'] not in self._frame_info:
                 # After interpolation there can be a finishing frame
@@ -369,20 +383,14 @@ class TaskData(InstanceLabelData):
     @property
     def tracks(self):
         for idx, track in enumerate(self._annotation_ir.tracks):
-            tracked_shapes = TrackManager.get_interpolated_shapes(
+            tracked_shapes = self._interpolation_cache.get_interpolated_shapes(
                 track, 0, self._db_task.data.size)
-            for tracked_shape in tracked_shapes:
-                tracked_shape["attributes"] += track["attributes"]
-                tracked_shape["track_id"] = idx
-                tracked_shape["group"] = track["group"]
-                tracked_shape["source"] = track["source"]
-                tracked_shape["label_id"] = track["label_id"]
 
             yield TaskData.Track(
                 label=self._get_label_name(track["label_id"]),
                 group=track["group"],
                 source=track["source"],
-                shapes=[self._export_tracked_shape(shape)
+                shapes=[self._export_tracked_shape(_get_tracked_shape(shape, track, idx))
                     for shape in tracked_shapes],
             )
 
@@ -521,6 +529,7 @@ class ProjectData(InstanceLabelData):
 
     def __init__(self, annotation_irs: Mapping[str, AnnotationIR], db_project: Project, host: str, create_callback: Callable = None):
         self._annotation_irs = annotation_irs
+        self._interpolation_caches: Dict[int, InterpolationCache] = {}
         self._db_project = db_project
         self._db_tasks: OrderedDict[int, Task] = OrderedDict(
             ((db_task.id, db_task) for db_task in db_project.tasks.order_by("subset","id").all())
@@ -603,7 +612,7 @@ class ProjectData(InstanceLabelData):
                 ('name', self._db_project.name),
                 ("bugtracker", self._db_project.bug_tracker),
                 ("created", str(timezone.localtime(self._db_project.created_date))),
-                ("updated", str(timezone.localtime(self._db_project.updated_date))),
+                ("updated", str(timezone.localtime(self._db_project.get_updated_date()))),
                 ("tasks", [
                     ('task',
                         TaskData.meta_for_task(db_task, self._host)
@@ -704,7 +713,8 @@ class ProjectData(InstanceLabelData):
 
         for task in self._db_tasks.values():
             anno_manager = AnnotationManager(self._annotation_irs[task.id])
-            for shape in sorted(anno_manager.to_shapes(task.data.size),
+            for shape in sorted(anno_manager.to_shapes(task.data.size,
+                        self._get_interpolation_cache(task.id)),
                     key=lambda shape: shape.get("z_order", 0)):
                 if (task.id, shape['frame']) not in self._frame_info:
                     continue
@@ -732,20 +742,14 @@ class ProjectData(InstanceLabelData):
         idx = 0
         for task in self._db_tasks.values():
             for track in self._annotation_irs[task.id].tracks:
-                tracked_shapes = TrackManager.get_interpolated_shapes(
-                    track, 0, task.data.size
-                )
-                for tracked_shape in tracked_shapes:
-                    tracked_shape["attributes"] += track["attributes"]
-                    tracked_shape["track_id"] = idx
-                    tracked_shape["group"] = track["group"]
-                    tracked_shape["source"] = track["source"]
-                    tracked_shape["label_id"] = track["label_id"]
+                tracked_shapes = self._get_interpolation_cache(task.id) \
+                    .get_interpolated_shapes(track, 0, task.data.size)
                 yield ProjectData.Track(
                     label=self._get_label_name(track["label_id"]),
                     group=track["group"],
                     source=track["source"],
-                    shapes=[self._export_tracked_shape(shape, task.id)
+                    shapes=[self._export_tracked_shape(
+                            _get_tracked_shape(shape, track, idx), task.id)
                         for shape in tracked_shapes],
                     task_id=task.id
                 )
@@ -785,6 +789,12 @@ class ProjectData(InstanceLabelData):
     def tasks(self):
         return list(self._db_tasks.values())
 
+    def _get_interpolation_cache(self, task_id: int) -> InterpolationCache:
+        if task_id not in self._interpolation_caches:
+            self._interpolation_caches[task_id] = InterpolationCache(
+                self._annotation_irs[task_id])
+        return self._interpolation_caches[task_id]
+
     @property
     def task_data(self):
         for task_id, task in self._db_tasks.items():
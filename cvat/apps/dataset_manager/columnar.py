@@ -0,0 +1,241 @@
+# Copyright (C) 2021 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+# Columnar representation of annotations for large tasks. Tags and shapes
+# are kept in a few flat arrays sorted by frame instead of lists of dicts,
+# so they take several times less memory and a range of frames is sliced
+# without copying. Dicts are created only when objects are read.
+
+from array import array
+from collections.abc import Sequence
+
+import numpy as np
+
+from .annotation import AnnotationIR
+
+# The number of objects, which are converted into dicts at once
+ITER_CHUNK_SIZE = 2 ** 12
+
+def _take_ragged(values, offsets, order):
+    # Reorders variable-length rows of a flat array with (N + 1) offsets
+    counts = np.diff(offsets)[order]
+    new_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(counts, out=new_offsets[1:])
+    indexes = np.repeat(offsets[:-1][order] - new_offsets[:-1], counts) + \
+        np.arange(new_offsets[-1])
+    return values[indexes], new_offsets
+
+class ObjectColumns(Sequence):
+    """
+    Tags or shapes in the format of LabeledDataSerializer stored as columns,
+    which are sorted by frame. Items are returned as new dicts, so changes
+    in them don't affect the columns.
+    """
+
+    def __init__(self, columns, values, start=0, stop=None):
+        self._columns = columns
+        self._values = values
+        self._start = start
+        self._stop = len(columns['frame']) if stop is None else stop
+
+    @classmethod
+    def from_objects(cls, objects):
+        # array.array keeps numbers without Python objects for each of them
+        columns = {
+            'id': array('q'), 'frame': array('q'), 'label_id': array('q'),
+            'group': array('q'), 'source': array('i'),
+            'attr_count': array('q'), 'attr_spec_id': array('q'),
+            'attr_value': array('i'),
+            'type': array('i'), 'occluded': array('b'), 'z_order': array('q'),
+            'points_count': array('q'), 'points': array('d'),
+        }
+        # Repeated strings are stored once, columns keep their codes
+        codes = { 'source': {}, 'attr_value': {}, 'type': {} }
+        is_shape = False
+
+        for obj in objects:
+            columns['id'].append(-1 if obj.get('id') is None else obj['id'])
+            columns['frame'].append(obj['frame'])
+            columns['label_id'].append(obj['label_id'])
+            columns['group'].append(-1 if obj.get('group') is None else obj['group'])
+            columns['source'].append(codes['source'].setdefault(
+                obj.get('source', 'manual'), len(codes['source'])))
+            columns['attr_count'].append(len(obj['attributes']))
+            for attr in obj['attributes']:
+                columns['attr_spec_id'].append(attr['spec_id'])
+                columns['attr_value'].append(codes['attr_value'].setdefault(
+                    attr['value'], len(codes['attr_value'])))
+
+            if 'type' in obj:
+                is_shape = True
+                columns['type'].append(codes['type'].setdefault(
+                    str(obj['type']), len(codes['type'])))
+                columns['occluded'].append(obj['occluded'])
+                columns['z_order'].append(obj.get('z_order', 0))
+                columns['points_count'].append(len(obj['points']))
+                columns['points'].extend(obj['points'])
+
+        columns = { name: np.frombuffer(column, dtype=column.typecode)
+            if len(column) else np.empty(0, dtype=column.typecode)
+            for name, column in columns.items() }
+        for name in ('attr', 'points'):
+            counts = columns.pop(name + '_count')
+            offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            columns[name + '_offsets'] = offsets
+        if not is_shape:
+            for name in ('type', 'occluded', 'z_order', 'points', 'points_offsets'):
+                del columns[name]
+
+        frames = columns['frame']
+        if np.any(frames[1:] < frames[:-1]):
+            order = np.argsort(frames, kind='stable')
+            for name in ('id', 'frame', 'label_id', 'group', 'source',
+                    'type', 'occluded', 'z_order'):
+                if name in columns:
+                    columns[name] = columns[name][order]
+            columns['attr_spec_id'], attr_offsets = _take_ragged(
+                columns['attr_spec_id'], columns['attr_offsets'], order)
+            columns['attr_value'], _ = _take_ragged(
+                columns['attr_value'], columns['attr_offsets'], order)
+            columns['attr_offsets'] = attr_offsets
+            if is_shape:
+                columns['points'], columns['points_offsets'] = _take_ragged(
+                    columns['points'], columns['points_offsets'], order)
+
+        return cls(columns, { name: list(value_codes)
+            for name, value_codes in codes.items() })
+
+    @property
+    def is_shapes(self):
+        return 'points' in self._columns
+
+    @property
+    def frames(self):
+        return self._columns['frame'][self._start:self._stop]
+
+    def slice(self, start, stop):
+        """
+        Returns objects on frames in the [start, stop] range. The result
+        shares columns with the original objects.
+        """
+        frames = self.frames
+        return ObjectColumns(self._columns, self._values,
+            self._start + int(np.searchsorted(frames, start, side='left')),
+            self._start + int(np.searchsorted(frames, stop, side='right')))
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return ObjectColumns(self._columns, self._values,
+                self._start + start, self._start + max(start, stop))
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("object index out of range")
+        return self._get_object(self._start + index)
+
+    def __iter__(self):
+        for chunk_start in range(self._start, self._stop, ITER_CHUNK_SIZE):
+            yield from self._get_objects(chunk_start,
+                min(chunk_start + ITER_CHUNK_SIZE, self._stop))
+
+    def _get_object(self, idx):
+        return self._get_objects(idx, idx + 1)[0]
+
+    def _get_objects(self, start, stop):
+        # Columns are converted to lists at once, it is much faster
+        # than access to separate numpy values
+        columns = { name: column[start:stop].tolist()
+            for name, column in self._columns.items()
+            if not name.endswith('_offsets') and name not in {
+                'attr_spec_id', 'attr_value', 'points'} }
+        attr_offsets = self._columns['attr_offsets'][start:stop + 1]
+        attr_spec_ids = self._columns['attr_spec_id'][
+            attr_offsets[0]:attr_offsets[-1]].tolist()
+        attr_values = self._columns['attr_value'][
+            attr_offsets[0]:attr_offsets[-1]].tolist()
+        attr_offsets = (attr_offsets - attr_offsets[0]).tolist()
+        values = self._values
+
+        objects = []
+        for i in range(stop - start):
+            attr_start, attr_stop = attr_offsets[i:i + 2]
+            objects.append({
+                'id': None if columns['id'][i] < 0 else columns['id'][i],
+                'frame': columns['frame'][i],
+                'label_id': columns['label_id'][i],
+                'group': None if columns['group'][i] < 0 else columns['group'][i],
+                'source': values['source'][columns['source'][i]],
+                'attributes': [
+                    { 'spec_id': spec_id, 'value': values['attr_value'][value] }
+                    for spec_id, value in zip(attr_spec_ids[attr_start:attr_stop],
+                        attr_values[attr_start:attr_stop])
+                ],
+            })
+
+        if self.is_shapes:
+            points_offsets = self._columns['points_offsets'][start:stop + 1]
+            points = self._columns['points'][points_offsets[0]:points_offsets[-1]].tolist()
+            points_offsets = (points_offsets - points_offsets[0]).tolist()
+            for i, obj in enumerate(objects):
+                obj.update({
+                    'type': values['type'][columns['type'][i]],
+                    'occluded': bool(columns['occluded'][i]),
+                    'z_order': columns['z_order'][i],
+                    'points': points[points_offsets[i]:points_offsets[i + 1]],
+                })
+
+        return objects
+
+class ColumnarAnnotationIR:
+    """
+    An alternative to AnnotationIR for large amounts of annotations. Tags
+    and shapes are stored in ObjectColumns, tracks are kept as dicts.
+    It can be read as AnnotationIR, but objects can't be added or changed.
+    """
+
+    def __init__(self, data=None):
+        self.version = 0
+        self.tags = ObjectColumns.from_objects([])
+        self.shapes = ObjectColumns.from_objects([])
+        self.tracks = []
+        if data:
+            self.version = data['version']
+            self.tags = ObjectColumns.from_objects(data['tags'])
+            self.shapes = ObjectColumns.from_objects(data['shapes'])
+            self.tracks = list(data['tracks'])
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def to_ir(self):
+        annotation_ir = AnnotationIR()
+        annotation_ir.version = self.version
+        annotation_ir.tags = list(self.tags)
+        annotation_ir.shapes = list(self.shapes)
+        annotation_ir.tracks = list(self.tracks)
+        return annotation_ir
+
+    @property
+    def data(self):
+        return self.to_ir().data
+
+    def serialize(self):
+        return self.to_ir().serialize()
+
+    def slice(self, start, stop):
+        # Tags and shapes aren't copied, tracks are copied as in AnnotationIR
+        splitted_data = ColumnarAnnotationIR()
+        splitted_data.tags = self.tags.slice(start, stop)
+        splitted_data.shapes = self.shapes.slice(start, stop)
+        splitted_data.tracks = AnnotationIR._slice_tracks(self.tracks, start, stop)
+
+        return splitted_data
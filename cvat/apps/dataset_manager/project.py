@@ -4,10 +4,8 @@
 
 from typing import Callable
 
-from django.db import transaction
-
 from cvat.apps.engine import models
-from cvat.apps.dataset_manager.task import TaskAnnotation
+from cvat.apps.dataset_manager.task import TaskAnnotation, read_only_snapshot
 
 from .annotation import AnnotationIR
 from .bindings import ProjectData
@@ -20,7 +18,7 @@ def export_project(project_id, dst_file, format_name,
     # But there is the bug with corrupted dump file in case 2 or
     # more dump request received at the same time:
     # https://github.com/opencv/cvat/issues/217
-    with transaction.atomic():
+    with read_only_snapshot():
         project = ProjectAnnotation(project_id)
         project.init_from_db()
 
@@ -55,7 +53,7 @@ class ProjectAnnotation:
         self.reset()
 
         for task in self.db_tasks:
-            annotation = TaskAnnotation(pk=task.id)
+            annotation = TaskAnnotation(pk=task.id, lock=False)
             annotation.init_from_db()
             self.annotation_irs[task.id] = annotation.ir_data
 
@@ -0,0 +1,261 @@
+# Copyright (C) 2021 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+# Vectorized IoU computation for matching of annotations. Candidate pairs
+# of shapes are found by a uniform grid of their bounding boxes, then IoU
+# of all candidates of the same type is computed in a few numpy operations
+# instead of geometry construction per pair.
+
+from itertools import chain
+
+import numpy as np
+from shapely import geometry
+
+from cvat.apps.engine.models import ShapeType
+
+# The number of shape pairs, which are processed at once. It limits
+# the size of temporary arrays of the convex polygon intersection.
+PAIRS_CHUNK_SIZE = 2 ** 14
+
+# The maximum number of grid cells along a side of the area with shapes.
+# It limits the number of cells covered by a large shape.
+GRID_MAX_CELLS = 64
+
+_EPS = 1e-9
+
+def pairwise(iterable):
+    a = iter(iterable)
+    return zip(a, a)
+
+def get_bboxes(points_list):
+    """
+    Returns (N, 4) array of bounding boxes (x0, y0, x1, y1) of shapes,
+    which are given by flat lists of points
+    """
+    bboxes = np.empty((len(points_list), 4), dtype=float)
+    for i, points in enumerate(points_list):
+        xs, ys = points[0::2], points[1::2]
+        bboxes[i] = (min(xs), min(ys), max(xs), max(ys))
+    return bboxes
+
+def _get_grid_cells(bboxes, origin, cell_size, rows_count):
+    lo = np.floor((bboxes[:, :2] - origin) / cell_size).astype(np.int64)
+    hi = np.floor((bboxes[:, 2:] - origin) / cell_size).astype(np.int64)
+    sizes = hi - lo + 1
+    counts = sizes[:, 0] * sizes[:, 1]
+    indexes = np.repeat(np.arange(len(bboxes)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    x = lo[indexes, 0] + offsets % sizes[indexes, 0]
+    y = lo[indexes, 1] + offsets // sizes[indexes, 0]
+    return x * rows_count + y, indexes
+
+def get_candidate_pairs(bboxes0, bboxes1):
+    """
+    Returns indexes (rows, cols) of pairs of intersecting bounding boxes.
+    Boxes are put into a uniform grid and only boxes, which share a cell,
+    are compared, so the result is computed without a dense N x M matrix.
+    """
+    if not len(bboxes0) or not len(bboxes1):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    origin = np.minimum(bboxes0[:, :2].min(axis=0), bboxes1[:, :2].min(axis=0))
+    extent = np.maximum(bboxes0[:, 2:].max(axis=0), bboxes1[:, 2:].max(axis=0)) - origin
+    sizes = np.concatenate([bboxes0[:, 2:] - bboxes0[:, :2], bboxes1[:, 2:] - bboxes1[:, :2]])
+    cell_size = max(np.median(sizes), extent.max() / GRID_MAX_CELLS, _EPS)
+    rows_count = int(extent[1] // cell_size) + 1
+
+    cells0, indexes0 = _get_grid_cells(bboxes0, origin, cell_size, rows_count)
+    cells1, indexes1 = _get_grid_cells(bboxes1, origin, cell_size, rows_count)
+    order = np.argsort(cells1, kind='stable')
+    cells1, indexes1 = cells1[order], indexes1[order]
+
+    starts = np.searchsorted(cells1, cells0, side='left')
+    counts = np.searchsorted(cells1, cells0, side='right') - starts
+    positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + \
+        np.repeat(starts, counts)
+    pairs = np.unique(np.repeat(indexes0, counts) * len(bboxes1) + indexes1[positions])
+    rows, cols = pairs // len(bboxes1), pairs % len(bboxes1)
+
+    intersecting = bbox_intersection_areas(bboxes0[rows], bboxes1[cols]) > 0
+    return rows[intersecting], cols[intersecting]
+
+def bbox_intersection_areas(bboxes0, bboxes1):
+    """
+    Returns (K,) intersection areas of pairs of bounding boxes
+    """
+    w = np.minimum(bboxes0[:, 2], bboxes1[:, 2]) - np.maximum(bboxes0[:, 0], bboxes1[:, 0])
+    h = np.minimum(bboxes0[:, 3], bboxes1[:, 3]) - np.maximum(bboxes0[:, 1], bboxes1[:, 1])
+    return np.clip(w, 0, None) * np.clip(h, 0, None)
+
+def _areas_to_iou(intersection, area0, area1):
+    union = area0 + area1 - intersection
+    iou = np.zeros_like(intersection)
+    valid = (area0 > 0) & (area1 > 0) & (union > 0)
+    np.divide(intersection, union, out=iou, where=valid)
+    return iou
+
+def box_iou_pairs(boxes0, boxes1, rows, cols):
+    """
+    Returns IoU of pairs (rows[k], cols[k]) of axis-aligned boxes (x0, y0, x1, y1)
+    """
+    boxes0 = get_bboxes(boxes0)
+    boxes1 = get_bboxes(boxes1)
+    area0 = np.prod(boxes0[:, 2:] - boxes0[:, :2], axis=1)
+    area1 = np.prod(boxes1[:, 2:] - boxes1[:, :2], axis=1)
+    intersection = bbox_intersection_areas(boxes0[rows], boxes1[cols])
+    return _areas_to_iou(intersection, area0[rows], area1[cols])
+
+def _cross(o, a, b):
+    return (a[..., 0] - o[..., 0]) * (b[..., 1] - o[..., 1]) - \
+        (a[..., 1] - o[..., 1]) * (b[..., 0] - o[..., 0])
+
+def _signed_areas(polygons):
+    x, y = polygons[..., 0], polygons[..., 1]
+    return 0.5 * np.sum(x * np.roll(y, -1, axis=-1) - np.roll(x, -1, axis=-1) * y,
+        axis=-1)
+
+def _to_ccw(polygons):
+    polygons = polygons.copy()
+    cw = _signed_areas(polygons) < 0
+    polygons[cw] = polygons[cw, ::-1]
+    return polygons
+
+def _is_convex(polygons):
+    # polygons are expected to be counter-clockwise
+    cross = _cross(polygons, np.roll(polygons, -1, axis=-2), np.roll(polygons, -2, axis=-2))
+    return np.all(cross >= -_EPS, axis=-1) & (_signed_areas(polygons) > 0)
+
+def _points_inside(points, polygons):
+    """
+    For (K, P, 2) points and (K, V, 2) counter-clockwise convex polygons
+    returns (K, P) mask of points inside or on the border of the polygons
+    """
+    starts = polygons[:, None, :, :]
+    ends = np.roll(polygons, -1, axis=1)[:, None, :, :]
+    cross = _cross(starts, ends, points[:, :, None, :])
+    return np.all(cross >= -_EPS, axis=-1)
+
+def _edge_intersections(polygons0, polygons1):
+    """
+    Returns (K, V0 * V1, 2) intersection points of edges of polygons
+    and (K, V0 * V1) mask of intersecting edges
+    """
+    a0 = polygons0[:, :, None, :]
+    a1 = np.roll(polygons0, -1, axis=1)[:, :, None, :]
+    b0 = polygons1[:, None, :, :]
+    b1 = np.roll(polygons1, -1, axis=1)[:, None, :, :]
+    da = a1 - a0
+    db = b1 - b0
+    dab = b0 - a0
+    denom = da[..., 0] * db[..., 1] - da[..., 1] * db[..., 0]
+    parallel = np.abs(denom) < _EPS
+    denom = np.where(parallel, 1, denom)
+    t = (dab[..., 0] * db[..., 1] - dab[..., 1] * db[..., 0]) / denom
+    u = (dab[..., 0] * da[..., 1] - dab[..., 1] * da[..., 0]) / denom
+    valid = ~parallel & (t >= -_EPS) & (t <= 1 + _EPS) & (u >= -_EPS) & (u <= 1 + _EPS)
+    points = a0 + t[..., None] * da
+
+    k = len(polygons0)
+    return points.reshape(k, -1, 2), valid.reshape(k, -1)
+
+def convex_intersection_areas(polygons0, polygons1):
+    """
+    Returns (K,) intersection areas of pairs of counter-clockwise convex
+    polygons given by (K, V, 2) arrays.
+
+    The intersection polygon consists of vertices of each polygon, which
+    are inside the other one, and of intersection points of their edges.
+    The points are ordered by the angle around their center.
+    """
+    inside0 = _points_inside(polygons0, polygons1)
+    inside1 = _points_inside(polygons1, polygons0)
+    crossings, crossings_mask = _edge_intersections(polygons0, polygons1)
+
+    points = np.concatenate([polygons0, polygons1, crossings], axis=1)
+    mask = np.concatenate([inside0, inside1, crossings_mask], axis=1)
+    count = mask.sum(axis=1)
+
+    center = np.sum(points * mask[..., None], axis=1) / np.maximum(count, 1)[:, None]
+    angles = np.arctan2(points[..., 1] - center[:, None, 1],
+        points[..., 0] - center[:, None, 0])
+    angles[~mask] = np.inf
+    order = np.argsort(angles, axis=1)
+    points = np.take_along_axis(points, order[..., None], axis=1)
+    mask = np.take_along_axis(mask, order, axis=1)
+
+    # Unused points are replaced by the first one, they don't change the area
+    points = np.where(mask[..., None], points, points[:, :1, :])
+    areas = np.abs(_signed_areas(points))
+    areas[count < 3] = 0
+    return areas
+
+def _polygon_iou(p0, p1):
+    if p0.is_valid and p1.is_valid: # check validity of polygons
+        overlap_area = p0.intersection(p1).area
+        if p0.area == 0 or p1.area == 0: # a line with many points
+            return 0
+        else:
+            return overlap_area / (p0.area + p1.area - overlap_area)
+    else:
+        return 0 # if there's invalid polygon, assume similarity is 0
+
+def polygon_iou_pairs(polygons0, polygons1, rows, cols):
+    """
+    Returns IoU of pairs (rows[k], cols[k]) of polygons given by flat lists
+    of points. Geometries are created once for each polygon.
+    """
+    geometries0 = {i: geometry.Polygon(pairwise(polygons0[i])) for i in np.unique(rows)}
+    geometries1 = {j: geometry.Polygon(pairwise(polygons1[j])) for j in np.unique(cols)}
+    return np.array([_polygon_iou(geometries0[i], geometries1[j])
+        for i, j in zip(rows, cols)], dtype=float)
+
+def quad_iou_pairs(quads0, quads1, rows, cols):
+    """
+    Returns IoU of pairs (rows[k], cols[k]) of quadrilaterals (e.g. rotated
+    boxes) given by flat lists of their 4 vertices. Convex quadrilaterals
+    are compared by the vectorized convex polygon intersection, other ones
+    by shapely.
+    """
+    iou = np.zeros(len(rows))
+    quads0 = _to_ccw(np.asarray(quads0, dtype=float).reshape(-1, 4, 2))
+    quads1 = _to_ccw(np.asarray(quads1, dtype=float).reshape(-1, 4, 2))
+    area0 = np.abs(_signed_areas(quads0))
+    area1 = np.abs(_signed_areas(quads1))
+    convex = _is_convex(quads0)[rows] & _is_convex(quads1)[cols]
+
+    pairs = np.nonzero(convex)[0]
+    for start in range(0, len(pairs), PAIRS_CHUNK_SIZE):
+        k = pairs[start : start + PAIRS_CHUNK_SIZE]
+        r, c = rows[k], cols[k]
+        intersection = convex_intersection_areas(quads0[r], quads1[c])
+        iou[k] = _areas_to_iou(intersection, area0[r], area1[c])
+
+    # Self-intersecting quadrilaterals are invalid, shapely returns 0 for them
+    for k in np.nonzero(~convex)[0]:
+        iou[k] = _polygon_iou(geometry.Polygon(quads0[rows[k]]),
+            geometry.Polygon(quads1[cols[k]]))
+    return iou
+
+def shape_iou_pairs(shape_type, points0, points1, rows, cols):
+    """
+    Returns IoU of pairs (rows[k], cols[k]) of shapes of the same type given
+    by flat lists of points. Shapes without area have zero similarity.
+    """
+    if shape_type == ShapeType.RECTANGLE:
+        return box_iou_pairs(points0, points1, rows, cols)
+    elif shape_type == ShapeType.ROTBOX and \
+            all(len(points) == 8 for points in chain(points0, points1)):
+        return quad_iou_pairs(points0, points1, rows, cols)
+    elif shape_type in (ShapeType.POLYGON, ShapeType.ROTBOX):
+        return polygon_iou_pairs(points0, points1, rows, cols)
+    else:
+        return np.zeros(len(rows)) # FIXME: need some similarity for points and polylines
+
+def shape_iou_candidates(shape_type, points0, points1):
+    """
+    Returns indexes (rows, cols) and IoU of pairs of shapes of the same
+    type, which can be similar, i.e. their bounding boxes intersect
+    """
+    rows, cols = get_candidate_pairs(get_bboxes(points0), get_bboxes(points1))
+    return rows, cols, shape_iou_pairs(shape_type, points0, points1, rows, cols)
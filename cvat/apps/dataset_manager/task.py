@@ -3,22 +3,34 @@
 #
 # SPDX-License-Identifier: MIT
 
+import hashlib
 from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import timedelta
 from enum import Enum
+from functools import partial
+from itertools import chain
 
-from django.conf import settings
-from django.db import transaction
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max, OuterRef, Q, Subquery
+from django.db.models.expressions import RawSQL
 from django.utils import timezone
+from django.utils.http import quote_etag
 
 from cvat.apps.engine import models, serializers
 from cvat.apps.engine.plugins import plugin_decorator
+from cvat.apps.engine.utils import bulk_create
 from cvat.apps.profiler import silk_profile
 
 from .annotation import AnnotationIR, AnnotationManager
+from .columnar import ColumnarAnnotationIR
 from .bindings import TaskData
 from .formats.registry import make_exporter, make_importer
 
 
+ANNOTATIONS_CACHE_TTL = timedelta(hours=10)
+
 class dotdict(OrderedDict):
     """dot.notation access to dictionary attributes"""
     __getattr__ = OrderedDict.get
@@ -39,20 +51,24 @@ class PatchAction(str, Enum):
     def __str__(self):
         return self.value
 
-def bulk_create(db_model, objects, flt_param):
-    if objects:
-        if flt_param:
-            if 'postgresql' in settings.DATABASES["default"]["ENGINE"]:
-                return db_model.objects.bulk_create(objects)
-            else:
-                ids = list(db_model.objects.filter(**flt_param).values_list('id', flat=True))
-                db_model.objects.bulk_create(objects)
-
-                return list(db_model.objects.exclude(id__in=ids).filter(**flt_param))
-        else:
-            return db_model.objects.bulk_create(objects)
-
-    return []
+def _json_agg_sql(db_model, alias, fields, condition, order_by=None):
+    return "COALESCE((SELECT json_agg(json_build_object({}){}) FROM {} {} WHERE {}), '[]'::json)".format(
+        ', '.join("'{}', {}".format(name, expr) for name, expr in fields.items()),
+        ' ORDER BY {}'.format(order_by) if order_by else '',
+        connection.ops.quote_name(db_model._meta.db_table), alias, condition)
+
+def _attrvals_json_agg_sql(db_model, fk_column, parent, alias):
+    return _json_agg_sql(db_model, alias, OrderedDict([
+        ('spec_id', alias + '.spec_id'),
+        ('value', alias + '.value'),
+        ('id', alias + '.id'),
+    ]), '{}.{} = {}.id'.format(alias, fk_column, parent))
+
+def _to_dotdict(row, nested_keys):
+    row = dotdict(row)
+    for key in nested_keys:
+        row[key] = [dotdict(item) for item in row[key]]
+    return row
 
 def _merge_table_rows(rows, keys_for_merge, field_id):
     # It is necessary to keep a stable order of original rows
@@ -82,23 +98,125 @@ def _merge_table_rows(rows, keys_for_merge, field_id):
 
     return list(merged_rows.values())
 
+class _AnnotationChanges:
+    """
+    Accumulates rows which are changed by an update of annotations
+    and writes them to DB with one query per model and operation.
+    """
+    def __init__(self):
+        self.created = OrderedDict()
+        self.updated = OrderedDict()
+        self.deleted = OrderedDict()
+
+    def create(self, db_object):
+        self.created.setdefault(type(db_object), []).append(db_object)
+
+    def update(self, db_object, fields):
+        db_objects, updated_fields = self.updated.setdefault(type(db_object), ([], set()))
+        db_objects.append(db_object)
+        updated_fields.update(fields)
+
+    def delete(self, db_object):
+        self.deleted.setdefault(type(db_object), []).append(db_object.id)
+
+    def update_fields(self, db_object, data, fields):
+        changed_fields = [field for field in fields
+            if field in data and getattr(db_object, field) != data[field]]
+        for field in changed_fields:
+            setattr(db_object, field, data[field])
+        if changed_fields:
+            self.update(db_object, changed_fields)
+
+        return bool(changed_fields)
+
+    def update_attributes(self, db_attrvals, attributes, specs, make_attrval):
+        changed = False
+        db_attrvals = {db_attrval.spec_id: db_attrval for db_attrval in db_attrvals}
+        for attr in attributes:
+            if attr["spec_id"] not in specs:
+                raise AttributeError("spec_id `{}` is invalid".format(attr["spec_id"]))
+
+            db_attrval = db_attrvals.pop(attr["spec_id"], None)
+            if db_attrval is None:
+                self.create(make_attrval(spec_id=attr["spec_id"], value=attr["value"]))
+                changed = True
+            elif db_attrval.value != attr["value"]:
+                db_attrval.value = attr["value"]
+                self.update(db_attrval, ["value"])
+                changed = True
+
+        for db_attrval in db_attrvals.values():
+            self.delete(db_attrval)
+            changed = True
+
+        return changed
+
+    def __bool__(self):
+        return bool(self.created or self.updated or self.deleted)
+
+    def save(self):
+        for db_model, ids in self.deleted.items():
+            db_model.objects.filter(id__in=ids).delete()
+        for db_model, (db_objects, fields) in self.updated.items():
+            db_model.objects.bulk_update(db_objects, sorted(fields), batch_size=1000)
+        for db_model, db_objects in self.created.items():
+            bulk_create(db_model, db_objects, {})
+
+def _get_job_data_cache_key(job_id, version, updated_date):
+    # The updated date changes when annotations are removed without a commit
+    # (e.g. with their label) and makes keys unique if job ids are reused
+    return 'job_annotations_{}_{}_{}'.format(job_id, version, updated_date.timestamp())
+
+def _get_jobs_state(**filters):
+    return OrderedDict((job_id, (version or 0, updated_date))
+        for job_id, version, updated_date in models.Job.objects.filter(**filters) \
+            .order_by('id').annotate(last_version=Max('commits__version')) \
+            .values_list('id', 'last_version', 'updated_date'))
+
+@contextmanager
+def read_only_snapshot():
+    """
+    A transaction for reading of annotations without row locks, so readers
+    don't wait for concurrent saves. On PostgreSQL all queries of the block
+    see the same snapshot of the database.
+    """
+    set_snapshot = connection.vendor == 'postgresql' and not connection.in_atomic_block
+    with transaction.atomic():
+        if set_snapshot:
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        yield
+
 class JobAnnotation:
-    def __init__(self, pk):
-        self.db_job = models.Job.objects.select_related('segment__task') \
-            .select_for_update().get(id=pk)
+    TAG_FIELDS = ('label_id', 'frame', 'group', 'source')
+    SHAPE_FIELDS = TAG_FIELDS + ('type', 'occluded', 'z_order', 'points')
+    TRACK_FIELDS = TAG_FIELDS
+    TRACKED_SHAPE_FIELDS = ('frame', 'type', 'occluded', 'z_order', 'points', 'outside')
+
+    def __init__(self, pk, lock=True):
+        queryset = models.Job.objects.select_related('segment__task')
+        if lock:
+            queryset = queryset.select_for_update()
+        self.db_job = queryset.get(id=pk)
+        self._committed_updated_date = self.db_job.updated_date
+        self._changes = []
 
         db_segment = self.db_job.segment
         self.start_frame = db_segment.start_frame
         self.stop_frame = db_segment.stop_frame
         self.ir_data = AnnotationIR()
 
-        self.db_labels = {db_label.id:db_label
-            for db_label in (db_segment.task.project.label_set.all()
-            if db_segment.task.project_id else db_segment.task.label_set.all())}
+        self.db_labels, self.db_attributes = self._get_db_labels(db_segment.task)
 
-        self.db_attributes = {}
-        for db_label in self.db_labels.values():
-            self.db_attributes[db_label.id] = {
+    @staticmethod
+    def _get_db_labels(db_task):
+        db_labels = {db_label.id:db_label
+            for db_label in (db_task.project.label_set if db_task.project_id \
+                else db_task.label_set).prefetch_related('attributespec_set')}
+
+        db_attributes = {}
+        for db_label in db_labels.values():
+            db_attributes[db_label.id] = {
                 "mutable": OrderedDict(),
                 "immutable": OrderedDict(),
                 "all": OrderedDict(),
@@ -109,15 +227,20 @@ class JobAnnotation:
                     ('value', db_attr.default_value),
                 ])
                 if db_attr.mutable:
-                    self.db_attributes[db_label.id]["mutable"][db_attr.id] = default_value
+                    db_attributes[db_label.id]["mutable"][db_attr.id] = default_value
                 else:
-                    self.db_attributes[db_label.id]["immutable"][db_attr.id] = default_value
+                    db_attributes[db_label.id]["immutable"][db_attr.id] = default_value
+
+                db_attributes[db_label.id]["all"][db_attr.id] = default_value
 
-                self.db_attributes[db_label.id]["all"][db_attr.id] = default_value
+        return db_labels, db_attributes
 
     def reset(self):
         self.ir_data.reset()
 
+    def _log_changes(self, object_type, object_ids, action):
+        self._changes.extend((object_type, object_id, action) for object_id in object_ids)
+
     def _save_tracks_to_db(self, tracks):
         db_tracks = []
         db_track_attrvals = []
@@ -198,6 +321,8 @@ class JobAnnotation:
                 shape["id"] = db_shapes[shape_idx].id
                 shape_idx += 1
 
+        self._log_changes(models.AnnotationObjectType.TRACK,
+            (db_track.id for db_track in db_tracks), models.ChangeActionChoice.CREATE)
         self.ir_data.tracks = tracks
 
     def _save_shapes_to_db(self, shapes):
@@ -241,6 +366,8 @@ class JobAnnotation:
         for shape, db_shape in zip(shapes, db_shapes):
             shape["id"] = db_shape.id
 
+        self._log_changes(models.AnnotationObjectType.SHAPE,
+            (db_shape.id for db_shape in db_shapes), models.ChangeActionChoice.CREATE)
         self.ir_data.shapes = shapes
 
     def _save_tags_to_db(self, tags):
@@ -281,8 +408,151 @@ class JobAnnotation:
         for tag, db_tag in zip(tags, db_tags):
             tag["id"] = db_tag.id
 
+        self._log_changes(models.AnnotationObjectType.TAG,
+            (db_tag.id for db_tag in db_tags), models.ChangeActionChoice.CREATE)
         self.ir_data.tags = tags
 
+    def _update_tags_in_db(self, tags, changes):
+        db_tags = self.db_job.labeledimage_set.prefetch_related(
+            "labeledimageattributeval_set"
+        ).in_bulk([tag["id"] for tag in tags if tag.get("id") is not None])
+
+        new_tags = []
+        for tag in tags:
+            db_tag = db_tags.get(tag.get("id"))
+            if db_tag is None:
+                new_tags.append(tag)
+                continue
+
+            if tag.get("label_id") not in self.db_labels:
+                raise AttributeError("label_id `{}` is invalid".format(tag.get("label_id")))
+
+            changed = changes.update_fields(db_tag, tag, self.TAG_FIELDS)
+            changed |= changes.update_attributes(db_tag.labeledimageattributeval_set.all(),
+                tag.get("attributes", []), self.db_attributes[tag["label_id"]]["all"],
+                partial(models.LabeledImageAttributeVal, image_id=db_tag.id))
+            if changed:
+                self._log_changes(models.AnnotationObjectType.TAG, [db_tag.id],
+                    models.ChangeActionChoice.UPDATE)
+
+        return new_tags
+
+    def _update_shapes_in_db(self, shapes, changes):
+        db_shapes = self.db_job.labeledshape_set.prefetch_related(
+            "labeledshapeattributeval_set"
+        ).in_bulk([shape["id"] for shape in shapes if shape.get("id") is not None])
+
+        new_shapes = []
+        for shape in shapes:
+            db_shape = db_shapes.get(shape.get("id"))
+            if db_shape is None:
+                new_shapes.append(shape)
+                continue
+
+            if shape.get("label_id") not in self.db_labels:
+                raise AttributeError("label_id `{}` is invalid".format(shape.get("label_id")))
+
+            changed = changes.update_fields(db_shape, shape, self.SHAPE_FIELDS)
+            changed |= changes.update_attributes(db_shape.labeledshapeattributeval_set.all(),
+                shape.get("attributes", []), self.db_attributes[shape["label_id"]]["all"],
+                partial(models.LabeledShapeAttributeVal, shape_id=db_shape.id))
+            if changed:
+                self._log_changes(models.AnnotationObjectType.SHAPE, [db_shape.id],
+                    models.ChangeActionChoice.UPDATE)
+
+        return new_shapes
+
+    def _update_tracks_in_db(self, tracks, changes):
+        db_tracks = self.db_job.labeledtrack_set.prefetch_related(
+            "labeledtrackattributeval_set",
+            "trackedshape_set__trackedshapeattributeval_set",
+        ).in_bulk([track["id"] for track in tracks if track.get("id") is not None])
+
+        new_tracks = []
+        new_shapes = []
+        for track in tracks:
+            db_track = db_tracks.get(track.get("id"))
+            if db_track is None:
+                new_tracks.append(track)
+                continue
+
+            if track.get("label_id") not in self.db_labels:
+                raise AttributeError("label_id `{}` is invalid".format(track.get("label_id")))
+
+            db_attributes = self.db_attributes[track["label_id"]]
+            changed = changes.update_fields(db_track, track, self.TRACK_FIELDS)
+            changed |= changes.update_attributes(db_track.labeledtrackattributeval_set.all(),
+                track.get("attributes", []), db_attributes["immutable"],
+                partial(models.LabeledTrackAttributeVal, track_id=db_track.id))
+
+            # Shapes of the track are matched by id and, if the id is unknown,
+            # by frame, because clients can send keyframes without ids.
+            db_shapes = OrderedDict((db_shape.id, db_shape)
+                for db_shape in db_track.trackedshape_set.all())
+            db_shape_ids = {db_shape.frame: db_shape.id for db_shape in db_shapes.values()}
+            for shape in track["shapes"]:
+                shape_id = shape.get("id")
+                if shape_id not in db_shapes:
+                    shape_id = db_shape_ids.get(shape["frame"])
+                db_shape = db_shapes.pop(shape_id, None)
+                if db_shape is None:
+                    new_shapes.append((db_track, shape))
+                    changed = True
+                    continue
+
+                changed |= changes.update_fields(db_shape, shape, self.TRACKED_SHAPE_FIELDS)
+                changed |= changes.update_attributes(db_shape.trackedshapeattributeval_set.all(),
+                    shape.get("attributes", []), db_attributes["mutable"],
+                    partial(models.TrackedShapeAttributeVal, shape_id=db_shape.id))
+                shape["id"] = db_shape.id
+
+            for db_shape in db_shapes.values():
+                changes.delete(db_shape)
+                changed = True
+
+            if changed:
+                self._log_changes(models.AnnotationObjectType.TRACK, [db_track.id],
+                    models.ChangeActionChoice.UPDATE)
+
+        return new_tracks, new_shapes
+
+    def _save_tracked_shapes_to_db(self, shapes):
+        db_shapes = []
+        db_attrvals = []
+
+        for db_track, shape in shapes:
+            attributes = shape.pop("attributes", [])
+            shape.pop("id", None)
+            db_shape = models.TrackedShape(track_id=db_track.id, **shape)
+
+            for attr in attributes:
+                db_attrval = models.TrackedShapeAttributeVal(**attr)
+                if db_attrval.spec_id not in self.db_attributes[db_track.label_id]["mutable"]:
+                    raise AttributeError("spec_id `{}` is invalid".format(db_attrval.spec_id))
+                db_attrval.shape_id = len(db_shapes)
+                db_attrvals.append(db_attrval)
+
+            db_shapes.append(db_shape)
+            shape["attributes"] = attributes
+
+        db_shapes = bulk_create(
+            db_model=models.TrackedShape,
+            objects=db_shapes,
+            flt_param={"track__job_id": self.db_job.id}
+        )
+
+        for db_attrval in db_attrvals:
+            db_attrval.shape_id = db_shapes[db_attrval.shape_id].id
+
+        bulk_create(
+            db_model=models.TrackedShapeAttributeVal,
+            objects=db_attrvals,
+            flt_param={}
+        )
+
+        for (_, shape), db_shape in zip(shapes, db_shapes):
+            shape["id"] = db_shape.id
+
     def _commit(self):
         db_prev_commit = self.db_job.commits.last()
         db_curr_commit = models.JobCommit()
@@ -296,10 +566,23 @@ class JobAnnotation:
         db_curr_commit.save()
         self.ir_data.version = db_curr_commit.version
 
+        models.JobCommitChange.objects.bulk_create((
+            models.JobCommitChange(commit=db_curr_commit, object_type=object_type,
+                object_id=object_id, action=action)
+            for object_type, object_id, action in self._changes
+        ), batch_size=1000)
+        self._changes = []
+
+        prev_cache_key = _get_job_data_cache_key(self.db_job.id,
+            db_prev_commit.version if db_prev_commit else 0, self._committed_updated_date)
+        transaction.on_commit(lambda: cache.delete(prev_cache_key))
+        self._committed_updated_date = self.db_job.updated_date
+
     def _set_updated_date(self):
-        db_task = self.db_job.segment.task
-        db_task.updated_date = timezone.now()
-        db_task.save()
+        # The task row isn't updated here: concurrent saves of different jobs
+        # would wait for each other on its lock. See Task.get_updated_date().
+        self.db_job.updated_date = timezone.now()
+        self.db_job.save(update_fields=['updated_date'])
 
     def _save_to_db(self, data):
         self.reset()
@@ -312,7 +595,6 @@ class JobAnnotation:
     def _create(self, data):
         if self._save_to_db(data):
             self._set_updated_date()
-            self.db_job.save()
 
     def create(self, data):
         self._create(data)
@@ -323,26 +605,45 @@ class JobAnnotation:
         self._create(data)
         self._commit()
 
+    def _update(self, data):
+        # Objects which exist in the job are changed in place and keep their
+        # ids, only rows with changed values are written. Objects which
+        # don't exist are created.
+        changes = _AnnotationChanges()
+        new_tags = self._update_tags_in_db(data["tags"], changes)
+        new_shapes = self._update_shapes_in_db(data["shapes"], changes)
+        new_tracks, new_tracked_shapes = self._update_tracks_in_db(data["tracks"], changes)
+
+        changes.save()
+        self._save_tracked_shapes_to_db(new_tracked_shapes)
+        created = self._save_to_db({
+            "tags": new_tags,
+            "shapes": new_shapes,
+            "tracks": new_tracks,
+        })
+
+        self.ir_data.tags = data["tags"]
+        self.ir_data.shapes = data["shapes"]
+        self.ir_data.tracks = data["tracks"]
+
+        if created or changes or new_tracked_shapes:
+            self._set_updated_date()
+
     def update(self, data):
-        self._delete(data)
-        self._create(data)
+        self._update(data)
         self._commit()
 
     def _delete(self, data=None):
         deleted_shapes = 0
-        if data is None:
-            deleted_shapes += self.db_job.labeledimage_set.all().delete()[0]
-            deleted_shapes += self.db_job.labeledshape_set.all().delete()[0]
-            deleted_shapes += self.db_job.labeledtrack_set.all().delete()[0]
-        else:
+        labeledimage_set = self.db_job.labeledimage_set.all()
+        labeledshape_set = self.db_job.labeledshape_set.all()
+        labeledtrack_set = self.db_job.labeledtrack_set.all()
+        if data is not None:
             labeledimage_ids = [image["id"] for image in data["tags"]]
             labeledshape_ids = [shape["id"] for shape in data["shapes"]]
             labeledtrack_ids = [track["id"] for track in data["tracks"]]
-            labeledimage_set = self.db_job.labeledimage_set
             labeledimage_set = labeledimage_set.filter(pk__in=labeledimage_ids)
-            labeledshape_set = self.db_job.labeledshape_set
             labeledshape_set = labeledshape_set.filter(pk__in=labeledshape_ids)
-            labeledtrack_set = self.db_job.labeledtrack_set
             labeledtrack_set = labeledtrack_set.filter(pk__in=labeledtrack_ids)
 
             # It is not important for us that data had some "invalid" objects
@@ -352,9 +653,14 @@ class JobAnnotation:
             self.ir_data.shapes = data['shapes']
             self.ir_data.tracks = data['tracks']
 
-            deleted_shapes += labeledimage_set.delete()[0]
-            deleted_shapes += labeledshape_set.delete()[0]
-            deleted_shapes += labeledtrack_set.delete()[0]
+        for object_type, queryset in (
+            (models.AnnotationObjectType.TAG, labeledimage_set),
+            (models.AnnotationObjectType.SHAPE, labeledshape_set),
+            (models.AnnotationObjectType.TRACK, labeledtrack_set),
+        ):
+            self._log_changes(object_type, queryset.values_list('id', flat=True),
+                models.ChangeActionChoice.DELETE)
+            deleted_shapes += queryset.delete()[0]
 
         if deleted_shapes:
             self._set_updated_date()
@@ -373,12 +679,14 @@ class JobAnnotation:
                     ('value', db_attr.value),
                 ]))
 
-    def _init_tags_from_db(self):
-        db_tags = self.db_job.labeledimage_set.prefetch_related(
+    @classmethod
+    def _get_tags(cls, queryset, db_attributes):
+        db_tags = queryset.prefetch_related(
             "label",
             "labeledimageattributeval_set"
         ).values(
             'id',
+            'job_id',
             'frame',
             'label_id',
             'group',
@@ -401,18 +709,82 @@ class JobAnnotation:
         )
 
         for db_tag in db_tags:
-            self._extend_attributes(db_tag.labeledimageattributeval_set,
-                self.db_attributes[db_tag.label_id]["all"].values())
+            cls._extend_attributes(db_tag.labeledimageattributeval_set,
+                db_attributes[db_tag.label_id]["all"].values())
 
+        return db_tags
+
+    @staticmethod
+    def _filter_by_frames(queryset, start_frame, stop_frame):
+        if start_frame is not None:
+            queryset = queryset.filter(frame__gte=start_frame)
+        if stop_frame is not None:
+            queryset = queryset.filter(frame__lte=stop_frame)
+        return queryset
+
+    @staticmethod
+    def _filter_tracks_by_frames(queryset, start_frame, stop_frame):
+        # Tracks are returned with all shapes, because they are required
+        # for interpolation. A track is visible in the range, if it starts
+        # before its end and isn't finished (outside) before its start.
+        # Tracks without shapes are kept, they are returned in full reads too.
+        if stop_frame is not None:
+            queryset = queryset.filter(frame__lte=stop_frame)
+        if start_frame is not None:
+            last_shapes = models.TrackedShape.objects \
+                .filter(track_id=OuterRef('id')).order_by('-frame')
+            queryset = queryset.annotate(
+                last_frame=Subquery(last_shapes.values('frame')[:1]),
+                last_outside=Subquery(last_shapes.values('outside')[:1]),
+            ).filter(Q(last_frame__gte=start_frame) | Q(last_outside=False) |
+                Q(last_frame__isnull=True))
+        return queryset
+
+    @staticmethod
+    def _intersects(points, bbox):
+        xs, ys = points[0::2], points[1::2]
+        return min(xs) <= bbox[2] and bbox[0] <= max(xs) and \
+            min(ys) <= bbox[3] and bbox[1] <= max(ys)
+
+    @classmethod
+    def _track_intersects(cls, track, bbox, start_frame, stop_frame):
+        # A visible (not outside) shape is shown up to the next shape of
+        # the track, positions between them are interpolated. So only shapes
+        # which are shown in the range are checked, with the next ones.
+        shapes = track["shapes"]
+        for shape, next_shape in zip(shapes, chain(shapes[1:], [None])):
+            if stop_frame is not None and stop_frame < shape["frame"]:
+                break
+            if shape["outside"] or start_frame is not None and \
+                    next_shape is not None and next_shape["frame"] <= start_frame:
+                continue
+            points = list(shape["points"])
+            if next_shape is not None:
+                points.extend(next_shape["points"])
+            if cls._intersects(points, bbox):
+                return True
+        return False
+
+    def _filter_by_bbox(self, bbox, start_frame=None, stop_frame=None):
+        self.ir_data.shapes = [shape for shape in self.ir_data.shapes
+            if self._intersects(shape["points"], bbox)]
+        self.ir_data.tracks = [track for track in self.ir_data.tracks
+            if self._track_intersects(track, bbox, start_frame, stop_frame)]
+
+    def _init_tags_from_db(self, start_frame=None, stop_frame=None):
+        db_tags = self._get_tags(self._filter_by_frames(self.db_job.labeledimage_set.all(),
+            start_frame, stop_frame), self.db_attributes)
         serializer = serializers.LabeledImageSerializer(db_tags, many=True)
         self.ir_data.tags = serializer.data
 
-    def _init_shapes_from_db(self):
-        db_shapes = self.db_job.labeledshape_set.prefetch_related(
+    @staticmethod
+    def _get_joined_shapes(queryset):
+        db_shapes = queryset.prefetch_related(
             "label",
             "labeledshapeattributeval_set"
         ).values(
             'id',
+            'job_id',
             'label_id',
             'type',
             'frame',
@@ -437,20 +809,61 @@ class JobAnnotation:
             },
             field_id='id',
         )
+
+        return db_shapes
+
+    @staticmethod
+    def _get_aggregated_shapes(queryset):
+        shape_table = connection.ops.quote_name(models.LabeledShape._meta.db_table)
+        db_shapes = queryset.values(
+            'id',
+            'job_id',
+            'label_id',
+            'type',
+            'frame',
+            'group',
+            'source',
+            'occluded',
+            'z_order',
+            'points',
+        ).annotate(
+            labeledshapeattributeval_set=RawSQL(_attrvals_json_agg_sql(
+                models.LabeledShapeAttributeVal, 'shape_id', shape_table, 'sa'), ()),
+        ).order_by('frame')
+
+        return [_to_dotdict(db_shape, ['labeledshapeattributeval_set'])
+            for db_shape in db_shapes]
+
+    @classmethod
+    def _get_shapes(cls, queryset, db_attributes):
+        # The attributes are aggregated by PostgreSQL to avoid
+        # the transfer and regrouping of the joined rows
+        if connection.vendor == 'postgresql':
+            db_shapes = cls._get_aggregated_shapes(queryset)
+        else:
+            db_shapes = cls._get_joined_shapes(queryset)
+
         for db_shape in db_shapes:
-            self._extend_attributes(db_shape.labeledshapeattributeval_set,
-                self.db_attributes[db_shape.label_id]["all"].values())
+            cls._extend_attributes(db_shape.labeledshapeattributeval_set,
+                db_attributes[db_shape.label_id]["all"].values())
+
+        return db_shapes
 
+    def _init_shapes_from_db(self, start_frame=None, stop_frame=None):
+        db_shapes = self._get_shapes(self._filter_by_frames(self.db_job.labeledshape_set.all(),
+            start_frame, stop_frame), self.db_attributes)
         serializer = serializers.LabeledShapeSerializer(db_shapes, many=True)
         self.ir_data.shapes = serializer.data
 
-    def _init_tracks_from_db(self):
-        db_tracks = self.db_job.labeledtrack_set.prefetch_related(
+    @staticmethod
+    def _get_joined_tracks(queryset):
+        db_tracks = queryset.prefetch_related(
             "label",
             "labeledtrackattributeval_set",
             "trackedshape_set__trackedshapeattributeval_set"
         ).values(
             "id",
+            "job_id",
             "frame",
             "label_id",
             "group",
@@ -506,20 +919,79 @@ class JobAnnotation:
             # A result table can consist many equal rows for track/shape attributes
             # We need filter unique attributes manually
             db_track["labeledtrackattributeval_set"] = list(set(db_track["labeledtrackattributeval_set"]))
-            self._extend_attributes(db_track.labeledtrackattributeval_set,
-                self.db_attributes[db_track.label_id]["immutable"].values())
-
-            default_attribute_values = self.db_attributes[db_track.label_id]["mutable"].values()
             for db_shape in db_track["trackedshape_set"]:
                 db_shape["trackedshapeattributeval_set"] = list(
                     set(db_shape["trackedshapeattributeval_set"])
                 )
+
+        return db_tracks
+
+    @staticmethod
+    def _get_aggregated_tracks(queryset):
+        track_table = connection.ops.quote_name(models.LabeledTrack._meta.db_table)
+        shapes_sql = _json_agg_sql(models.TrackedShape, 'ts', OrderedDict([
+            ('type', 'ts.type'),
+            ('occluded', 'ts.occluded'),
+            ('z_order', 'ts.z_order'),
+            ('points', 'ts.points'),
+            ('id', 'ts.id'),
+            ('frame', 'ts.frame'),
+            ('outside', 'ts.outside'),
+            ('trackedshapeattributeval_set', _attrvals_json_agg_sql(
+                models.TrackedShapeAttributeVal, 'shape_id', 'ts', 'tsa')),
+        ]), 'ts.track_id = {}.id'.format(track_table), order_by='ts.frame')
+
+        db_tracks = queryset.values(
+            "id",
+            "job_id",
+            "frame",
+            "label_id",
+            "group",
+            "source",
+        ).annotate(
+            labeledtrackattributeval_set=RawSQL(_attrvals_json_agg_sql(
+                models.LabeledTrackAttributeVal, 'track_id', track_table, 'ta'), ()),
+            trackedshape_set=RawSQL(shapes_sql, ()),
+        ).order_by('id')
+
+        points_field = models.TrackedShape._meta.get_field('points')
+        db_tracks = [_to_dotdict(db_track, ['labeledtrackattributeval_set'])
+            for db_track in db_tracks]
+        for db_track in db_tracks:
+            db_track["trackedshape_set"] = [
+                _to_dotdict(db_shape, ['trackedshapeattributeval_set'])
+                for db_shape in db_track["trackedshape_set"]
+            ]
+            for db_shape in db_track["trackedshape_set"]:
+                db_shape["points"] = points_field.to_python(db_shape["points"])
+
+        return db_tracks
+
+    @classmethod
+    def _get_tracks(cls, queryset, db_attributes):
+        # Attributes and shapes of tracks are aggregated by PostgreSQL,
+        # instead of the transfer of rows for each combination of them
+        if connection.vendor == 'postgresql':
+            db_tracks = cls._get_aggregated_tracks(queryset)
+        else:
+            db_tracks = cls._get_joined_tracks(queryset)
+
+        for db_track in db_tracks:
+            cls._extend_attributes(db_track.labeledtrackattributeval_set,
+                db_attributes[db_track.label_id]["immutable"].values())
+
+            default_attribute_values = db_attributes[db_track.label_id]["mutable"].values()
+            for db_shape in db_track["trackedshape_set"]:
                 # in case of trackedshapes need to interpolate attriute values and extend it
                 # by previous shape attribute values (not default values)
-                self._extend_attributes(db_shape["trackedshapeattributeval_set"], default_attribute_values)
+                cls._extend_attributes(db_shape["trackedshapeattributeval_set"], default_attribute_values)
                 default_attribute_values = db_shape["trackedshapeattributeval_set"]
 
+        return db_tracks
 
+    def _init_tracks_from_db(self, start_frame=None, stop_frame=None):
+        db_tracks = self._get_tracks(self._filter_tracks_by_frames(
+            self.db_job.labeledtrack_set.all(), start_frame, stop_frame), self.db_attributes)
         serializer = serializers.LabeledTrackSerializer(db_tracks, many=True)
         self.ir_data.tracks = serializer.data
 
@@ -527,11 +999,63 @@ class JobAnnotation:
         db_commit = self.db_job.commits.last()
         self.ir_data.version = db_commit.version if db_commit else 0
 
-    def init_from_db(self):
-        self._init_tags_from_db()
-        self._init_shapes_from_db()
-        self._init_tracks_from_db()
+    def init_from_db(self, start_frame=None, stop_frame=None, bbox=None):
+        self._init_tags_from_db(start_frame, stop_frame)
+        self._init_shapes_from_db(start_frame, stop_frame)
+        self._init_tracks_from_db(start_frame, stop_frame)
+        if bbox is not None:
+            self._filter_by_bbox(bbox, start_frame, stop_frame)
+        self._init_version_from_db()
+
+    def get_changes(self, version):
         self._init_version_from_db()
+        if not 0 <= version <= self.ir_data.version:
+            raise ValueError("version `{}` is invalid".format(version))
+
+        db_commits = self.db_job.commits.filter(version__gt=version)
+        if db_commits.filter(has_changes=False).exists():
+            raise ValueError("changes since version `{}` are unknown".format(version))
+
+        # Only the first change of an object after the version is important:
+        # the object is either created or updated, if it still exists
+        first_actions = {object_type.value: {}
+            for object_type in models.AnnotationObjectType}
+        for object_type, object_id, action in models.JobCommitChange.objects \
+                .filter(commit__in=db_commits).order_by('id') \
+                .values_list('object_type', 'object_id', 'action'):
+            first_actions[object_type].setdefault(object_id, action)
+
+        changes = {
+            'version': self.ir_data.version,
+            'created': {},
+            'updated': {},
+            'deleted': {},
+        }
+        for field, object_type, get_objects, db_model, serializer_class in (
+            ('tags', models.AnnotationObjectType.TAG, self._get_tags,
+                models.LabeledImage, serializers.LabeledImageSerializer),
+            ('shapes', models.AnnotationObjectType.SHAPE, self._get_shapes,
+                models.LabeledShape, serializers.LabeledShapeSerializer),
+            ('tracks', models.AnnotationObjectType.TRACK, self._get_tracks,
+                models.LabeledTrack, serializers.LabeledTrackSerializer),
+        ):
+            actions = first_actions[object_type.value]
+            created, updated = [], []
+            if actions:
+                queryset = db_model.objects.filter(job=self.db_job, id__in=list(actions))
+                for db_object in get_objects(queryset, self.db_attributes):
+                    if actions.pop(db_object.id) == models.ChangeActionChoice.CREATE:
+                        created.append(db_object)
+                    else:
+                        updated.append(db_object)
+
+            changes['created'][field] = serializer_class(created, many=True).data
+            changes['updated'][field] = serializer_class(updated, many=True).data
+            changes['deleted'][field] = sorted(object_id
+                for object_id, action in actions.items()
+                if action != models.ChangeActionChoice.CREATE)
+
+        return changes
 
     @property
     def data(self):
@@ -558,7 +1082,8 @@ class JobAnnotation:
         self.create(task_data.data.slice(self.start_frame, self.stop_frame).serialize())
 
 class TaskAnnotation:
-    def __init__(self, pk):
+    def __init__(self, pk, lock=True):
+        self._lock = lock
         self.db_task = models.Task.objects.prefetch_related("data__images").get(id=pk)
 
         # Postgres doesn't guarantee an order by default without explicit order_by
@@ -569,7 +1094,9 @@ class TaskAnnotation:
         self.ir_data.reset()
 
     def _patch_data(self, data, action):
-        _data = data if isinstance(data, AnnotationIR) else AnnotationIR(data)
+        # Slices of the columnar data share memory with it, so data of
+        # a big task isn't copied for each job at once
+        _data = ColumnarAnnotationIR(data)
         splitted_data = {}
         jobs = {}
         for db_job in self.db_jobs:
@@ -580,6 +1107,7 @@ class TaskAnnotation:
             splitted_data[jid] = _data.slice(start, stop)
 
         for jid, job_data in splitted_data.items():
+            job_data = job_data.to_ir()
             _data = AnnotationIR()
             if action is None:
                 _data.data = put_job_data(jid, job_data)
@@ -609,18 +1137,77 @@ class TaskAnnotation:
             for db_job in self.db_jobs:
                 delete_job_data(db_job.id)
 
+    def _init_jobs_data_from_db(self, db_jobs, all_jobs=True):
+        # Annotations of jobs are loaded by a few queries for the whole
+        # task and are split by jobs after that
+        _, db_attributes = JobAnnotation._get_db_labels(self.db_task)
+        jobs_data = {db_job.id: AnnotationIR() for db_job in db_jobs}
+        for field, get_objects, db_model, serializer_class in (
+            ('tags', JobAnnotation._get_tags, models.LabeledImage,
+                serializers.LabeledImageSerializer),
+            ('shapes', JobAnnotation._get_shapes, models.LabeledShape,
+                serializers.LabeledShapeSerializer),
+            ('tracks', JobAnnotation._get_tracks, models.LabeledTrack,
+                serializers.LabeledTrackSerializer),
+        ):
+            objects_by_job = {db_job.id: [] for db_job in db_jobs}
+            queryset = db_model.objects.filter(job__segment__task_id=self.db_task.id)
+            if not all_jobs:
+                queryset = queryset.filter(job_id__in=objects_by_job)
+            for db_object in get_objects(queryset, db_attributes):
+                objects_by_job[db_object.job_id].append(db_object)
+
+            for job_id, db_objects in objects_by_job.items():
+                jobs_data[job_id][field] = serializer_class(db_objects, many=True).data
+
+        return jobs_data
+
+    def _get_cached_jobs_data(self, db_jobs, jobs_state):
+        cache_keys = {db_job.id: _get_job_data_cache_key(db_job.id, *jobs_state[db_job.id])
+            for db_job in db_jobs}
+        cached_data = cache.get_many(list(cache_keys.values()))
+        jobs_data = {job_id: AnnotationIR(cached_data[cache_key])
+            for job_id, cache_key in cache_keys.items() if cache_key in cached_data}
+
+        db_jobs = [db_job for db_job in db_jobs if db_job.id not in jobs_data]
+        if db_jobs:
+            db_jobs_data = self._init_jobs_data_from_db(db_jobs,
+                all_jobs=len(db_jobs) == len(cache_keys))
+            for job_id, job_data in db_jobs_data.items():
+                job_data.version = jobs_state[job_id][0]
+                cache.set(cache_keys[job_id], job_data.data,
+                    ANNOTATIONS_CACHE_TTL.total_seconds())
+            jobs_data.update(db_jobs_data)
+
+        return jobs_data
+
+    @staticmethod
+    def _has_objects_before(data, frame):
+        return any(obj["frame"] < frame
+            for obj in chain(data.tags, data.shapes, data.tracks))
+
     def init_from_db(self):
         self.reset()
 
-        for db_job in self.db_jobs:
-            annotation = JobAnnotation(db_job.id)
-            annotation.init_from_db()
-            if annotation.ir_data.version > self.ir_data.version:
-                self.ir_data.version = annotation.ir_data.version
+        db_jobs = list(self.db_jobs.select_for_update() if self._lock else self.db_jobs)
+        jobs_state = _get_jobs_state(segment__task_id=self.db_task.id)
+        jobs_data = self._get_cached_jobs_data(db_jobs, jobs_state)
+
+        prev_stop_frame = None
+        for db_job in db_jobs:
             db_segment = db_job.segment
             start_frame = db_segment.start_frame
-            overlap = self.db_task.overlap
-            self._merge_data(annotation.ir_data, start_frame, overlap)
+            job_data = jobs_data[db_job.id]
+            if prev_stop_frame is None or start_frame <= prev_stop_frame or \
+                    self._has_objects_before(job_data, start_frame):
+                self._merge_data(job_data, start_frame, self.db_task.overlap)
+            else:
+                # Nothing can be matched with previous segments
+                AnnotationManager(self.ir_data).append(job_data, start_frame)
+            prev_stop_frame = db_segment.stop_frame
+
+        self.ir_data.version = max((version for version, _ in jobs_state.values()),
+            default=0)
 
     def export(self, dst_file, exporter, host='', **options):
         task_data = TaskData(
@@ -648,12 +1235,33 @@ class TaskAnnotation:
 
 
 @silk_profile(name="GET job data")
-@transaction.atomic
-def get_job_data(pk):
-    annotation = JobAnnotation(pk)
-    annotation.init_from_db()
-
-    return annotation.data
+@read_only_snapshot()
+def get_job_data(pk, start_frame=None, stop_frame=None, bbox=None):
+    if start_frame is not None or stop_frame is not None or bbox is not None:
+        # Parts of annotations are read by indexes and aren't cached
+        annotation = JobAnnotation(pk, lock=False)
+        annotation.init_from_db(start_frame, stop_frame, bbox)
+        return annotation.data
+
+    cache_key = _get_job_data_cache_key(pk, *_get_jobs_state(id=pk)[int(pk)])
+    data = cache.get(cache_key)
+    if data is None:
+        annotation = JobAnnotation(pk, lock=False)
+        annotation.init_from_db()
+        data = annotation.data
+        cache.set(cache_key, data, ANNOTATIONS_CACHE_TTL.total_seconds())
+
+    return data
+
+@silk_profile(name="GET job data changes")
+@read_only_snapshot()
+def get_job_data_changes(pk, version):
+    annotation = JobAnnotation(pk, lock=False)
+    return annotation.get_changes(version)
+
+def get_job_data_etag(pk):
+    version, updated_date = _get_jobs_state(id=pk)[int(pk)]
+    return quote_etag('{}-{}'.format(version, updated_date.timestamp()))
 
 @silk_profile(name="POST job data")
 @transaction.atomic
@@ -690,8 +1298,8 @@ def export_job(job_id, dst_file, format_name,
     # But there is the bug with corrupted dump file in case 2 or
     # more dump request received at the same time:
     # https://github.com/opencv/cvat/issues/217
-    with transaction.atomic():
-        job = JobAnnotation(job_id)
+    with read_only_snapshot():
+        job = JobAnnotation(job_id, lock=False)
         job.init_from_db()
 
     exporter = make_exporter(format_name)
@@ -699,13 +1307,20 @@ def export_job(job_id, dst_file, format_name,
         job.export(f, exporter, host=server_url, save_images=save_images)
 
 @silk_profile(name="GET task data")
-@transaction.atomic
+@read_only_snapshot()
 def get_task_data(pk):
-    annotation = TaskAnnotation(pk)
+    annotation = TaskAnnotation(pk, lock=False)
     annotation.init_from_db()
 
     return annotation.data
 
+def get_task_data_etag(pk):
+    jobs_state = _get_jobs_state(segment__task_id=pk)
+    return quote_etag(hashlib.md5(';'.join( # nosec
+        '{}-{}-{}'.format(job_id, version, updated_date.timestamp())
+        for job_id, (version, updated_date) in jobs_state.items()
+    ).encode()).hexdigest())
+
 @silk_profile(name="POST task data")
 @transaction.atomic
 def put_task_data(pk, data):
@@ -740,8 +1355,8 @@ def export_task(task_id, dst_file, format_name,
     # But there is the bug with corrupted dump file in case 2 or
     # more dump request received at the same time:
     # https://github.com/opencv/cvat/issues/217
-    with transaction.atomic():
-        task = TaskAnnotation(task_id)
+    with read_only_snapshot():
+        task = TaskAnnotation(task_id, lock=False)
         task.init_from_db()
 
     exporter = make_exporter(format_name)
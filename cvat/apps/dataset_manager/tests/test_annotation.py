@@ -2,8 +2,14 @@
 #
 # SPDX-License-Identifier: MIT
 
-from cvat.apps.dataset_manager.annotation import TrackManager
+from cvat.apps.dataset_manager.annotation import (AnnotationIR,
+    InterpolationCache, ShapeManager, TrackManager)
+from cvat.apps.dataset_manager.columnar import ColumnarAnnotationIR
 
+from copy import deepcopy
+
+import numpy as np
+from shapely import geometry
 from unittest import TestCase
 
 
@@ -303,3 +309,237 @@ class TrackManagerTest(TestCase):
 
         interpolated_shapes = TrackManager.get_interpolated_shapes(track, 0, 3)
         self.assertEqual(expected_shapes, interpolated_shapes)
+
+    def test_rotbox_interpolation(self):
+        track = {
+            "frame": 0,
+            "label_id": 0,
+            "group": 0,
+            "source": "manual",
+            "attributes": [{"spec_id": 1, "value": "a"}],
+            "shapes": [
+                {
+                    "frame": 0,
+                    "points": [0.0, 0.0, 4.0, 0.0, 4.0, 4.0, 0.0, 4.0],
+                    "type": "rotbox",
+                    "occluded": False,
+                    "outside": False,
+                    "attributes": [{"spec_id": 2, "value": "b"}]
+                },
+                {
+                    "frame": 4,
+                    "points": [4.0, 0.0, 8.0, 0.0, 8.0, 4.0, 4.0, 4.0],
+                    "type": "rotbox",
+                    "occluded": False,
+                    "outside": True,
+                    "attributes": [{"spec_id": 3, "value": "c"}]
+                },
+            ]
+        }
+        expected_track = deepcopy(track)
+
+        interpolated = TrackManager.get_interpolated_shapes(track, 0, 5)
+
+        self.assertEqual([shape["frame"] for shape in interpolated], [0, 1, 2, 3, 4])
+        self.assertEqual(interpolated[2]["points"], [2.0, 0.0, 6.0, 0.0, 6.0, 4.0, 2.0, 4.0])
+        self.assertEqual([shape["keyframe"] for shape in interpolated],
+            [True, False, False, False, True])
+        # attributes of the previous keyframe are carried forward
+        self.assertEqual([[attr["spec_id"] for attr in shape["attributes"]]
+            for shape in interpolated], [[2], [2], [2], [2], [3, 2]])
+        self.assertEqual(track, expected_track)
+
+        # the source track is not modified by consumers of the shapes
+        for _ in range(2):
+            shapes = TrackManager([track]).to_shapes(5)
+            self.assertEqual([len(shape["attributes"]) for shape in shapes], [2] * 4 + [3])
+        self.assertEqual(track, expected_track)
+
+    def test_interpolation_cache(self):
+        track = self._make_track(0, [(0, [0, 0, 10, 10], False), (4, [4, 0, 14, 10], True)])
+        annotation_ir = AnnotationIR()
+        annotation_ir.tracks = [track]
+        cache = InterpolationCache(annotation_ir)
+
+        shapes = cache.get_interpolated_shapes(track, 0, 10)
+        self.assertIs(shapes, cache.get_interpolated_shapes(track, 0, 10))
+        self.assertEqual(shapes, TrackManager.get_interpolated_shapes(track, 0, 10))
+        self.assertEqual(TrackManager([track]).to_shapes(10, cache),
+            TrackManager([track]).to_shapes(10))
+
+        annotation_ir.version += 1
+        self.assertIsNot(shapes, cache.get_interpolated_shapes(track, 0, 10))
+
+    @staticmethod
+    def _make_track(label_id, shapes):
+        return {
+            "frame": shapes[0][0],
+            "label_id": label_id,
+            "group": 0,
+            "source": "manual",
+            "attributes": [],
+            "shapes": [
+                {
+                    "frame": frame,
+                    "points": points,
+                    "type": "rectangle",
+                    "occluded": False,
+                    "outside": outside,
+                    "attributes": []
+                } for frame, points, outside in shapes
+            ]
+        }
+
+    def test_tracks_similarity(self):
+        track0 = self._make_track(0, [(0, [0, 0, 10, 10], False), (3, [0, 0, 10, 10], True)])
+        track1 = self._make_track(0, [(0, [5, 0, 15, 10], False), (2, [5, 0, 15, 10], True)])
+        track2 = self._make_track(1, [(0, [0, 0, 10, 10], False)])
+
+        similarity = TrackManager._calc_objects_similarity_matrix(
+            [track0, track1], [track0, track1, track2], 0, 4)
+
+        # frames 0-1: IoU 1/3, frame 2: different outside, frame 3: one shape
+        np.testing.assert_allclose(similarity, [[1, 1 / 6, 0], [1 / 6, 1, 0]])
+        self.assertAlmostEqual(TrackManager._calc_objects_similarity(
+            track0, track1, 0, 4), 1 / 6)
+
+
+class ShapeManagerTest(TestCase):
+    @staticmethod
+    def _make_shape(shape_type, points, label_id=0):
+        return {
+            "frame": 0,
+            "label_id": label_id,
+            "type": shape_type,
+            "points": points,
+        }
+
+    @staticmethod
+    def _polygon_iou(points0, points1):
+        p0 = geometry.Polygon(zip(points0[0::2], points0[1::2]))
+        p1 = geometry.Polygon(zip(points1[0::2], points1[1::2]))
+        intersection = p0.intersection(p1).area
+        return intersection / (p0.area + p1.area - intersection)
+
+    def test_rectangle_similarity(self):
+        shapes0 = [
+            self._make_shape("rectangle", [0, 0, 10, 10]),
+            self._make_shape("rectangle", [20, 20, 30, 30]),
+        ]
+        shapes1 = [
+            self._make_shape("rectangle", [5, 0, 15, 10]),
+            self._make_shape("rectangle", [0, 0, 10, 10], label_id=1),
+        ]
+
+        similarity = ShapeManager._calc_objects_similarity_matrix(shapes0, shapes1, 0, 0)
+
+        np.testing.assert_allclose(similarity, [[1 / 3, 0], [0, 0]])
+
+    def test_rotbox_similarity(self):
+        rotboxes = [
+            [5, 0, 10, 5, 5, 10, 0, 5],
+            [0, 0, 10, 0, 10, 10, 0, 10],
+            [10, 0, 10, 10, 0, 10, 0, 0], # clockwise
+            [0, 0, 10, 10, 10, 0, 0, 10], # self-intersecting
+        ]
+        shapes = [self._make_shape("rotbox", points) for points in rotboxes]
+
+        similarity = ShapeManager._calc_objects_similarity_matrix(shapes, shapes, 0, 0)
+
+        expected = np.zeros((4, 4))
+        for i in range(3):
+            for j in range(3):
+                expected[i][j] = self._polygon_iou(rotboxes[i], rotboxes[j])
+        np.testing.assert_allclose(similarity, expected)
+        self.assertEqual(ShapeManager._calc_objects_similarity(
+            shapes[0], shapes[1], 0, 0), similarity[0][1])
+
+    def test_different_types_are_not_similar(self):
+        shapes0 = [self._make_shape("polygon", [0, 0, 10, 0, 10, 10, 0, 10])]
+        shapes1 = [self._make_shape("rotbox", [0, 0, 10, 0, 10, 10, 0, 10])]
+
+        similarity = ShapeManager._calc_objects_similarity_matrix(shapes0, shapes1, 0, 0)
+
+        np.testing.assert_array_equal(similarity, [[0]])
+
+    def test_match_objects_by_components(self):
+        # two groups of overlapping boxes far from each other
+        shapes0 = [
+            self._make_shape("rectangle", [0, 0, 10, 10]),
+            self._make_shape("rectangle", [1, 0, 11, 10]),
+            self._make_shape("rectangle", [1000, 1000, 1010, 1010]),
+            self._make_shape("rectangle", [500, 500, 510, 510]),
+        ]
+        shapes1 = [
+            self._make_shape("rectangle", [1001, 1000, 1011, 1010]),
+            self._make_shape("rectangle", [1, 0, 11, 10]),
+            self._make_shape("rectangle", [0, 1, 10, 11]),
+        ]
+
+        matches = ShapeManager([])._match_objects(shapes0, shapes1, 0, 0)
+
+        self.assertEqual(sorted((int(i), int(j)) for i, j in matches),
+            [(0, 2), (1, 1), (2, 0)])
+
+
+class ColumnarAnnotationIRTest(TestCase):
+    @staticmethod
+    def _make_data():
+        def make_tag(frame, **kwargs):
+            tag = {
+                "id": None,
+                "frame": frame,
+                "label_id": 1,
+                "group": None,
+                "source": "manual",
+                "attributes": [],
+            }
+            tag.update(kwargs)
+            return tag
+
+        def make_shape(frame, points, **kwargs):
+            shape = make_tag(frame, type="rectangle", occluded=False,
+                z_order=0, points=points)
+            shape.update(kwargs)
+            return shape
+
+        return {
+            "version": 2,
+            "tags": [
+                make_tag(3, id=1, attributes=[{"spec_id": 1, "value": "a"}]),
+                make_tag(0, id=2, group=1, source="auto"),
+            ],
+            "shapes": [
+                make_shape(5, [0.0, 0.0, 1.0, 1.0], id=3,
+                    attributes=[{"spec_id": 2, "value": "b"}]),
+                make_shape(1, [0.0, 0.0, 1.0, 1.0, 2.0, 0.0], type="polygon",
+                    z_order=1, occluded=True,
+                    attributes=[{"spec_id": 2, "value": "c"}, {"spec_id": 3, "value": "b"}]),
+                make_shape(3, [1.0, 1.0, 2.0, 2.0], label_id=2),
+                make_shape(1, [2.0, 2.0, 3.0, 3.0], group=2),
+            ],
+            "tracks": [],
+        }
+
+    def test_slice(self):
+        data = self._make_data()
+        columnar_ir = ColumnarAnnotationIR(data)
+
+        for start, stop in [(0, 10), (1, 3), (2, 2), (4, 5), (6, 10)]:
+            expected = AnnotationIR(deepcopy(data)).slice(start, stop)
+            sliced = columnar_ir.slice(start, stop).to_ir()
+            # columnar objects are sorted by frame
+            self.assertEqual(sliced.tags,
+                sorted(expected.tags, key=lambda tag: tag["frame"]))
+            self.assertEqual(sliced.shapes,
+                sorted(expected.shapes, key=lambda shape: shape["frame"]))
+
+    def test_slice_shares_columns(self):
+        columnar_ir = ColumnarAnnotationIR(self._make_data())
+
+        shapes = columnar_ir.slice(1, 3).shapes
+
+        self.assertEqual(len(shapes), 3)
+        self.assertTrue(np.shares_memory(shapes.frames, columnar_ir.shapes.frames))
+        self.assertEqual(shapes[1:][0], shapes[1])
+        self.assertEqual(shapes[-1]["frame"], 3)
@@ -399,10 +399,11 @@ def push(tid, user, scheme, host):
         try:
             _git = Git(db_git, db_task, user)
             _git.init_repos()
-            _git.push(user, scheme, host, db_task, db_task.updated_date)
+            updated_date = db_task.get_updated_date()
+            _git.push(user, scheme, host, db_task, updated_date)
 
             # Update timestamp
-            db_git.sync_date = db_task.updated_date
+            db_git.sync_date = updated_date
             db_git.status = GitStatusChoice.SYNCED
             db_git.save()
         except git.exc.GitCommandError as ex:
@@ -434,7 +435,7 @@ def get(tid, user):
                 try:
                     _git = Git(db_git, db_task, user)
                     _git.init_repos(True)
-                    db_git.status = _git.remote_status(db_task.updated_date)
+                    db_git.status = _git.remote_status(db_task.get_updated_date())
                     response['status']['value'] = str(db_git.status)
                     response['format'] = str(db_git.format)
                 except git.exc.GitCommandError as ex:
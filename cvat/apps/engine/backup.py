@@ -19,6 +19,7 @@ from cvat.apps.engine.log import slogger
 from cvat.apps.engine.serializers import (AttributeSerializer, DataSerializer,
     LabeledDataSerializer, SegmentSerializer, SimpleJobSerializer, TaskSerializer,
     ReviewSerializer, IssueSerializer, CommentSerializer)
+from cvat.apps.engine.signals import refresh_task_status
 from cvat.apps.engine.utils import av_scan_paths
 from cvat.apps.engine.models import StorageChoice, StorageMethodChoice, DataChoice
 from cvat.apps.engine.task import _create_thread
@@ -525,10 +526,14 @@ class TaskImporter(_TaskBackupBase):
         db_data.storage = StorageChoice.LOCAL
         db_data.save(update_fields=['start_frame', 'stop_frame', 'frame_filter', 'storage'])
 
-        for db_job, job in zip(self._get_db_jobs(), jobs):
+        # statuses are updated in bulk to recompute the task status only once
+        db_jobs = list(self._get_db_jobs())
+        for db_job, job in zip(db_jobs, jobs):
             db_job.status = job['status']
-            db_job.save()
+        models.Job.objects.bulk_update(db_jobs, ['status'])
+        refresh_task_status(self._db_task)
 
+        for db_job, job in zip(db_jobs, jobs):
             for review in job['reviews']:
                 _create_review(review, db_job)
 
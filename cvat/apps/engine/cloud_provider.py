@@ -10,6 +10,7 @@ from enum import Enum
 from io import BytesIO
 
 from boto3.s3.transfer import TransferConfig
+from botocore.client import Config
 from botocore.exceptions import ClientError
 from botocore.handlers import disable_signing
 
@@ -20,6 +21,8 @@ from azure.storage.blob import PublicAccess
 from google.cloud import storage
 from google.cloud.exceptions import NotFound as GoogleCloudNotFound, Forbidden as GoogleCloudForbidden
 
+from django.conf import settings
+
 from cvat.apps.engine.log import slogger
 from cvat.apps.engine.models import CredentialsTypeChoice, CloudProviderChoice
 
@@ -107,7 +110,8 @@ def get_cloud_storage_instance(cloud_provider, resource, credentials, specific_a
             access_key_id=credentials.key,
             secret_key=credentials.secret_key,
             session_token=credentials.session_token,
-            region=specific_attributes.get('region', 'us-east-2')
+            region=specific_attributes.get('region', 'us-east-2'),
+            endpoint_url=settings.CLOUD_STORAGE_S3_ENDPOINT_URL
         )
     elif cloud_provider == CloudProviderChoice.AZURE_CONTAINER:
         instance = AzureBlobContainer(
@@ -136,28 +140,37 @@ class AWS_S3(_CloudStorage):
                 region,
                 access_key_id=None,
                 secret_key=None,
-                session_token=None):
+                session_token=None,
+                endpoint_url=None):
         super().__init__()
+        # endpoint_url allows to work with S3-compatible storages (e.g. MinIO
+        # or a local fake server), they usually support only path-style addressing
+        resource_kwargs = {
+            'region_name': region,
+        }
+        if endpoint_url:
+            resource_kwargs['endpoint_url'] = endpoint_url
+            resource_kwargs['config'] = Config(s3={'addressing_style': 'path'})
         if all([access_key_id, secret_key, session_token]):
             self._s3 = boto3.resource(
                 's3',
                 aws_access_key_id=access_key_id,
                 aws_secret_access_key=secret_key,
                 aws_session_token=session_token,
-                region_name=region
+                **resource_kwargs
             )
         elif access_key_id and secret_key:
             self._s3 = boto3.resource(
                 's3',
                 aws_access_key_id=access_key_id,
                 aws_secret_access_key=secret_key,
-                region_name=region
+                **resource_kwargs
             )
         elif any([access_key_id, secret_key, session_token]):
             raise Exception('Insufficient data for authorization')
         # anonymous access
         if not any([access_key_id, secret_key, session_token]):
-            self._s3 = boto3.resource('s3', region_name=region)
+            self._s3 = boto3.resource('s3', **resource_kwargs)
             self._s3.meta.client.meta.events.register('choose-signer.s3.*', disable_signing)
         self._client_s3 = self._s3.meta.client
         self._bucket = self._s3.Bucket(bucket)
@@ -8,15 +8,16 @@ import shutil
 import zipfile
 import io
 import itertools
-import struct
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from contextlib import closing
+from functools import lru_cache
 
 import av
 import numpy as np
 from pyunpack import Archive
 from PIL import Image, ImageFile
-import open3d as o3d
 from cvat.apps.engine.utils import rotate_image
 from cvat.apps.engine.models import DimensionType
 
@@ -27,13 +28,33 @@ ImageFile.LOAD_TRUNCATED_IMAGES = True
 from cvat.apps.engine.mime_types import mimetypes
 from utils.dataset_manifest import VideoManifestManager, ImageManifestManager
 
-def get_mime(name):
+def _get_name_suffix(name):
+    # mimetypes uses only the last suffix and the encoding suffix (e.g. '.tar.gz')
+    basename = os.path.basename(name)
+    parts = basename.lstrip('.').rsplit('.', 2)
+    return '.' + '.'.join(parts[1:]).lower() if len(parts) > 1 else ''
+
+@lru_cache(maxsize=1024)
+def _get_mime_by_suffix(suffix):
+    name = 'file' + suffix
     for type_name, type_def in MEDIA_TYPES.items():
-        if type_def['has_mime_type'](name):
+        if type_name != 'directory' and type_def['has_mime_type'](name):
             return type_name
-
     return 'unknown'
 
+def _get_file_mime(name):
+    return _get_mime_by_suffix(_get_name_suffix(name))
+
+def get_mime(name):
+    # the media type is defined by the name suffix only,
+    # so the result is cached, except of directories
+    mime = _get_file_mime(name)
+    if mime in ('image', 'video', 'archive'):
+        return mime
+    if _is_dir(name):
+        return 'directory'
+    return mime
+
 def create_tmp_dir():
     return tempfile.mkdtemp(prefix='cvat-', suffix='.data')
 
@@ -47,6 +68,126 @@ def files_to_ignore(directory):
         return True
     return False
 
+class MediaScanner:
+    """
+    Scans directory trees with os.scandir in several threads and keeps
+    the listing, so different consumers (readers, dimension validation,
+    detection of related images) don't walk the same directories again.
+    Symbolic links to directories are listed, but not followed (as os.walk does).
+    """
+
+    def __init__(self, max_workers=8):
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        # directory path -> (file names, directory names, symbolic links to directories)
+        self._entries = {}
+
+    @staticmethod
+    def _normpath(path):
+        return os.path.normpath(os.path.abspath(path))
+
+    @staticmethod
+    def _scan_dir(path):
+        files, dirs, links = [], [], set()
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        dirs.append(entry.name)
+                        if entry.is_symlink():
+                            links.add(entry.name)
+                    else:
+                        files.append(entry.name)
+        except (FileNotFoundError, NotADirectoryError):
+            return path, None
+        return path, (files, dirs, links)
+
+    def scan(self, paths):
+        pending = [self._normpath(p) for p in paths]
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = set()
+            def submit(path):
+                if path not in self._entries:
+                    futures.add(executor.submit(self._scan_dir, path))
+                else:
+                    # the directory was scanned, but its subdirectories may not be
+                    for subdir in self._subdirs(path):
+                        submit(subdir)
+
+            for path in pending:
+                submit(path)
+            while futures:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, entries = future.result()
+                    if entries is None:
+                        continue
+                    with self._lock:
+                        self._entries[path] = entries
+                    for subdir in self._subdirs(path):
+                        submit(subdir)
+        return self
+
+    def refresh(self, path):
+        path, entries = self._scan_dir(self._normpath(path))
+        with self._lock:
+            if entries is None:
+                self._entries.pop(path, None)
+            else:
+                self._entries[path] = entries
+
+    def _subdirs(self, path):
+        _, dirs, links = self._entries[path]
+        return [os.path.join(path, d) for d in dirs if d not in links]
+
+    def _get_entries(self, path):
+        path = self._normpath(path)
+        entries = self._entries.get(path)
+        if entries is None:
+            self.refresh(path)
+            entries = self._entries.get(path)
+        return entries
+
+    def walk(self, top):
+        """Generates (root, dirs, files) tuples like os.walk() does"""
+        top = self._normpath(top)
+        self.scan([top])
+        stack = [top] if top in self._entries else []
+        while stack:
+            root = stack.pop()
+            files, dirs, _ = self._entries[root]
+            yield root, list(dirs), list(files)
+            stack.extend(reversed([d for d in self._subdirs(root) if d in self._entries]))
+
+    def listdir(self, path):
+        entries = self._get_entries(path)
+        if entries is None:
+            raise FileNotFoundError(path)
+        return entries[0] + entries[1]
+
+    def isdir(self, path):
+        path = self._normpath(path)
+        if path in self._entries:
+            return True
+        parent_entries = self._entries.get(os.path.dirname(path))
+        if parent_entries is not None:
+            return os.path.basename(path) in parent_entries[1]
+        return os.path.isdir(path)
+
+    def get_files(self, paths, mime=None):
+        """Returns absolute paths of files from the directory trees"""
+        self.scan(paths)
+        result = []
+        for path in paths:
+            for root, _, files in self.walk(path):
+                result.extend(os.path.join(root, f) for f in files
+                    if mime is None or _get_file_mime(f) == mime)
+        return result
+
 class IMediaReader(ABC):
     def __init__(self, source_path, step, start, stop, dimension):
         self._source_path = sorted(source_path)
@@ -163,13 +304,10 @@ class ImageListReader(IMediaReader):
         return [self.get_path(idx) for idx, _ in enumerate(self._source_path)]
 
 class DirectoryReader(ImageListReader):
-    def __init__(self, source_path, step=1, start=0, stop=None, dimension=DimensionType.DIM_2D):
-        image_paths = []
-        for source in source_path:
-            for root, _, files in os.walk(source):
-                paths = [os.path.join(root, f) for f in files]
-                paths = filter(lambda x: get_mime(x) == 'image', paths)
-                image_paths.extend(paths)
+    def __init__(self, source_path, step=1, start=0, stop=None, dimension=DimensionType.DIM_2D,
+            scanner=None):
+        scanner = scanner or MediaScanner()
+        image_paths = scanner.get_files(source_path, 'image')
         super().__init__(
             source_path=image_paths,
             step=step,
@@ -179,7 +317,8 @@ class DirectoryReader(ImageListReader):
         )
 
 class ArchiveReader(DirectoryReader):
-    def __init__(self, source_path, step=1, start=0, stop=None, dimension=DimensionType.DIM_2D):
+    def __init__(self, source_path, step=1, start=0, stop=None, dimension=DimensionType.DIM_2D,
+            scanner=None):
         self._archive_source = source_path[0]
         extract_dir = source_path[1] if len(source_path) > 1 else os.path.dirname(source_path[0])
         Archive(self._archive_source).extractall(extract_dir)
@@ -190,32 +329,38 @@ class ArchiveReader(DirectoryReader):
             step=step,
             start=start,
             stop=stop,
-            dimension=dimension
+            dimension=dimension,
+            scanner=scanner,
         )
 
 class PdfReader(ImageListReader):
-    def __init__(self, source_path, step=1, start=0, stop=None, dimension=DimensionType.DIM_2D):
+    """
+    Pages are rendered by several threads on demand, so the chunks can be
+    prepared while next pages are being rendered. extract() must be called
+    at the end to render all other pages and remove the PDF file.
+    """
+
+    def __init__(self, source_path, step=1, start=0, stop=None, dimension=DimensionType.DIM_2D,
+            dpi=200, threads=4):
         if not source_path:
             raise Exception('No PDF found')
 
+        from pdf2image import pdfinfo_from_path
         self._pdf_source = source_path[0]
+        self._dpi = dpi
+        self._threads = max(1, threads)
+        self._rendered_pages = set()
 
-        _basename = os.path.splitext(os.path.basename(self._pdf_source))[0]
-        _counter = itertools.count()
-        def _make_name():
-            for page_num in _counter:
-                yield '{}{:09d}.jpeg'.format(_basename, page_num)
-
-        from pdf2image import convert_from_path
+        self._basename = os.path.splitext(os.path.basename(self._pdf_source))[0]
         self._tmp_dir = os.path.dirname(source_path[0])
         os.makedirs(self._tmp_dir, exist_ok=True)
 
         # Avoid OOM: https://github.com/openvinotoolkit/cvat/issues/940
-        paths = convert_from_path(self._pdf_source,
-            last_page=stop, paths_only=True,
-            output_folder=self._tmp_dir, fmt="jpeg", output_file=_make_name())
-
-        os.remove(source_path[0])
+        # pages are rendered to files instead of the memory
+        page_count = pdfinfo_from_path(self._pdf_source)['Pages']
+        if stop is not None:
+            page_count = min(page_count, stop)
+        paths = [self._get_page_path(page) for page in range(page_count)]
 
         super().__init__(
             source_path=paths,
@@ -225,10 +370,82 @@ class PdfReader(ImageListReader):
             dimension=dimension,
         )
 
+    def _get_page_path(self, page):
+        return os.path.join(self._tmp_dir, '{}{:09d}.jpeg'.format(self._basename, page))
+
+    def _render_page(self, page):
+        if page in self._rendered_pages:
+            return
+        from pdf2image import convert_from_path
+        path = self._get_page_path(page)
+        rendered_paths = convert_from_path(self._pdf_source, dpi=self._dpi,
+            first_page=page + 1, last_page=page + 1, single_file=True, paths_only=True,
+            output_folder=self._tmp_dir, fmt='jpeg',
+            output_file=os.path.splitext(os.path.basename(path))[0])
+        if rendered_paths[0] != path:
+            os.replace(rendered_paths[0], path)
+        self._rendered_pages.add(page)
+
+    def __iter__(self):
+        frames = iter(self.frame_range)
+        with ThreadPoolExecutor(max_workers=self._threads) as executor:
+            pending = [(i, executor.submit(self._render_page, i))
+                for i in itertools.islice(frames, 2 * self._threads)]
+            while pending:
+                i, future = pending.pop(0)
+                future.result()
+                for next_frame in itertools.islice(frames, 1):
+                    pending.append((next_frame, executor.submit(self._render_page, next_frame)))
+                yield (self.get_image(i), self.get_path(i), i)
+
+    def get_preview(self):
+        self._render_page(0)
+        return super().get_preview()
+
+    def get_image_size(self, i):
+        self._render_page(i)
+        return super().get_image_size(i)
+
+    def extract(self):
+        with ThreadPoolExecutor(max_workers=self._threads) as executor:
+            for future in [executor.submit(self._render_page, page)
+                    for page in range(len(self._source_path))]:
+                future.result()
+        if os.path.exists(self._pdf_source):
+            os.remove(self._pdf_source)
+
+class _ArchiveListing:
+    """
+    Provides listdir() and isdir() for archive members as if they
+    were extracted to the root directory, without an extraction.
+    """
+
+    def __init__(self, names, root):
+        self._dirs = { os.path.normpath(root): set() }
+        for name in names:
+            path = os.path.normpath(os.path.join(root, name))
+            if name.endswith('/'):
+                self._dirs.setdefault(path, set())
+            parent = os.path.dirname(path)
+            while path != parent and path.startswith(root):
+                self._dirs.setdefault(parent, set()).add(os.path.basename(path))
+                path, parent = parent, os.path.dirname(parent)
+
+    def listdir(self, path):
+        path = os.path.normpath(path)
+        if path not in self._dirs:
+            raise FileNotFoundError(path)
+        return list(self._dirs[path])
+
+    def isdir(self, path):
+        return os.path.normpath(path) in self._dirs
+
 class ZipReader(ImageListReader):
     def __init__(self, source_path, step=1, start=0, stop=None, dimension=DimensionType.DIM_2D):
         self._zip_source = zipfile.ZipFile(source_path[0], mode='r')
         self.extract_dir = source_path[1] if len(source_path) > 1 else None
+        self._extract_on_read = False
+        self._extracted_files = set()
         file_list = [f for f in self._zip_source.namelist() if files_to_ignore(f) and get_mime(f) == 'image']
         super().__init__(file_list, step=step, start=start, stop=stop, dimension=dimension)
 
@@ -254,7 +471,10 @@ class ZipReader(ImageListReader):
     def get_image(self, i):
         if self._dimension == DimensionType.DIM_3D:
             return self.get_path(i)
-        return io.BytesIO(self._zip_source.read(self._source_path[i]))
+        data = self._zip_source.read(self._source_path[i])
+        if self._extract_on_read:
+            self._write_member(self._source_path[i], data)
+        return io.BytesIO(data)
 
     def get_zip_filename(self):
         return self._zip_source.filename
@@ -275,8 +495,42 @@ class ZipReader(ImageListReader):
             dimension=dimension,
         )
 
+    def _get_extract_dir(self):
+        return self.extract_dir if self.extract_dir else os.path.dirname(self._zip_source.filename)
+
+    def _write_member(self, name, data):
+        extract_dir = os.path.abspath(self._get_extract_dir())
+        path = os.path.abspath(os.path.join(extract_dir, name))
+        if os.path.commonpath([extract_dir, path]) != extract_dir:
+            raise Exception("Bad file path in the archive: " + name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self._extracted_files.add(name)
+
+    def contains_point_clouds(self):
+        return any(os.path.splitext(f)[1].lower() in ('.pcd', '.bin')
+            for f in self._zip_source.namelist())
+
+    def extract_on_read(self):
+        """
+        Write images to the disk when they are read, so the images are
+        decompressed once for both: the persistent copy and the chunks.
+        extract() must be called at the end to write all other files.
+        """
+        self._extract_on_read = True
+
+    def get_listing(self):
+        return _ArchiveListing(
+            [f for f in self._zip_source.namelist() if files_to_ignore(f)],
+            os.path.abspath(self._get_extract_dir()))
+
     def extract(self):
-        self._zip_source.extractall(self.extract_dir if self.extract_dir else os.path.dirname(self._zip_source.filename))
+        extract_dir = self._get_extract_dir()
+        for member in self._zip_source.infolist():
+            if member.filename not in self._extracted_files and files_to_ignore(member.filename):
+                self._zip_source.extract(member, extract_dir)
+        self._extract_on_read = False
         if not self.extract_dir:
             os.remove(self._zip_source.filename)
 
@@ -464,6 +718,80 @@ class VideoDatasetManifestReader(FragmentMediaReader):
                     else:
                         return
 
+_PCD_TYPES = {
+    ('F', 4): '<f4', ('F', 8): '<f8',
+    ('I', 1): '<i1', ('I', 2): '<i2', ('I', 4): '<i4', ('I', 8): '<i8',
+    ('U', 1): '<u1', ('U', 2): '<u2', ('U', 4): '<u4', ('U', 8): '<u8',
+}
+
+def _make_pcd_header(fields, sizes, types, counts, points, data='binary', viewpoint='0 0 0 1 0 0 0'):
+    return '\n'.join((
+        '# .PCD v0.7 - Point Cloud Data file format',
+        'VERSION 0.7',
+        'FIELDS ' + ' '.join(fields),
+        'SIZE ' + ' '.join(map(str, sizes)),
+        'TYPE ' + ' '.join(types),
+        'COUNT ' + ' '.join(map(str, counts)),
+        'WIDTH {}'.format(points),
+        'HEIGHT 1',
+        'VIEWPOINT ' + viewpoint,
+        'POINTS {}'.format(points),
+        'DATA ' + data,
+    )) + '\n'
+
+def _downsample_pcd(data, voxel_size):
+    """
+    Keeps one point per voxel of the specified size. All point fields are kept
+    unchanged. Returns None if the file format is not supported
+    (e.g. binary_compressed data) or the cloud has no x, y, z fields.
+    """
+    header_end = 0
+    header = {}
+    for line in io.BytesIO(data):
+        header_end += len(line)
+        line = line.decode('utf-8').strip()
+        if not line or line.startswith('#'):
+            continue
+        key, value = (line.split(' ', maxsplit=1) + [''])[:2]
+        header[key] = value.strip()
+        if key == 'DATA':
+            break
+
+    try:
+        fields = header['FIELDS'].split()
+        sizes = list(map(int, header['SIZE'].split()))
+        types = header['TYPE'].split()
+        counts = list(map(int, header['COUNT'].split())) if 'COUNT' in header else [1] * len(fields)
+        points = int(header['POINTS'])
+        if not {'x', 'y', 'z'}.issubset(fields):
+            return None
+
+        body = data[header_end:]
+        if header['DATA'] == 'binary':
+            dtype = np.dtype([(field, _PCD_TYPES[(t, size)], (count,) if count > 1 else ())
+                for field, size, t, count in zip(fields, sizes, types, counts)])
+            cloud = np.frombuffer(body, dtype=dtype, count=points)
+            xyz = np.stack([cloud['x'], cloud['y'], cloud['z']], axis=1)
+        elif header['DATA'] == 'ascii':
+            lines = body.splitlines()[:points]
+            columns = np.cumsum([0] + counts)
+            xyz = np.loadtxt(lines, usecols=[columns[fields.index(c)] for c in 'xyz'], ndmin=2)
+        else:
+            return None
+    except (KeyError, ValueError):
+        return None
+
+    finite = np.flatnonzero(np.isfinite(xyz).all(axis=1))
+    voxels = np.floor(xyz[finite] / voxel_size).astype(np.int64)
+    _, selected = np.unique(voxels, axis=0, return_index=True)
+    selected = finite[np.sort(selected)]
+
+    downsampled_header = _make_pcd_header(fields, sizes, types, counts, len(selected),
+        data=header['DATA'], viewpoint=header.get('VIEWPOINT', '0 0 0 1 0 0 0')).encode()
+    if header['DATA'] == 'ascii':
+        return downsampled_header + b'\n'.join(lines[i] for i in selected) + b'\n'
+    return downsampled_header + cloud[selected].tobytes()
+
 class IChunkWriter(ABC):
     def __init__(self, quality, dimension=DimensionType.DIM_2D):
         self._image_quality = quality
@@ -514,17 +842,35 @@ class ZipCompressedChunkWriter(IChunkWriter):
                     w, h, image_buf = self._compress_image(image, self._image_quality)
                     extension = "jpeg"
                 else:
-                    image_buf = open(image, "rb") if isinstance(image, str) else image
-                    properties = ValidateDimension.get_pcd_properties(image_buf)
-                    w, h = int(properties["WIDTH"]), int(properties["HEIGHT"])
+                    w, h, image_buf = self._compress_point_cloud(image, self._image_quality)
                     extension = "pcd"
-                    image_buf.seek(0, 0)
-                    image_buf = io.BytesIO(image_buf.read())
                 image_sizes.append((w, h))
                 arcname = '{:06d}.{}'.format(idx, extension)
-                zip_chunk.writestr(arcname, image_buf.getvalue())
+                # JPEG images can't be compressed anymore, but point clouds can
+                compress_type = zipfile.ZIP_STORED if self._dimension == DimensionType.DIM_2D \
+                    else zipfile.ZIP_DEFLATED
+                zip_chunk.writestr(arcname, image_buf.getvalue(), compress_type=compress_type)
         return image_sizes
 
+    @staticmethod
+    def _compress_point_cloud(image, quality):
+        # The compressed tier keeps one point per voxel, the voxel size depends on
+        # the quality: 100 - the full resolution, 70 (default) - 5 cm, 40 - 10 cm.
+        # Coordinates are kept as float32, because the client can't read others.
+        if isinstance(image, str):
+            with open(image, 'rb') as f:
+                data = f.read()
+        else:
+            image.seek(0, 0)
+            data = image.read()
+        properties = ValidateDimension.get_pcd_properties(io.BytesIO(data))
+        w, h = int(properties["WIDTH"]), int(properties["HEIGHT"])
+
+        voxel_size = (100 - quality) / 600
+        if voxel_size > 0:
+            data = _downsample_pcd(data, voxel_size) or data
+        return w, h, io.BytesIO(data)
+
 class Mpeg4ChunkWriter(IChunkWriter):
     def __init__(self, quality=67):
         # translate inversed range [1:100] to [0:51]
@@ -718,12 +1064,14 @@ MEDIA_TYPES = {
 
 class ValidateDimension:
 
-    def __init__(self, path=None):
+    def __init__(self, path=None, scanner=None):
         self.dimension = DimensionType.DIM_2D
         self.path = path
+        self.scanner = scanner or MediaScanner()
         self.related_files = {}
         self.image_files = {}
         self.converted_files = []
+        self._converted_bin_files = {}
 
     @staticmethod
     def get_pcd_properties(fp, verify_version=False):
@@ -749,28 +1097,35 @@ class ValidateDimension:
 
     @staticmethod
     def convert_bin_to_pcd(path, delete_source=True):
-        list_pcd = []
-        with open(path, "rb") as f:
-            size_float = 4
-            byte = f.read(size_float * 4)
-            while byte:
-                x, y, z, _ = struct.unpack("ffff", byte)
-                list_pcd.append([x, y, z])
-                byte = f.read(size_float * 4)
-        np_pcd = np.asarray(list_pcd)
-        pcd = o3d.geometry.PointCloud()
-        pcd.points = o3d.utility.Vector3dVector(np_pcd)
+        # KITTI .bin files contain float32 (x, y, z, reflectance) values for each point
+        points = np.fromfile(path, dtype=np.float32).reshape(-1, 4)[:, :3]
+        header = _make_pcd_header(fields='xyz', sizes=(4, 4, 4), types='FFF',
+            counts=(1, 1, 1), points=len(points))
         pcd_filename = path.replace(".bin", ".pcd")
-        o3d.io.write_point_cloud(pcd_filename, pcd)
+        with open(pcd_filename, 'wb') as f:
+            f.write(header.encode())
+            f.write(np.ascontiguousarray(points).tobytes())
         if delete_source:
             os.remove(path)
         return pcd_filename
 
+    @staticmethod
+    def convert_bin_files(paths, max_workers=None):
+        if len(paths) < 2:
+            return [ValidateDimension.convert_bin_to_pcd(path) for path in paths]
+        # Threads are used instead of processes: the conversion is file I/O
+        # and numpy copies, which release the GIL, and the task is created
+        # inside a transaction, so forked workers would share its connection
+        max_workers = min(max_workers or os.cpu_count() or 1, len(paths))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(ValidateDimension.convert_bin_to_pcd, paths))
+
     def set_path(self, path):
         self.path = path
 
     def bin_operation(self, file_path, actual_path):
-        pcd_path = ValidateDimension.convert_bin_to_pcd(file_path)
+        pcd_path = self._converted_bin_files.pop(file_path, None) or \
+            ValidateDimension.convert_bin_to_pcd(file_path)
         self.converted_files.append(pcd_path)
         return pcd_path.split(actual_path)[-1][1:]
 
@@ -800,7 +1155,7 @@ class ValidateDimension:
                     pcd_files[file_name] = path
                     self.related_files[path] = []
             else:
-                if _is_image(file_path):
+                if _get_file_mime(file) == 'image':
                     self.image_files[file_name] = file_path
         return pcd_files
 
@@ -811,11 +1166,19 @@ class ValidateDimension:
         if not self.path:
             return
         actual_path = self.path
-        for root, _, files in os.walk(actual_path):
-            if not files_to_ignore(root):
-                continue
+        tree = [(root, files) for root, _, files in self.scanner.walk(actual_path)
+            if files_to_ignore(root)]
+
+        # point clouds are converted in parallel before the processing
+        bin_files = [os.path.abspath(os.path.join(root, f)) for root, files in tree
+            for f in files if os.path.splitext(f)[1] == '.bin']
+        self._converted_bin_files = dict(zip(bin_files, self.convert_bin_files(bin_files)))
 
+        for root, files in tree:
+            converted_files = len(self.converted_files)
             self.process_files(root, actual_path, files)
+            if converted_files != len(self.converted_files):
+                self.scanner.refresh(root)
 
         if len(self.related_files.keys()):
             self.dimension = DimensionType.DIM_3D
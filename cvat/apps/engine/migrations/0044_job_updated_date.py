@@ -0,0 +1,30 @@
+# Generated by Django 3.1.13 on 2021-11-08 10:12
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.utils.timezone
+
+
+def copy_task_updated_date(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Task = apps.get_model('engine', 'Task')
+    Job = apps.get_model('engine', 'Job')
+    Job.objects.using(db_alias).update(updated_date=Subquery(
+        Task.objects.using(db_alias).filter(segment__job=OuterRef('pk')) \
+            .values('updated_date')[:1]
+    ))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engine', '0043_auto_20211027_0718'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='updated_date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_task_updated_date, migrations.RunPython.noop),
+    ]
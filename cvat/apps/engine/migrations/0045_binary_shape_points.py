@@ -0,0 +1,115 @@
+# Generated by Django 3.1.13 on 2021-11-15 09:40
+
+from django.db import migrations
+import cvat.apps.engine.models
+
+SHAPE_MODELS = ('labeledshape', 'trackedshape')
+
+def convert_points(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    for model_name in SHAPE_MODELS:
+        db_model = apps.get_model('engine', model_name)
+        if schema_editor.connection.vendor == 'postgresql':
+            # float8send() returns the same big-endian float64 values
+            # as BinaryFloatArrayField, so rows aren't transferred
+            table = schema_editor.quote_name(db_model._meta.db_table)
+            schema_editor.execute("""
+                UPDATE {} SET binary_points = COALESCE((
+                    SELECT string_agg(float8send(value::float8), ''::bytea ORDER BY idx)
+                    FROM unnest(string_to_array(points, ',')) WITH ORDINALITY AS t(value, idx)
+                    WHERE value <> ''
+                ), ''::bytea)
+            """.format(table))
+        else:
+            db_shapes = []
+            for db_shape in db_model.objects.using(db_alias).only('id', 'points').iterator():
+                db_shape.binary_points = db_shape.points or []
+                db_shapes.append(db_shape)
+                if len(db_shapes) == 1000:
+                    db_model.objects.using(db_alias).bulk_update(db_shapes, ['binary_points'])
+                    db_shapes = []
+            db_model.objects.using(db_alias).bulk_update(db_shapes, ['binary_points'])
+
+def restore_points(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    for model_name in SHAPE_MODELS:
+        db_model = apps.get_model('engine', model_name)
+        if schema_editor.connection.vendor == 'postgresql':
+            # PostgreSQL can't cast bytes to float8, so values are decoded
+            # from their IEEE 754 bits. All operations are exact, the text
+            # of float8 values is exact with extra_float_digits > 0.
+            table = schema_editor.quote_name(db_model._meta.db_table)
+            schema_editor.execute("SET LOCAL extra_float_digits = 3")
+            schema_editor.execute("""
+                UPDATE {} SET points = COALESCE((
+                    SELECT string_agg((
+                        CASE WHEN bits < 0 THEN -1 ELSE 1 END *
+                        CASE WHEN (bits >> 52) & 2047 = 0
+                            THEN (bits & 4503599627370495) * power(2::float8, -1074)
+                            ELSE (1 + (bits & 4503599627370495) * power(2::float8, -52)) *
+                                power(2::float8, ((bits >> 52) & 2047) - 1023)
+                        END)::text, ',' ORDER BY idx)
+                    FROM (
+                        SELECT idx, ('x' || encode(substring(binary_points
+                            FROM idx * 8 + 1 FOR 8), 'hex'))::bit(64)::bigint AS bits
+                        FROM generate_series(0, length(binary_points) / 8 - 1) AS idx
+                    ) AS t
+                ), '')
+            """.format(table))
+        else:
+            db_shapes = []
+            for db_shape in db_model.objects.using(db_alias).only('id', 'binary_points').iterator():
+                db_shape.points = db_shape.binary_points or []
+                db_shapes.append(db_shape)
+                if len(db_shapes) == 1000:
+                    db_model.objects.using(db_alias).bulk_update(db_shapes, ['points'])
+                    db_shapes = []
+            db_model.objects.using(db_alias).bulk_update(db_shapes, ['points'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engine', '0044_job_updated_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labeledshape',
+            name='binary_points',
+            field=cvat.apps.engine.models.BinaryFloatArrayField(null=True),
+        ),
+        migrations.AddField(
+            model_name='trackedshape',
+            name='binary_points',
+            field=cvat.apps.engine.models.BinaryFloatArrayField(null=True),
+        ),
+        migrations.RunPython(convert_points, reverse_code=restore_points),
+        migrations.RemoveField(
+            model_name='labeledshape',
+            name='points',
+        ),
+        migrations.RenameField(
+            model_name='labeledshape',
+            old_name='binary_points',
+            new_name='points',
+        ),
+        migrations.AlterField(
+            model_name='labeledshape',
+            name='points',
+            field=cvat.apps.engine.models.BinaryFloatArrayField(),
+        ),
+        migrations.RemoveField(
+            model_name='trackedshape',
+            name='points',
+        ),
+        migrations.RenameField(
+            model_name='trackedshape',
+            old_name='binary_points',
+            new_name='points',
+        ),
+        migrations.AlterField(
+            model_name='trackedshape',
+            name='points',
+            field=cvat.apps.engine.models.BinaryFloatArrayField(),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.1.13 on 2021-11-22 11:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engine', '0045_binary_shape_points'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobcommit',
+            name='has_changes',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='jobcommit',
+            name='has_changes',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.CreateModel(
+            name='JobCommitChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('object_type', models.CharField(choices=[('tag', 'TAG'), ('shape', 'SHAPE'), ('track', 'TRACK')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('create', 'CREATE'), ('update', 'UPDATE'), ('delete', 'DELETE')], max_length=16)),
+                ('commit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='engine.jobcommit')),
+            ],
+            options={
+                'default_permissions': (),
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.13 on 2021-11-24 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engine', '0046_jobcommitchange'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='labeledimage',
+            index=models.Index(fields=['job', 'frame'], name='engine_limage_job_frame_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labeledshape',
+            index=models.Index(fields=['job', 'frame'], name='engine_lshape_job_frame_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trackedshape',
+            index=models.Index(fields=['track', 'frame'], name='engine_tshape_track_frame_idx'),
+        ),
+    ]
@@ -6,10 +6,13 @@ import os
 import re
 from enum import Enum
 
+import numpy as np
+
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.files.storage import FileSystemStorage
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from cvat.apps.engine.utils import parse_specific_attributes
@@ -206,6 +209,11 @@ class Project(models.Model):
     def get_log_path(self):
         return os.path.join(self.get_project_logs_dirname(), "project.log")
 
+    def get_updated_date(self):
+        dates = self.tasks.aggregate(tasks=models.Max('updated_date'),
+            jobs=models.Max('segment__job__updated_date'))
+        return max(date for date in [self.updated_date, *dates.values()] if date)
+
     # Extend default permission model
     class Meta:
         default_permissions = ()
@@ -254,6 +262,17 @@ class Task(models.Model):
     def get_task_artifacts_dirname(self):
         return os.path.join(self.get_task_dirname(), 'artifacts')
 
+    def get_updated_date(self):
+        # Annotations are saved without an update of the task row, so
+        # the last change can be in any job of the task. Querysets of
+        # many tasks can annotate it to avoid a query for each task.
+        if hasattr(self, 'jobs_updated_date'):
+            jobs_date = self.jobs_updated_date
+        else:
+            jobs_date = Job.objects.filter(segment__task_id=self.id) \
+                .aggregate(models.Max('updated_date'))['updated_date__max']
+        return max(self.updated_date, jobs_date) if jobs_date else self.updated_date
+
     def __str__(self):
         return self.name
 
@@ -330,10 +349,20 @@ class Job(models.Model):
     reviewer = models.ForeignKey(User, null=True, blank=True, related_name='review_job_set', on_delete=models.SET_NULL)
     status = models.CharField(max_length=32, choices=StatusChoice.choices(),
         default=StatusChoice.ANNOTATION)
+    # The time of the last annotation change. It isn't changed by saves of
+    # other fields (e.g. assignee or status), which don't affect annotations.
+    updated_date = models.DateTimeField(default=timezone.now)
 
     class Meta:
         default_permissions = ()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # is used to skip the task status update if the job status isn't changed
+        instance._saved_status = instance.__dict__.get('status')
+        return instance
+
 class Label(models.Model):
     task = models.ForeignKey(Task, null=True, blank=True, on_delete=models.CASCADE)
     project = models.ForeignKey(Project, null=True, blank=True, on_delete=models.CASCADE)
@@ -457,6 +486,42 @@ class Commit(models.Model):
 
 class JobCommit(Commit):
     job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name="commits")
+    # Commits created before the change log was introduced have no changes
+    has_changes = models.BooleanField(default=True)
+
+class AnnotationObjectType(str, Enum):
+    TAG = 'tag'
+    SHAPE = 'shape'
+    TRACK = 'track'
+
+    @classmethod
+    def choices(cls):
+        return tuple((x.value, x.name) for x in cls)
+
+    def __str__(self):
+        return self.value
+
+class ChangeActionChoice(str, Enum):
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+
+    @classmethod
+    def choices(cls):
+        return tuple((x.value, x.name) for x in cls)
+
+    def __str__(self):
+        return self.value
+
+class JobCommitChange(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    commit = models.ForeignKey(JobCommit, on_delete=models.CASCADE, related_name="changes")
+    object_type = models.CharField(max_length=16, choices=AnnotationObjectType.choices())
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=16, choices=ChangeActionChoice.choices())
+
+    class Meta:
+        default_permissions = ()
 
 class FloatArrayField(models.TextField):
     separator = ","
@@ -475,24 +540,54 @@ class FloatArrayField(models.TextField):
     def get_prep_value(self, value):
         return self.separator.join(map(str, value))
 
+class BinaryFloatArrayField(models.BinaryField):
+    # float64 keeps values the same as in the text representation,
+    # the network byte order is used by PostgreSQL float8send()
+    dtype = np.dtype('>f8')
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return np.frombuffer(value, dtype=self.dtype).tolist()
+
+    def to_python(self, value):
+        if isinstance(value, list):
+            return value
+        if isinstance(value, str):
+            # bytea values are represented as '\x<hex>' in PostgreSQL JSON
+            value = bytes.fromhex(value[2:] if value.startswith('\\x') else value)
+
+        return self.from_db_value(value, None, None)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return value
+        return np.asarray(value, dtype=self.dtype).tobytes()
+
 class Shape(models.Model):
     type = models.CharField(max_length=16, choices=ShapeType.choices())
     occluded = models.BooleanField(default=False)
     z_order = models.IntegerField(default=0)
-    points = FloatArrayField()
+    points = BinaryFloatArrayField()
 
     class Meta:
         abstract = True
         default_permissions = ()
 
 class LabeledImage(Annotation):
-    pass
+    class Meta(Annotation.Meta):
+        indexes = [
+            models.Index(fields=['job', 'frame'], name='engine_limage_job_frame_idx'),
+        ]
 
 class LabeledImageAttributeVal(AttributeVal):
     image = models.ForeignKey(LabeledImage, on_delete=models.CASCADE)
 
 class LabeledShape(Annotation, Shape):
-    pass
+    class Meta(Annotation.Meta):
+        indexes = [
+            models.Index(fields=['job', 'frame'], name='engine_lshape_job_frame_idx'),
+        ]
 
 class LabeledShapeAttributeVal(AttributeVal):
     shape = models.ForeignKey(LabeledShape, on_delete=models.CASCADE)
@@ -509,6 +604,11 @@ class TrackedShape(Shape):
     frame = models.PositiveIntegerField()
     outside = models.BooleanField(default=False)
 
+    class Meta(Shape.Meta):
+        indexes = [
+            models.Index(fields=['track', 'frame'], name='engine_tshape_track_frame_idx'),
+        ]
+
 class TrackedShapeAttributeVal(AttributeVal):
     shape = models.ForeignKey(TrackedShape, on_delete=models.CASCADE)
 
@@ -349,6 +349,7 @@ class TaskSerializer(WriteOnceMixin, serializers.ModelSerializer):
     assignee_id = serializers.IntegerField(write_only=True, allow_null=True, required=False)
     project_id = serializers.IntegerField(required=False)
     dimension = serializers.CharField(allow_blank=True, required=False)
+    updated_date = serializers.DateTimeField(source='get_updated_date', read_only=True)
 
     class Meta:
         model = models.Task
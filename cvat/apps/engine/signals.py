@@ -3,33 +3,50 @@
 # SPDX-License-Identifier: MIT
 import shutil
 
+from django.db import transaction
+from django.db.models import Max
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 from .models import (
+    AttributeSpec,
     Data,
     Job,
+    JobCommit,
+    Label,
     StatusChoice,
     Task,
     Profile,
 )
 
 
-@receiver(post_save, sender=Job, dispatch_uid="update_task_status")
-def update_task_status(instance, **kwargs):
-    db_task = instance.segment.task
-    db_jobs = list(Job.objects.filter(segment__task_id=db_task.id))
+def refresh_task_status(db_task):
+    # only the set of job statuses matters, so it is computed by the database
+    statuses = set(Job.objects.filter(segment__task_id=db_task.id) \
+        .order_by().values_list('status', flat=True).distinct())
     status = StatusChoice.COMPLETED
-    if list(filter(lambda x: x.status == StatusChoice.ANNOTATION, db_jobs)):
+    if StatusChoice.ANNOTATION.value in statuses:
         status = StatusChoice.ANNOTATION
-    elif list(filter(lambda x: x.status == StatusChoice.VALIDATION, db_jobs)):
+    elif StatusChoice.VALIDATION.value in statuses:
         status = StatusChoice.VALIDATION
 
     if status != db_task.status:
         db_task.status = status
         db_task.save()
 
+@receiver(post_save, sender=Job, dispatch_uid="update_task_status")
+def update_task_status(instance, created, update_fields, **kwargs):
+    if not created:
+        if update_fields is not None and 'status' not in update_fields:
+            return
+        if getattr(instance, '_saved_status', None) == instance.status:
+            return
+
+    instance._saved_status = instance.status
+    refresh_task_status(instance.segment.task)
+
 @receiver(post_save, sender=User, dispatch_uid="create_a_profile_on_create_a_user")
 def create_profile(instance, **kwargs):
     if not hasattr(instance, 'profile'):
@@ -42,6 +59,46 @@ def delete_task_files_on_delete_task(instance, **kwargs):
     shutil.rmtree(instance.get_task_dirname(), ignore_errors=True)
 
 
+def get_jobs_of_label(db_label):
+    if db_label.project_id:
+        return Job.objects.filter(segment__task__project_id=db_label.project_id)
+    return Job.objects.filter(segment__task_id=db_label.task_id)
+
+def update_jobs_of_label(db_label):
+    get_jobs_of_label(db_label).update(updated_date=timezone.now())
+
+def add_unknown_changes_commits(job_ids):
+    # Changes since previous versions of the jobs can't be returned anymore,
+    # clients have to reload all annotations
+    JobCommit.objects.bulk_create([
+        JobCommit(job_id=job_id, version=last_version + 1, has_changes=False,
+            message="Annotations of a deleted label were removed")
+        for job_id, last_version in Job.objects.filter(id__in=job_ids) \
+            .annotate(last_version=Max('commits__version')) \
+            .filter(last_version__isnull=False) \
+            .values_list('id', 'last_version')
+    ])
+
+@receiver(post_delete, sender=Label, dispatch_uid="update_jobs_on_delete_label")
+def update_jobs_on_delete_label(instance, **kwargs):
+    # Annotations of the label are removed without a new commit of their
+    # jobs, so the change is tracked by updated_date (e.g. for cached data)
+    update_jobs_of_label(instance)
+
+    # The commits are added after the deletion: if the label is deleted
+    # with its task, the jobs are deleted too and get no new commits
+    job_ids = list(get_jobs_of_label(instance).values_list('id', flat=True))
+    if job_ids:
+        transaction.on_commit(lambda: add_unknown_changes_commits(job_ids))
+
+@receiver(post_save, sender=AttributeSpec, dispatch_uid="update_jobs_on_save_attribute")
+@receiver(post_delete, sender=AttributeSpec, dispatch_uid="update_jobs_on_delete_attribute")
+def update_jobs_on_change_attribute(instance, **kwargs):
+    # Default values of attributes and their mutability are applied to
+    # annotations when they are read, so cached annotations become outdated
+    update_jobs_of_label(instance.label)
+
+
 @receiver(post_delete, sender=Data, dispatch_uid="delete_data_files_on_delete_data")
 def delete_data_files_on_delete_data(instance, **kwargs):
     shutil.rmtree(instance.get_data_dirname(), ignore_errors=True)
@@ -3,27 +3,33 @@
 #
 # SPDX-License-Identifier: MIT
 
+import errno
+import fcntl
 import itertools
 import os
 import sys
 import rq
 import re
 import shutil
-from distutils.dir_util import copy_tree
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from traceback import print_exception
 from urllib import parse as urlparse
 from urllib import request as urlrequest
 import requests
 import django_rq
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from django.conf import settings
 from django.db import transaction
 
 from cvat.apps.engine import models
 from cvat.apps.engine.log import slogger
-from cvat.apps.engine.media_extractors import (MEDIA_TYPES, Mpeg4ChunkWriter, Mpeg4CompressedChunkWriter,
-    ValidateDimension, ZipChunkWriter, ZipCompressedChunkWriter, get_mime)
-from cvat.apps.engine.utils import av_scan_paths
+from cvat.apps.engine.media_extractors import (MEDIA_TYPES, MediaScanner, Mpeg4ChunkWriter,
+    Mpeg4CompressedChunkWriter, ValidateDimension, ZipChunkWriter, ZipCompressedChunkWriter, get_mime)
+from cvat.apps.engine.utils import av_scan_paths, bulk_create
 from utils.dataset_manifest import ImageManifestManager, VideoManifestManager
 from utils.dataset_manifest.core import VideoManifestValidator
 from utils.dataset_manifest.utils import detect_related_images
@@ -53,21 +59,96 @@ def rq_handler(job, exc_type, exc_value, traceback):
 
 ############################# Internal implementation for server API
 
+# ioctl request code from linux/fs.h, it makes a copy-on-write clone of a file
+_FICLONE = 0x40049409
+
+class _ShareFileCopier:
+    """
+    Copies files from the share without duplication of the data when it is
+    possible: a reflink (copy-on-write clone) is tried first, then a hardlink
+    and only then the data is copied. After a method failed once with an error
+    which means it isn't supported for the share, it isn't tried anymore.
+    Other expected errors (e.g. a file of another user can't be hardlinked)
+    make only the current file fall back to the next method.
+    """
+
+    _UNSUPPORTED_ERRORS = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP}
+    # The FICLONE ioctl fails with these errors on filesystems without reflinks
+    _UNSUPPORTED_REFLINK_ERRORS = _UNSUPPORTED_ERRORS | {errno.ENOTTY,
+        errno.EINVAL, errno.ENOSYS}
+    _FILE_ERRORS = {errno.EPERM, errno.EACCES, errno.EMLINK}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods = [self._reflink, os.link, shutil.copyfile]
+        self.stats = { method.__name__: 0 for method in self._methods }
+
+    @staticmethod
+    def _reflink(source_path, target_path):
+        with open(source_path, 'rb') as source_file, \
+                open(target_path, 'wb') as target_file:
+            try:
+                fcntl.ioctl(target_file.fileno(), _FICLONE, source_file.fileno())
+            except OSError:
+                target_file.close()
+                os.remove(target_path)
+                raise
+
+    def __call__(self, source_path, target_path):
+        for method in list(self._methods):
+            if method is shutil.copyfile:
+                method(source_path, target_path)
+            else:
+                try:
+                    method(source_path, target_path)
+                except OSError as ex:
+                    unsupported_errors = self._UNSUPPORTED_REFLINK_ERRORS \
+                        if method is self._reflink else self._UNSUPPORTED_ERRORS
+                    if ex.errno in unsupported_errors:
+                        with self._lock:
+                            if method in self._methods:
+                                self._methods.remove(method)
+                    elif ex.errno not in self._FILE_ERRORS:
+                        raise
+                    continue
+            with self._lock:
+                self.stats[method.__name__] += 1
+            return
+
 def _copy_data_from_share(server_files, upload_dir):
     job = rq.get_current_job()
     job.meta['status'] = 'Data are being copied from share..'
     job.save_meta()
 
+    files = []
     for path in server_files:
         source_path = os.path.join(settings.SHARE_ROOT, os.path.normpath(path))
         target_path = os.path.join(upload_dir, path)
         if os.path.isdir(source_path):
-            copy_tree(source_path, target_path)
+            # Symlinked directories are copied too, as copy_tree() did it
+            for root, _, dir_files in os.walk(source_path, followlinks=True):
+                target_root = os.path.join(target_path, os.path.relpath(root, source_path))
+                os.makedirs(target_root, exist_ok=True)
+                files.extend((os.path.join(root, f), os.path.join(target_root, f))
+                    for f in dir_files)
         else:
-            target_dir = os.path.dirname(target_path)
-            if not os.path.exists(target_dir):
-                os.makedirs(target_dir)
-            shutil.copyfile(source_path, target_path)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            files.append((source_path, target_path))
+
+    copier = _ShareFileCopier()
+    with ThreadPoolExecutor(max_workers=settings.SHARE_COPY_WORKERS) as executor:
+        futures = [executor.submit(copier, source, target) for source, target in files]
+        status_updated = time.monotonic()
+        for copied_files, future in enumerate(as_completed(futures), start=1):
+            future.result()
+            if time.monotonic() - status_updated > 1:
+                job.meta['status'] = 'Data are being copied from share: {} of {} files'.format(
+                    copied_files, len(files))
+                job.save_meta()
+                status_updated = time.monotonic()
+
+    slogger.glob.info("Files copied from share: {}".format(
+        ', '.join('{} - {}'.format(k, v) for k, v in copier.stats.items())))
 
 def _save_task_to_db(db_task):
     job = rq.get_current_job()
@@ -91,21 +172,22 @@ def _save_task_to_db(db_task):
 
     segment_step -= db_task.overlap
 
+    db_segments = []
     for start_frame in range(0, db_task.data.size, segment_step):
         stop_frame = min(start_frame + segment_size - 1, db_task.data.size - 1)
 
         slogger.glob.info("New segment for task #{}: start_frame = {}, \
             stop_frame = {}".format(db_task.id, start_frame, stop_frame))
 
-        db_segment = models.Segment()
-        db_segment.task = db_task
-        db_segment.start_frame = start_frame
-        db_segment.stop_frame = stop_frame
-        db_segment.save()
+        db_segments.append(models.Segment(task=db_task,
+            start_frame=start_frame, stop_frame=stop_frame))
 
-        db_job = models.Job()
-        db_job.segment = db_segment
-        db_job.save()
+    # Segments and jobs are inserted in bulk, so the per-job post_save
+    # signals (e.g. the task status update) are not sent. New jobs are
+    # in the annotation status like the new task.
+    db_segments = bulk_create(models.Segment, db_segments, {'task_id': db_task.id})
+    models.Job.objects.bulk_create([models.Job(segment=db_segment)
+        for db_segment in db_segments])
 
     db_task.data.save()
     db_task.save()
@@ -187,6 +269,59 @@ def _validate_data(counter, manifest_file=None):
 
     return counter, task_modes[0]
 
+def _create_download_session(pool_size):
+    retries = Retry(
+        total=settings.REMOTE_FILES_DOWNLOAD_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def _download_file(session, url, output_path, progress):
+    """
+    Download a file to the output path. If the connection is broken while the
+    response body is being read, the download is continued from the received
+    position (when the server supports range requests).
+    """
+    downloaded = 0
+    attempt = 0
+    while True:
+        # The content isn't decoded, so the received size matches
+        # the range offset which is counted by the server
+        headers = {'Accept-Encoding': 'identity'}
+        if downloaded:
+            headers['Range'] = 'bytes={}-'.format(downloaded)
+        try:
+            with session.get(url, stream=True, headers=headers, timeout=60) as response:
+                if response.status_code == 206 and downloaded:
+                    mode = 'ab'
+                elif response.status_code == 200:
+                    # the server ignores the range, so the file is downloaded again
+                    progress(-downloaded)
+                    downloaded = 0
+                    mode = 'wb'
+                else:
+                    raise Exception("Failed to download " + url)
+
+                with open(output_path, mode) as output_file:
+                    for data in response.iter_content(chunk_size=1024 * 1024):
+                        output_file.write(data)
+                        downloaded += len(data)
+                        progress(len(data))
+            return
+        except (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError) as ex:
+            attempt += 1
+            if attempt > settings.REMOTE_FILES_DOWNLOAD_RETRIES:
+                raise Exception("Failed to download {}: {}".format(url, str(ex)))
+            slogger.glob.warning("Downloading of {} was interrupted, retrying: {}".format(url, str(ex)))
+            time.sleep(0.5 * 2 ** (attempt - 1))
+
 def _download_data(urls, upload_dir):
     job = rq.get_current_job()
     local_files = {}
@@ -194,19 +329,41 @@ def _download_data(urls, upload_dir):
         name = os.path.basename(urlrequest.url2pathname(urlparse.urlparse(url).path))
         if name in local_files:
             raise Exception("filename collision: {}".format(name))
-        slogger.glob.info("Downloading: {}".format(url))
-        job.meta['status'] = '{} is being downloaded..'.format(url)
+        local_files[name] = url
+
+    workers = max(1, min(settings.REMOTE_FILES_DOWNLOAD_WORKERS, len(local_files)))
+    downloaded_bytes = [0]
+    progress_lock = threading.Lock()
+    def progress(size):
+        with progress_lock:
+            downloaded_bytes[0] += size
+
+    def update_status(downloaded_files):
+        job.meta['status'] = 'Remote files are being downloaded: {} of {} files ({:.1f} MB)'.format(
+            downloaded_files, len(local_files), downloaded_bytes[0] / 2**20)
         job.save_meta()
 
-        response = requests.get(url, stream=True)
-        if response.status_code == 200:
-            response.raw.decode_content = True
-            with open(os.path.join(upload_dir, name), 'wb') as output_file:
-                shutil.copyfileobj(response.raw, output_file)
-        else:
-            raise Exception("Failed to download " + url)
-
-        local_files[name] = True
+    update_status(0)
+    with _create_download_session(workers) as session, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for name, url in local_files.items():
+            slogger.glob.info("Downloading: {}".format(url))
+            future = executor.submit(_download_file, session, url,
+                os.path.join(upload_dir, name), progress)
+            futures[future] = url
+
+        status_updated = time.monotonic()
+        try:
+            for downloaded_files, future in enumerate(as_completed(futures), start=1):
+                future.result()
+                if time.monotonic() - status_updated > 1 or downloaded_files == len(futures):
+                    update_status(downloaded_files)
+                    status_updated = time.monotonic()
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
 
     return list(local_files.keys())
 
@@ -275,6 +432,9 @@ def _create_thread(tid, data, isImport=False):
     db_images = []
     extractor = None
     manifest_index = _get_manifest_frame_indexer()
+    # directories are listed once and the result is shared between
+    # the extractor, the dimension validation and related images detection
+    scanner = MediaScanner()
 
     # If upload from server_files image and directories
     # need to update images list by all found images in directories
@@ -283,6 +443,7 @@ def _create_thread(tid, data, isImport=False):
             [os.path.relpath(image, upload_dir) for image in
                 MEDIA_TYPES['directory']['extractor'](
                     source_path=[os.path.join(upload_dir, f) for f in media['directory']],
+                    scanner=scanner,
                 ).absolute_source_paths
             ]
         )
@@ -303,21 +464,43 @@ def _create_thread(tid, data, isImport=False):
                 data['stop_frame'] = None
                 db_data.frame_filter = ''
 
-            extractor = MEDIA_TYPES[media_type]['extractor'](
+            extractor_class = MEDIA_TYPES[media_type]['extractor']
+            extractor_kwargs = {}
+            if issubclass(extractor_class, MEDIA_TYPES['directory']['extractor']):
+                extractor_kwargs['scanner'] = scanner
+            elif media_type == 'pdf':
+                extractor_kwargs['dpi'] = settings.PDF_RENDERING_DPI
+                extractor_kwargs['threads'] = settings.PDF_RENDERING_THREADS
+            extractor = extractor_class(
                 source_path=source_paths,
                 step=db_data.get_frame_step(),
                 start=db_data.start_frame,
                 stop=data['stop_frame'],
+                **extractor_kwargs
             )
 
 
-    validate_dimension = ValidateDimension()
-    if isinstance(extractor, MEDIA_TYPES['zip']['extractor']):
+    validate_dimension = ValidateDimension(scanner=scanner)
+    # 2D images from a zip archive are streamed into the chunks and written
+    # to the disk at the same time, there is no need to extract them before
+    chunks_on_creation = db_data.storage_method == models.StorageMethodChoice.FILE_SYSTEM or \
+        not settings.USE_CACHE
+    stream_zip = isinstance(extractor, MEDIA_TYPES['zip']['extractor']) and \
+        not extractor.contains_point_clouds() and chunks_on_creation
+    if stream_zip:
+        extractor.extract_on_read()
+    elif isinstance(extractor, MEDIA_TYPES['zip']['extractor']):
         extractor.extract()
 
-    if db_data.storage == models.StorageChoice.LOCAL or \
+    # PDF pages are rendered in parallel with writing of the chunks.
+    # For the cache they are required on the disk to prepare the manifest.
+    stream_pdf = isinstance(extractor, MEDIA_TYPES['pdf']['extractor']) and chunks_on_creation
+    if isinstance(extractor, MEDIA_TYPES['pdf']['extractor']) and not stream_pdf:
+        extractor.extract()
+
+    if not stream_zip and (db_data.storage == models.StorageChoice.LOCAL or \
         (db_data.storage == models.StorageChoice.SHARE and \
-        isinstance(extractor, MEDIA_TYPES['zip']['extractor'])):
+        isinstance(extractor, MEDIA_TYPES['zip']['extractor']))):
         validate_dimension.set_path(upload_dir)
         validate_dimension.validate()
 
@@ -338,7 +521,8 @@ def _create_thread(tid, data, isImport=False):
     related_images = {}
     if isinstance(extractor, MEDIA_TYPES['image']['extractor']):
         extractor.filter(lambda x: not re.search(r'(^|{0})related_images{0}'.format(os.sep), x))
-        related_images = detect_related_images(extractor.absolute_source_paths, upload_dir)
+        related_images = detect_related_images(extractor.absolute_source_paths, upload_dir,
+            extractor.get_listing() if stream_zip else scanner)
 
     db_task.mode = task_mode
     db_data.compressed_chunk_type = models.DataChoice.VIDEO if task_mode == 'interpolation' and not data['use_zip_chunks'] else models.DataChoice.IMAGESET
@@ -489,7 +673,7 @@ def _create_thread(tid, data, isImport=False):
                         for (path, frame), (w, h) in zip(chunk_paths, img_sizes)
                     ])
 
-    if db_data.storage_method == models.StorageMethodChoice.FILE_SYSTEM or not settings.USE_CACHE:
+    if chunks_on_creation:
         counter = itertools.count()
         generator = itertools.groupby(extractor, lambda x: next(counter) // db_data.chunk_size)
         for chunk_idx, chunk_data in generator:
@@ -519,12 +703,17 @@ def _create_thread(tid, data, isImport=False):
             progress = extractor.get_progress(chunk_data[-1][2])
             update_progress(progress)
 
+        if stream_zip or stream_pdf:
+            # extract images out of the frame range, related images and other files
+            extractor.extract()
+
     if db_task.mode == 'annotation':
-        models.Image.objects.bulk_create(db_images)
-        created_images = models.Image.objects.filter(data_id=db_data.id)
+        # ids of the images are required only for related files
+        created_images = bulk_create(models.Image, db_images,
+            {'data_id': db_data.id} if related_images else None)
 
         db_related_files = [
-            models.RelatedFile(data=image.data, primary_image=image, path=os.path.join(upload_dir, related_file_path))
+            models.RelatedFile(data=db_data, primary_image=image, path=os.path.join(upload_dir, related_file_path))
             for image in created_images
             for related_file_path in related_images.get(image.path, [])
         ]
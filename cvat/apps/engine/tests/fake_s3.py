@@ -0,0 +1,299 @@
+# Copyright (C) 2021 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""
+A minimal in-process S3-compatible server for tests and benchmarks.
+
+It implements the subset of the S3 REST API (path-style addressing) which
+is used by the AWS_S3 cloud storage: bucket creation and HEAD, object
+PUT/GET/HEAD (including ranged GETs and multipart uploads) and object
+listing. Network conditions can be emulated with the latency (seconds per
+request) and bandwidth (bytes per second) parameters.
+"""
+
+import hashlib
+import threading
+import time
+import uuid
+from datetime import datetime
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+import pytz
+
+_XMLNS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+_SEND_BLOCK_SIZE = 64 * 1024
+
+
+class _S3Object:
+    __slots__ = ('data', 'etag', 'last_modified')
+
+    def __init__(self, data):
+        self.data = data
+        self.etag = '"{}"'.format(hashlib.md5(data).hexdigest()) # nosec
+        self.last_modified = time.time()
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeS3'
+
+    # pylint: disable=invalid-name
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        pass
+
+    def _parse(self):
+        url = urlparse(self.path)
+        parts = unquote(url.path).lstrip('/').split('/', 1)
+        bucket = parts[0]
+        key = parts[1] if len(parts) > 1 and parts[1] else None
+        return bucket, key, parse_qs(url.query, keep_blank_values=True)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, code, body=b'', headers=None, send_body=True):
+        self.server.fake_s3.emulate_latency()
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body and body:
+            self.server.fake_s3.throttled_write(self.wfile, body)
+
+    def _send_error(self, code, error_code, send_body=True):
+        body = '<?xml version="1.0" encoding="UTF-8"?>' \
+            '<Error><Code>{}</Code><Message>{}</Message></Error>' \
+            .format(error_code, error_code).encode()
+        self._send(code, body, {'Content-Type': 'application/xml'}, send_body)
+
+    def _object_headers(self, obj):
+        return {
+            'ETag': obj.etag,
+            'Last-Modified': formatdate(obj.last_modified, usegmt=True),
+            'Accept-Ranges': 'bytes',
+            'Content-Type': 'binary/octet-stream',
+        }
+
+    def do_HEAD(self):
+        bucket, key, _ = self._parse()
+        storage = self.server.fake_s3
+        with storage.lock:
+            objects = storage.buckets.get(bucket)
+            obj = objects.get(key) if objects is not None and key else None
+        if objects is None or (key and obj is None):
+            self._send(404, send_body=False)
+        elif obj is None:
+            self._send(200, send_body=False)
+        else:
+            headers = self._object_headers(obj)
+            self.server.fake_s3.emulate_latency()
+            self.send_response(200)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(obj.data)))
+            self.end_headers()
+
+    def do_GET(self):
+        bucket, key, query = self._parse()
+        storage = self.server.fake_s3
+        with storage.lock:
+            objects = storage.buckets.get(bucket)
+            obj = objects.get(key) if objects is not None and key else None
+            listing = sorted(objects.items()) if objects is not None and not key else None
+        if objects is None:
+            return self._send_error(404, 'NoSuchBucket')
+        if key is None:
+            return self._send_listing(bucket, listing, query)
+        if obj is None:
+            return self._send_error(404, 'NoSuchKey')
+
+        headers = self._object_headers(obj)
+        data = obj.data
+        code = 200
+        byte_range = self.headers.get('Range')
+        if byte_range and byte_range.startswith('bytes='):
+            start, end = byte_range[len('bytes='):].split('-')
+            start = int(start) if start else 0
+            end = min(int(end), len(data) - 1) if end else len(data) - 1
+            headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, len(data))
+            data = data[start:end + 1]
+            code = 206
+        self._send(code, data, headers)
+
+    def _send_listing(self, bucket, listing, query):
+        prefix = query.get('prefix', [''])[0]
+        contents = ''.join(
+            '<Contents><Key>{}</Key><LastModified>{}</LastModified>'
+            '<ETag>{}</ETag><Size>{}</Size><StorageClass>STANDARD</StorageClass></Contents>'.format(
+                escape(key),
+                datetime.fromtimestamp(obj.last_modified, tz=pytz.UTC).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                escape(obj.etag), len(obj.data))
+            for key, obj in listing if key.startswith(prefix)
+        )
+        body = '<?xml version="1.0" encoding="UTF-8"?>' \
+            '<ListBucketResult xmlns="{}"><Name>{}</Name><Prefix>{}</Prefix>' \
+            '<KeyCount>{}</KeyCount><MaxKeys>1000000</MaxKeys><IsTruncated>false</IsTruncated>' \
+            '{}</ListBucketResult>'.format(_XMLNS, escape(bucket), escape(prefix),
+                contents.count('<Contents>'), contents).encode()
+        self._send(200, body, {'Content-Type': 'application/xml'})
+
+    def do_PUT(self):
+        bucket, key, query = self._parse()
+        body = self._read_body()
+        storage = self.server.fake_s3
+        with storage.lock:
+            if key is None:
+                storage.buckets.setdefault(bucket, {})
+                response = (200, {'Location': '/' + bucket})
+            elif bucket not in storage.buckets:
+                response = None
+            elif 'uploadId' in query:
+                upload = storage.uploads.get(query['uploadId'][0])
+                if upload is not None:
+                    part = _S3Object(body)
+                    upload[int(query['partNumber'][0])] = part
+                    response = (200, {'ETag': part.etag})
+                else:
+                    response = None
+            else:
+                obj = _S3Object(body)
+                storage.buckets[bucket][key] = obj
+                response = (200, {'ETag': obj.etag})
+
+        if response is None:
+            self._send_error(404, 'NoSuchUpload' if 'uploadId' in query else 'NoSuchBucket')
+        else:
+            self._send(response[0], headers=response[1])
+
+    def do_POST(self):
+        bucket, key, query = self._parse()
+        self._read_body()
+        storage = self.server.fake_s3
+        body = None
+        with storage.lock:
+            if bucket not in storage.buckets:
+                error = (404, 'NoSuchBucket')
+            elif 'uploads' in query:
+                upload_id = uuid.uuid4().hex
+                storage.uploads[upload_id] = {}
+                body = '<?xml version="1.0" encoding="UTF-8"?>' \
+                    '<InitiateMultipartUploadResult xmlns="{}"><Bucket>{}</Bucket>' \
+                    '<Key>{}</Key><UploadId>{}</UploadId></InitiateMultipartUploadResult>' \
+                    .format(_XMLNS, escape(bucket), escape(key), upload_id).encode()
+            elif 'uploadId' in query:
+                parts = storage.uploads.pop(query['uploadId'][0], None)
+                if parts is not None:
+                    obj = _S3Object(b''.join(parts[number].data for number in sorted(parts)))
+                    storage.buckets[bucket][key] = obj
+                    body = '<?xml version="1.0" encoding="UTF-8"?>' \
+                        '<CompleteMultipartUploadResult xmlns="{}"><Bucket>{}</Bucket>' \
+                        '<Key>{}</Key><ETag>{}</ETag></CompleteMultipartUploadResult>' \
+                        .format(_XMLNS, escape(bucket), escape(key), escape(obj.etag)).encode()
+                else:
+                    error = (404, 'NoSuchUpload')
+            else:
+                error = (400, 'InvalidRequest')
+
+        if body is None:
+            self._send_error(*error)
+        else:
+            self._send(200, body, {'Content-Type': 'application/xml'})
+
+    def do_DELETE(self):
+        bucket, key, _ = self._parse()
+        storage = self.server.fake_s3
+        with storage.lock:
+            if key is None:
+                storage.buckets.pop(bucket, None)
+            else:
+                storage.buckets.get(bucket, {}).pop(key, None)
+        self._send(204)
+
+
+class FakeS3Server:
+    """
+    Usage:
+        with FakeS3Server(latency=0.02, bandwidth=10 * 2**20) as server:
+            server.create_bucket('bucket')
+            storage = AWS_S3('bucket', 'us-east-2', endpoint_url=server.endpoint_url)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, bandwidth=None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.buckets = {}
+        self.uploads = {}
+        self.lock = threading.Lock()
+        self.requests_count = 0
+        self.sent_bytes = 0
+        self._link_free_at = 0
+        self._stats_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _RequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake_s3 = self
+        self._thread = None
+
+    @property
+    def endpoint_url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def create_bucket(self, name):
+        with self.lock:
+            self.buckets.setdefault(name, {})
+
+    def put_object(self, bucket, key, data):
+        with self.lock:
+            self.buckets[bucket][key] = _S3Object(data)
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.requests_count = 0
+            self.sent_bytes = 0
+
+    def emulate_latency(self):
+        with self._stats_lock:
+            self.requests_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def throttled_write(self, wfile, data):
+        # The bandwidth is shared between all connections like a real link
+        with self._stats_lock:
+            self.sent_bytes += len(data)
+        view = memoryview(data)
+        for offset in range(0, len(view), _SEND_BLOCK_SIZE):
+            block = view[offset:offset + _SEND_BLOCK_SIZE]
+            if self.bandwidth:
+                with self._stats_lock:
+                    sent_at = max(time.monotonic(), self._link_free_at)
+                    self._link_free_at = sent_at + len(block) / self.bandwidth
+                # The field can be already advanced by other connections
+                delay = sent_at + len(block) / self.bandwidth - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            wfile.write(block)
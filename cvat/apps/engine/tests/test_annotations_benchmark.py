@@ -0,0 +1,146 @@
+# Copyright (C) 2021 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+# The benchmark compares reading of all annotations of a job with reading
+# of a frame window and reports query plans of the filtered queries.
+# It is skipped unless the CVAT_BENCHMARK environment variable is set,
+# results are written to the server log. The workload can be configured
+# with the environment variables:
+#   CVAT_BENCHMARK_FRAMES - number of frames in the benchmarked job
+#   CVAT_BENCHMARK_SHAPES - number of shapes on each frame
+#   CVAT_BENCHMARK_TRACKS - number of tracks in the job
+#   CVAT_BENCHMARK_WINDOW - number of frames in the requested window
+#   CVAT_BENCHMARK_REPEATS - how many times each request is sent
+# For example:
+#   CVAT_BENCHMARK=1 CVAT_BENCHMARK_FRAMES=100 CVAT_BENCHMARK_SHAPES=2000 \
+#   python manage.py test cvat.apps.engine.tests.test_annotations_benchmark
+
+import os
+import time
+from unittest import skipUnless
+
+import numpy as np
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from cvat.apps.dataset_manager.task import JobAnnotation
+from cvat.apps.engine import models
+from cvat.apps.engine.log import slogger
+from cvat.apps.engine.tests.test_rest_api import (ForceLogin, create_db_users,
+    generate_image_files)
+
+def _get_env(name, default, type_=int):
+    value = os.environ.get(name)
+    return type_(value) if value else default
+
+@skipUnless(os.environ.get('CVAT_BENCHMARK'), 'CVAT_BENCHMARK is not set')
+class JobAnnotationsBenchmarkTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    @classmethod
+    def setUpTestData(cls):
+        create_db_users(cls)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.frames = _get_env('CVAT_BENCHMARK_FRAMES', 10)
+        cls.shapes = _get_env('CVAT_BENCHMARK_SHAPES', 100)
+        cls.tracks = _get_env('CVAT_BENCHMARK_TRACKS', 20)
+        cls.window = _get_env('CVAT_BENCHMARK_WINDOW', 2)
+        cls.repeats = _get_env('CVAT_BENCHMARK_REPEATS', 3)
+
+    def _create_task(self, user):
+        task_spec = {
+            'name': 'annotations benchmark task',
+            'labels': [{ 'name': 'car' }],
+        }
+        image_names = ['image_{:06d}.jpg'.format(i) for i in range(self.frames)]
+        _, images = generate_image_files(*image_names)
+        task_data = { 'image_quality': 70 }
+        for i, image in enumerate(images):
+            task_data['client_files[{}]'.format(i)] = image
+
+        with ForceLogin(user, self.client):
+            response = self.client.post('/api/v1/tasks', data=task_spec, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            tid = response.data['id']
+            response = self.client.post('/api/v1/tasks/{}/data'.format(tid),
+                data=task_data, format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        return models.Task.objects.get(pk=tid)
+
+    def _create_annotations(self, db_job, db_label):
+        rng = np.random.default_rng(0)
+        models.LabeledShape.objects.bulk_create((
+            models.LabeledShape(job=db_job, label=db_label, frame=frame,
+                type=models.ShapeType.RECTANGLE, points=rng.uniform(0, 100, 4).tolist())
+            for frame in range(self.frames) for _ in range(self.shapes)
+        ), batch_size=1000)
+        models.LabeledImage.objects.bulk_create(
+            models.LabeledImage(job=db_job, label=db_label, frame=frame)
+            for frame in range(self.frames)
+        )
+
+        for i in range(self.tracks):
+            start = i * self.frames // max(self.tracks, 1)
+            db_track = models.LabeledTrack.objects.create(job=db_job,
+                label=db_label, frame=start)
+            models.TrackedShape.objects.bulk_create(
+                models.TrackedShape(track=db_track, frame=frame,
+                    type=models.ShapeType.RECTANGLE, outside=frame == self.frames - 1,
+                    points=rng.uniform(0, 100, 4).tolist())
+                for frame in range(start, self.frames, 2)
+            )
+
+    def _get_annotations(self, user, job_id, query=''):
+        latencies = []
+        for _ in range(self.repeats):
+            with ForceLogin(user, self.client):
+                started = time.perf_counter()
+                response = self.client.get('/api/v1/jobs/{}/annotations?{}'.format(
+                    job_id, query))
+                latencies.append(time.perf_counter() - started)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data, np.median(latencies) * 1000
+
+    def test_frame_window_reading(self):
+        user = self.admin
+        db_task = self._create_task(user)
+        db_job = models.Job.objects.get(segment__task=db_task)
+        self._create_annotations(db_job, db_task.label_set.first())
+
+        # Filtered requests go to DB, so the full data is read from DB too
+        full_data, full_latency = self._get_annotations(user, db_job.id,
+            'bbox=0,0,100,100')
+        start_frame = self.frames // 2
+        stop_frame = start_frame + self.window - 1
+        data, latency = self._get_annotations(user, db_job.id,
+            'start_frame={}&stop_frame={}'.format(start_frame, stop_frame))
+
+        self.assertEqual(len(full_data['shapes']), self.frames * self.shapes)
+        self.assertTrue(all(start_frame <= shape['frame'] <= stop_frame
+            for shape in data['shapes']))
+        self.assertEqual(len(data['shapes']),
+            self.shapes * (min(stop_frame, self.frames - 1) - start_frame + 1))
+        self.assertTrue(all(track['frame'] <= stop_frame for track in data['tracks']))
+        self.assertEqual(len(data['tracks']), sum(1 for track in full_data['tracks']
+            if track['frame'] <= stop_frame))
+
+        slogger.glob.info('job annotations: {} shapes, {} tracks, {:.1f}ms; '
+            'frames {}-{}: {} shapes, {} tracks, {:.1f}ms'.format(
+                len(full_data['shapes']), len(full_data['tracks']), full_latency,
+                start_frame, stop_frame, len(data['shapes']), len(data['tracks']),
+                latency))
+
+        for name, queryset in (
+            ('tags', JobAnnotation._filter_by_frames(db_job.labeledimage_set.all(),
+                start_frame, stop_frame)),
+            ('shapes', JobAnnotation._filter_by_frames(db_job.labeledshape_set.all(),
+                start_frame, stop_frame)),
+            ('tracks', JobAnnotation._filter_tracks_by_frames(db_job.labeledtrack_set.all(),
+                start_frame, stop_frame)),
+        ):
+            slogger.glob.info('query plan ({}):\n{}'.format(name, queryset.explain()))
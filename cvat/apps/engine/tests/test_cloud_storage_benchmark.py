@@ -0,0 +1,216 @@
+# Copyright (C) 2021 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+# The benchmark works against a local S3-compatible server (see fake_s3.py),
+# so it doesn't require a live bucket. It is skipped unless the CVAT_BENCHMARK
+# environment variable is set, results are written to the server log.
+# Network conditions and the workload size can be configured with
+# the environment variables:
+#   CVAT_BENCHMARK_S3_LATENCY - latency of each request to the storage, ms
+#   CVAT_BENCHMARK_S3_BANDWIDTH - bandwidth of the storage, MB/s
+#   CVAT_BENCHMARK_IMAGES - number of images in the benchmarked task
+#   CVAT_BENCHMARK_CHUNK_SIZE - number of images in a chunk
+#   CVAT_BENCHMARK_REPEATS - how many times each chunk is prepared
+#   CVAT_BENCHMARK_MAX_P95 - fail if the p95 chunk preparation latency
+#       is greater than the specified value, ms
+# For example:
+#   CVAT_BENCHMARK=1 CVAT_BENCHMARK_S3_LATENCY=20 CVAT_BENCHMARK_S3_BANDWIDTH=100 \
+#   CVAT_BENCHMARK_IMAGES=500 python manage.py test \
+#   cvat.apps.engine.tests.test_cloud_storage_benchmark
+
+import os
+import os.path as osp
+import tempfile
+import time
+from io import BytesIO
+from unittest import skipUnless
+
+import numpy as np
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from cvat.apps.engine.cache import CacheInteraction
+from cvat.apps.engine.cloud_provider import AWS_S3, Status
+from cvat.apps.engine.frame_provider import FrameProvider
+from cvat.apps.engine.log import slogger
+from cvat.apps.engine.models import CloudProviderChoice, CredentialsTypeChoice, Task
+from cvat.apps.engine.tests.fake_s3 import FakeS3Server
+from cvat.apps.engine.tests.test_rest_api import (ForceLogin, create_db_users,
+    generate_image_files, generate_manifest_file)
+
+def _get_env(name, default, type_=int):
+    value = os.environ.get(name)
+    return type_(value) if value else default
+
+def _make_fake_s3_server():
+    latency = _get_env('CVAT_BENCHMARK_S3_LATENCY', 0, float) / 1000
+    bandwidth = _get_env('CVAT_BENCHMARK_S3_BANDWIDTH', None, float)
+    return FakeS3Server(latency=latency,
+        bandwidth=bandwidth * 2**20 if bandwidth else None)
+
+class FakeS3StorageTest(TestCase):
+    BUCKET = 'test-bucket'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeS3Server().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def _get_storage(self, bucket=BUCKET):
+        return AWS_S3(bucket=bucket, region='us-east-2',
+            access_key_id='key', secret_key='secret_key',
+            endpoint_url=self.server.endpoint_url)
+
+    def test_can_create_bucket(self):
+        storage = self._get_storage('created-bucket')
+        self.assertEqual(storage.get_status(), Status.NOT_FOUND)
+        storage.create()
+        self.assertEqual(storage.get_status(), Status.AVAILABLE)
+
+    def test_can_upload_and_download_files(self):
+        self.server.create_bucket(self.BUCKET)
+        storage = self._get_storage()
+        content = os.urandom(3 * 2**20)
+        storage.upload_file(BytesIO(content), 'dir/file.bin')
+
+        self.assertEqual(storage.get_file_status('dir/file.bin'), Status.AVAILABLE)
+        self.assertEqual(storage.get_file_status('missing.bin'), Status.NOT_FOUND)
+        self.assertIsNotNone(storage.get_file_last_modified('dir/file.bin'))
+        self.assertEqual(storage.download_fileobj('dir/file.bin').getvalue(), content)
+
+        storage.initialize_content()
+        self.assertTrue('dir/file.bin' in storage)
+
+@skipUnless(os.environ.get('CVAT_BENCHMARK'), 'CVAT_BENCHMARK is not set')
+class CloudTaskBenchmarkTest(APITestCase):
+    BUCKET = 'benchmark-bucket'
+
+    def setUp(self):
+        self.client = APIClient()
+        # The endpoint can't be set by users, it is a server setting
+        endpoint_override = self.settings(
+            CLOUD_STORAGE_S3_ENDPOINT_URL=self.server.endpoint_url)
+        endpoint_override.enable()
+        self.addCleanup(endpoint_override.disable)
+
+    @classmethod
+    def setUpTestData(cls):
+        create_db_users(cls)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.images_count = _get_env('CVAT_BENCHMARK_IMAGES', 8)
+        cls.chunk_size = _get_env('CVAT_BENCHMARK_CHUNK_SIZE', 4)
+        cls.repeats = _get_env('CVAT_BENCHMARK_REPEATS', 1)
+        cls.max_p95 = _get_env('CVAT_BENCHMARK_MAX_P95', None, float)
+
+        cls.server = _make_fake_s3_server().start()
+        cls.server.create_bucket(cls.BUCKET)
+
+        cls.image_names = ['image_{:06d}.jpg'.format(i) for i in range(cls.images_count)]
+        _, images = generate_image_files(*cls.image_names)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, image in zip(cls.image_names, images):
+                with open(osp.join(tmp_dir, name), 'wb') as f:
+                    f.write(image.getvalue())
+                cls.server.put_object(cls.BUCKET, name, image.getvalue())
+            manifest_path = osp.join(tmp_dir, 'manifest.jsonl')
+            generate_manifest_file('images', manifest_path,
+                [osp.join(tmp_dir, name) for name in cls.image_names])
+            with open(manifest_path, 'rb') as f:
+                cls.server.put_object(cls.BUCKET, 'manifest.jsonl', f.read())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def _create_cloud_storage(self, user):
+        data = {
+            'provider_type': CloudProviderChoice.AWS_S3.value,
+            'resource': self.BUCKET,
+            'display_name': 'Benchmark bucket',
+            'credentials_type': CredentialsTypeChoice.KEY_SECRET_KEY_PAIR.value,
+            'key': 'key',
+            'secret_key': 'secret_key',
+            'manifests': [{ 'filename': 'manifest.jsonl' }],
+        }
+        with ForceLogin(user, self.client):
+            response = self.client.post('/api/v1/cloudstorages', data=data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+            storage_id = response.data['id']
+            response = self.client.get('/api/v1/cloudstorages/{}/content'.format(storage_id))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return storage_id
+
+    def _create_cloud_task(self, user, storage_id):
+        task_spec = {
+            'name': 'cloud benchmark task',
+            'labels': [{ 'name': 'car' }],
+        }
+        task_data = {
+            'server_files': self.image_names + ['manifest.jsonl'],
+            'cloud_storage_id': storage_id,
+            'image_quality': 70,
+            'use_cache': True,
+            'chunk_size': self.chunk_size,
+        }
+        with ForceLogin(user, self.client):
+            response = self.client.post('/api/v1/tasks', data=task_spec, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            tid = response.data['id']
+            response = self.client.post('/api/v1/tasks/{}/data'.format(tid),
+                data=task_data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        return Task.objects.get(pk=tid)
+
+    @staticmethod
+    def _report(name, latencies, size, frames):
+        latencies = np.array(latencies) * 1000
+        total = latencies.sum() / 1000
+        p50, p90, p95, p99 = np.percentile(latencies, [50, 90, 95, 99])
+        slogger.glob.info('{}: {} chunks, p50={:.1f}ms p90={:.1f}ms p95={:.1f}ms '
+            'p99={:.1f}ms max={:.1f}ms, {:.2f} MB/s, {:.1f} frames/s'.format(
+                name, len(latencies), p50, p90, p95, p99, latencies.max(),
+                size / total / 2**20, frames / total))
+        return p95
+
+    def test_cloud_task_chunk_preparation(self):
+        user = self.admin
+        storage_id = self._create_cloud_storage(user)
+
+        started = time.perf_counter()
+        db_task = self._create_cloud_task(user, storage_id)
+        creation_time = time.perf_counter() - started
+        db_data = db_task.data
+        self.assertEqual(db_data.size, self.images_count)
+        slogger.glob.info('cloud task creation: {} images, {:.2f}s'.format(
+            self.images_count, creation_time))
+
+        chunks_count = (db_data.size + db_data.chunk_size - 1) // db_data.chunk_size
+        for quality in (FrameProvider.Quality.COMPRESSED, FrameProvider.Quality.ORIGINAL):
+            latencies = []
+            size = 0
+            self.server.reset_stats()
+            for _ in range(self.repeats):
+                for chunk_number in range(chunks_count):
+                    cache = CacheInteraction(db_task.dimension)
+                    started = time.perf_counter()
+                    buff, _ = cache.prepare_chunk_buff(db_data, quality, chunk_number)
+                    latencies.append(time.perf_counter() - started)
+                    size += len(buff.getvalue())
+                    del cache
+            p95 = self._report('chunk preparation ({})'.format(quality), latencies,
+                self.server.sent_bytes, self.repeats * db_data.size)
+
+            self.assertGreater(size, 0)
+            if self.max_p95 is not None:
+                self.assertLessEqual(p95, self.max_p95)
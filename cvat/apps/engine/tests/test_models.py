@@ -0,0 +1,34 @@
+# Copyright (C) 2021 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+from django.test import SimpleTestCase
+
+from cvat.apps.engine.models import BinaryFloatArrayField
+
+
+class BinaryFloatArrayFieldTest(SimpleTestCase):
+    def setUp(self):
+        self.field = BinaryFloatArrayField()
+        self.points = [1.0, 2.1, -50.125, 300.222, 0.1 + 0.2]
+
+    def test_can_restore_values_from_bytes(self):
+        value = self.field.get_prep_value(self.points)
+
+        self.assertEqual(len(value), 8 * len(self.points))
+        self.assertEqual(self.field.to_python(value), self.points)
+        # PostgreSQL returns bytea values as memoryview
+        self.assertEqual(self.field.from_db_value(memoryview(value), None, None),
+            self.points)
+
+    def test_can_restore_values_from_json_hex(self):
+        # bytea values in json_agg() results
+        value = '\\x' + self.field.get_prep_value(self.points).hex()
+
+        self.assertEqual(self.field.to_python(value), self.points)
+
+    def test_can_keep_lists_and_empty_values(self):
+        self.assertEqual(self.field.to_python(self.points), self.points)
+        self.assertEqual(self.field.to_python(self.field.get_prep_value([])), [])
+        self.assertEqual(self.field.to_python('\\x'), [])
+        self.assertIsNone(self.field.from_db_value(None, None, None))
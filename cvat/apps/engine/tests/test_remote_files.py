@@ -0,0 +1,74 @@
+# Copyright (C) 2021 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import SimpleTestCase
+
+from cvat.apps.engine.task import _create_download_session, _download_file
+
+
+class _InterruptingRequestHandler(BaseHTTPRequestHandler):
+    # The first response is cut in the middle of the body,
+    # the next ones honor the Range header
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        content = server.content
+
+        range_header = self.headers.get('Range')
+        if range_header:
+            start = int(range_header[len('bytes='):].rstrip('-'))
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                start, len(content) - 1, len(content)))
+            body = content[start:]
+        else:
+            self.send_response(200)
+            body = content
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if len(server.requests) == 1:
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+        else:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        pass
+
+class DownloadFileTest(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _InterruptingRequestHandler)
+        self.server.content = os.urandom(3 * 2**20)
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_can_resume_interrupted_download(self):
+        url = 'http://127.0.0.1:{}/image.jpg'.format(self.server.server_port)
+        progress = []
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                _create_download_session(1) as session:
+            output_path = os.path.join(tmp_dir, 'image.jpg')
+            _download_file(session, url, output_path, progress.append)
+
+            with open(output_path, 'rb') as f:
+                self.assertEqual(f.read(), self.server.content)
+
+        self.assertEqual(sum(progress), len(self.server.content))
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.requests[1]['Range'],
+            'bytes={}-'.format(len(self.server.content) // 2))
+        self.assertEqual(self.server.requests[1]['Accept-Encoding'], 'identity')
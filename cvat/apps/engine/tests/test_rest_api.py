@@ -26,7 +26,7 @@ from django.http import HttpResponse
 from PIL import Image
 from pycocotools import coco as coco_loader
 from rest_framework import status
-from rest_framework.test import APIClient, APITestCase
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
 
 from datumaro.util.test_utils import TestDir
 from cvat.apps.engine.models import (AttributeSpec, AttributeType, Data, Job, Project,
@@ -378,6 +378,21 @@ class JobUpdateAPITestCase(APITestCase):
         response = self._run_api_v1_jobs_id(self.job.id + 10, None, data)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_api_v1_jobs_id_task_status(self):
+        db_jobs = list(Job.objects.filter(segment__task_id=self.task.id))
+        for db_job in db_jobs:
+            data = {"status": StatusChoice.COMPLETED, "assignee_id": self.owner.id}
+            response = self._run_api_v1_jobs_id(db_job.id, self.admin, data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, StatusChoice.COMPLETED)
+
+        data = {"status": StatusChoice.VALIDATION, "assignee_id": self.owner.id}
+        response = self._run_api_v1_jobs_id(db_jobs[0].id, self.admin, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, StatusChoice.VALIDATION)
+
 class JobPartialUpdateAPITestCase(JobUpdateAPITestCase):
     def _run_api_v1_jobs_id(self, jid, user, data):
         with ForceLogin(user, self.client):
@@ -4017,6 +4032,340 @@ class JobAnnotationAPITestCase(APITestCase):
     def test_api_v1_jobs_id_annotations_no_auth(self):
         self._run_api_v1_jobs_id_annotations(self.user, self.assignee, None)
 
+    def test_api_v1_jobs_id_annotations_updated_date(self):
+        task, jobs = self._create_task(self.admin, self.assignee)
+        db_task = Task.objects.get(pk=task["id"])
+        task_updated_date = db_task.updated_date
+        data = {
+            "version": 0,
+            "tags": [
+                {
+                    "frame": 0,
+                    "label_id": task["labels"][0]["id"],
+                    "group": None,
+                    "source": "manual",
+                    "attributes": []
+                }
+            ],
+            "shapes": [],
+            "tracks": []
+        }
+        response = self._put_api_v1_jobs_id_data(jobs[0]["id"], self.assignee, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # the task row is not updated, the change is tracked by the job
+        db_task.refresh_from_db()
+        self.assertEqual(db_task.updated_date, task_updated_date)
+        db_job = Job.objects.get(pk=jobs[0]["id"])
+        self.assertGreater(db_job.updated_date, task_updated_date)
+        self.assertEqual(db_task.get_updated_date(), db_job.updated_date)
+
+    def test_api_v1_jobs_id_annotations_update_in_place(self):
+        task, jobs = self._create_task(self.admin, self.assignee)
+        label_id = task["labels"][0]["id"]
+        data = {
+            "version": 0,
+            "tags": [],
+            "shapes": [
+                {
+                    "frame": 0,
+                    "label_id": label_id,
+                    "group": None,
+                    "source": "manual",
+                    "attributes": [],
+                    "points": [1.0, 2.1, 50.1, 30.22],
+                    "type": "rectangle",
+                    "occluded": False,
+                },
+            ],
+            "tracks": [
+                {
+                    "frame": 0,
+                    "label_id": label_id,
+                    "group": None,
+                    "source": "manual",
+                    "attributes": [],
+                    "shapes": [
+                        {
+                            "frame": 0,
+                            "attributes": [],
+                            "points": [1.0, 2.1, 100, 300.222],
+                            "type": "rectangle",
+                            "occluded": False,
+                            "outside": False,
+                        },
+                        {
+                            "frame": 2,
+                            "attributes": [],
+                            "points": [2.0, 4.1, 10, 30.222],
+                            "type": "rectangle",
+                            "occluded": False,
+                            "outside": True,
+                        },
+                    ]
+                },
+            ],
+        }
+        response = self._put_api_v1_jobs_id_data(jobs[0]["id"], self.assignee, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        data = response.data
+        shape_id = data["shapes"][0]["id"]
+        track_id = data["tracks"][0]["id"]
+        tracked_shape_ids = [shape["id"] for shape in data["tracks"][0]["shapes"]]
+        data["shapes"][0]["points"] = [2.0, 3.1, 51.1, 31.22]
+        data["tracks"][0]["shapes"][1]["outside"] = False
+        data["tracks"][0]["shapes"].append({
+            "frame": 4,
+            "attributes": [],
+            "points": [3.0, 5.1, 11, 31.222],
+            "type": "rectangle",
+            "occluded": False,
+            "outside": True,
+        })
+        response = self._patch_api_v1_jobs_id_data(jobs[0]["id"], self.assignee,
+            "update", data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self._get_api_v1_jobs_id_data(jobs[0]["id"], self.assignee)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["shapes"][0]["id"], shape_id)
+        self.assertEqual(response.data["shapes"][0]["points"], [2.0, 3.1, 51.1, 31.22])
+        self.assertEqual(response.data["tracks"][0]["id"], track_id)
+        shapes = response.data["tracks"][0]["shapes"]
+        self.assertEqual([shape["id"] for shape in shapes[:2]], tracked_shape_ids)
+        self.assertEqual([shape["outside"] for shape in shapes], [False, False, True])
+
+    def test_api_v1_jobs_id_annotations_track_attributes(self):
+        task, jobs = self._create_task(self.admin, self.assignee)
+        label = next(label for label in task["labels"] if label["name"] == "car")
+        specs = {attr["name"]: attr["id"] for attr in label["attributes"]}
+        data = {
+            "version": 0,
+            "tags": [],
+            "shapes": [],
+            "tracks": [
+                {
+                    "frame": 0,
+                    "label_id": label["id"],
+                    "group": None,
+                    "source": "manual",
+                    "attributes": [],
+                    "shapes": [
+                        {
+                            "frame": 0,
+                            "attributes": [
+                                {
+                                    "spec_id": specs["parked"],
+                                    "value": "true",
+                                },
+                            ],
+                            "points": [1.0, 2.1, 100, 300.222],
+                            "type": "rectangle",
+                            "occluded": False,
+                            "outside": False,
+                        },
+                        {
+                            "frame": 2,
+                            "attributes": [],
+                            "points": [2.0, 4.1, 10, 30.222],
+                            "type": "rectangle",
+                            "occluded": False,
+                            "outside": True,
+                        },
+                    ]
+                },
+            ],
+        }
+        response = self._put_api_v1_jobs_id_data(jobs[0]["id"], self.assignee, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self._get_api_v1_jobs_id_data(jobs[0]["id"], self.assignee)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        track = response.data["tracks"][0]
+        # immutable attributes get default values
+        self.assertEqual([(attr["spec_id"], attr["value"]) for attr in track["attributes"]],
+            [(specs["model"], "mazda")])
+        # mutable attributes are carried forward from the previous keyframe
+        for shape in track["shapes"]:
+            self.assertEqual([(attr["spec_id"], attr["value"]) for attr in shape["attributes"]],
+                [(specs["parked"], "true")])
+
+    def test_api_v1_jobs_id_annotations_track_bbox(self):
+        task, jobs = self._create_task(self.admin, self.assignee)
+        label_id = task["labels"][0]["id"]
+        def make_track(shapes):
+            return {
+                "frame": shapes[0][0],
+                "label_id": label_id,
+                "group": None,
+                "source": "manual",
+                "attributes": [],
+                "shapes": [
+                    {
+                        "frame": frame,
+                        "attributes": [],
+                        "points": points,
+                        "type": "rectangle",
+                        "occluded": False,
+                        "outside": outside,
+                    } for frame, points, outside in shapes
+                ]
+            }
+        data = {
+            "version": 0,
+            "tags": [],
+            "shapes": [],
+            "tracks": [
+                # is in the box only before the range
+                make_track([
+                    (0, [0, 0, 10, 10], False),
+                    (1, [200, 200, 210, 210], True),
+                ]),
+                # is interpolated into the box in the range
+                make_track([
+                    (0, [200, 200, 210, 210], False),
+                    (2, [20, 20, 30, 30], False),
+                ]),
+            ],
+        }
+        response = self._put_api_v1_jobs_id_data(jobs[0]["id"], self.assignee, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with ForceLogin(self.assignee, self.client):
+            response = self.client.get("/api/v1/jobs/{}/annotations".format(jobs[0]["id"]),
+                { "start_frame": 1, "stop_frame": 2, "bbox": "0,0,50,50" })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([track["shapes"][-1]["points"] for track in response.data["tracks"]],
+            [[20, 20, 30, 30]])
+
+    def test_api_v1_jobs_id_annotations_etag(self):
+        task, jobs = self._create_task(self.admin, self.assignee)
+        job_id = jobs[0]["id"]
+        response = self._get_api_v1_jobs_id_data(job_id, self.assignee)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+
+        with ForceLogin(self.assignee, self.client):
+            response = self.client.get("/api/v1/jobs/{}/annotations".format(job_id),
+                HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        data = {
+            "version": 0,
+            "tags": [
+                {
+                    "frame": 0,
+                    "label_id": task["labels"][0]["id"],
+                    "group": None,
+                    "source": "manual",
+                    "attributes": []
+                }
+            ],
+            "shapes": [],
+            "tracks": []
+        }
+        response = self._patch_api_v1_jobs_id_data(job_id, self.assignee, "create", data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with ForceLogin(self.assignee, self.client):
+            response = self.client.get("/api/v1/jobs/{}/annotations".format(job_id),
+                HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data["tags"]), 1)
+
+    def test_api_v1_jobs_id_annotations_etag_after_attribute_change(self):
+        task, jobs = self._create_task(self.admin, self.assignee)
+        job_id = jobs[0]["id"]
+        label = next(label for label in task["labels"] if label["name"] == "car")
+        model_spec = next(attr for attr in label["attributes"] if attr["name"] == "model")
+        data = {
+            "version": 0,
+            "tags": [
+                {
+                    "frame": 0,
+                    "label_id": label["id"],
+                    "group": None,
+                    "source": "manual",
+                    "attributes": []
+                }
+            ],
+            "shapes": [],
+            "tracks": []
+        }
+        response = self._put_api_v1_jobs_id_data(job_id, self.assignee, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self._get_api_v1_jobs_id_data(job_id, self.assignee)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+
+        # default values of attributes are applied when annotations are read
+        model_spec["default_value"] = "bmw"
+        with ForceLogin(self.admin, self.client):
+            response = self.client.patch("/api/v1/tasks/{}".format(task["id"]),
+                data={ "labels": [{ "id": label["id"], "name": label["name"],
+                    "attributes": [model_spec] }] }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with ForceLogin(self.assignee, self.client):
+            response = self.client.get("/api/v1/jobs/{}/annotations".format(job_id),
+                HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn({ "spec_id": model_spec["id"], "value": "bmw" },
+            [dict(attr) for attr in response.data["tags"][0]["attributes"]])
+
+    def test_api_v1_jobs_id_annotations_since_version(self):
+        task, jobs = self._create_task(self.admin, self.assignee)
+        job_id = jobs[0]["id"]
+        label_id = task["labels"][0]["id"]
+        shape = {
+            "frame": 0,
+            "label_id": label_id,
+            "group": None,
+            "source": "manual",
+            "attributes": [],
+            "points": [1.0, 2.1, 50.1, 30.22],
+            "type": "rectangle",
+            "occluded": False,
+        }
+        data = {"version": 0, "tags": [], "shapes": [shape, shape], "tracks": []}
+        response = self._put_api_v1_jobs_id_data(job_id, self.assignee, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        version = response.data["version"]
+        updated_shape, deleted_shape = response.data["shapes"]
+
+        updated_shape["occluded"] = True
+        response = self._patch_api_v1_jobs_id_data(job_id, self.assignee, "update",
+            {"version": version, "tags": [], "shapes": [updated_shape], "tracks": []})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self._patch_api_v1_jobs_id_data(job_id, self.assignee, "delete",
+            {"version": version, "tags": [], "shapes": [deleted_shape], "tracks": []})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self._patch_api_v1_jobs_id_data(job_id, self.assignee, "create",
+            {"version": version, "tags": [], "shapes": [shape], "tracks": []})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        created_shape = response.data["shapes"][0]
+
+        with ForceLogin(self.assignee, self.client):
+            response = self.client.get("/api/v1/jobs/{}/annotations?since_version={}".format(
+                job_id, version))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["version"], version + 3)
+        self.assertEqual([s["id"] for s in response.data["created"]["shapes"]],
+            [created_shape["id"]])
+        self.assertEqual([s["id"] for s in response.data["updated"]["shapes"]],
+            [updated_shape["id"]])
+        self.assertTrue(response.data["updated"]["shapes"][0]["occluded"])
+        self.assertEqual(response.data["deleted"]["shapes"], [deleted_shape["id"]])
+
+        with ForceLogin(self.assignee, self.client):
+            response = self.client.get("/api/v1/jobs/{}/annotations?since_version={}".format(
+                job_id, version + 4))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 class TaskAnnotationAPITestCase(JobAnnotationAPITestCase):
     def _put_api_v1_tasks_id_annotations(self, pk, user, data):
         with ForceLogin(user, self.client):
@@ -5222,6 +5571,59 @@ class TaskAnnotationAPITestCase(JobAnnotationAPITestCase):
     def test_api_v1_tasks_id_annotations_upload_coco_user(self):
         self._run_coco_annotation_upload_test(self.user)
 
+# Commits for annotations of deleted labels are added when the transaction
+# is committed, so the test case runs requests in real transactions
+class JobAnnotationLabelDeleteAPITestCase(APITransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        create_db_users(self)
+
+    _create_task = JobAnnotationAPITestCase._create_task
+    _put_api_v1_jobs_id_data = JobAnnotationAPITestCase._put_api_v1_jobs_id_data
+
+    def test_api_v1_jobs_id_annotations_since_version_after_label_delete(self):
+        task, jobs = self._create_task(self.admin, self.assignee)
+        job_id = jobs[0]["id"]
+        label = task["labels"][0]
+        data = {
+            "version": 0,
+            "tags": [],
+            "shapes": [
+                {
+                    "frame": 0,
+                    "label_id": label["id"],
+                    "group": None,
+                    "source": "manual",
+                    "attributes": [],
+                    "points": [1.0, 2.1, 50.1, 30.22],
+                    "type": "rectangle",
+                    "occluded": False,
+                },
+            ],
+            "tracks": []
+        }
+        response = self._put_api_v1_jobs_id_data(job_id, self.assignee, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        version = response.data["version"]
+
+        with ForceLogin(self.admin, self.client):
+            response = self.client.patch("/api/v1/tasks/{}".format(task["id"]),
+                data={ "labels": [{ "id": label["id"], "name": label["name"],
+                    "deleted": True }] }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # the removed shape isn't known as deleted, the client has to reload
+        with ForceLogin(self.assignee, self.client):
+            response = self.client.get("/api/v1/jobs/{}/annotations?since_version={}".format(
+                job_id, version))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with ForceLogin(self.assignee, self.client):
+            response = self.client.get("/api/v1/jobs/{}/annotations".format(job_id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(response.data["version"], version)
+        self.assertEqual(response.data["shapes"], [])
+
 class ServerShareAPITestCase(APITestCase):
     def setUp(self):
         self.client = APIClient()
@@ -0,0 +1,70 @@
+# Copyright (C) 2021 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import errno
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from cvat.apps.engine.task import _ShareFileCopier
+
+
+class ShareFileCopierTest(SimpleTestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+
+        self.files = []
+        for name in ('1.jpg', '2.jpg'):
+            source_path = os.path.join(self.tmp_dir, name)
+            with open(source_path, 'wb') as f:
+                f.write(name.encode())
+            self.files.append((source_path, os.path.join(self.tmp_dir, 'copy_' + name)))
+
+    def _copy_files(self, link_errno, reflink_errno=errno.EOPNOTSUPP):
+        self.reflink_calls = 0
+        def _reflink(source_path, target_path):
+            self.reflink_calls += 1
+            raise OSError(reflink_errno, os.strerror(reflink_errno))
+
+        os_link = os.link
+        def link(source_path, target_path):
+            # The first file can't be linked
+            if source_path == self.files[0][0]:
+                raise OSError(link_errno, os.strerror(link_errno))
+            os_link(source_path, target_path)
+
+        with mock.patch.object(_ShareFileCopier, '_reflink', staticmethod(_reflink)), \
+                mock.patch('os.link', link):
+            copier = _ShareFileCopier()
+            for source_path, target_path in self.files:
+                copier(source_path, target_path)
+
+        for source_path, target_path in self.files:
+            with open(source_path, 'rb') as source_file, \
+                    open(target_path, 'rb') as target_file:
+                self.assertEqual(source_file.read(), target_file.read())
+        return copier.stats
+
+    def test_permission_error_falls_back_for_one_file(self):
+        stats = self._copy_files(errno.EPERM)
+
+        self.assertEqual(stats['link'], 1)
+        self.assertEqual(stats['copyfile'], 1)
+
+    def test_cross_device_error_disables_links(self):
+        stats = self._copy_files(errno.EXDEV)
+
+        self.assertEqual(stats['link'], 0)
+        self.assertEqual(stats['copyfile'], 2)
+
+    def test_ioctl_error_disables_reflinks(self):
+        # e.g. ext4 doesn't support the FICLONE ioctl
+        stats = self._copy_files(errno.EXDEV, reflink_errno=errno.ENOTTY)
+
+        self.assertEqual(self.reflink_calls, 1)
+        self.assertEqual(stats['copyfile'], 2)
@@ -14,6 +14,7 @@ import os
 from av import VideoFrame
 from PIL import Image
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 
 Import = namedtuple("Import", ["module", "name", "alias"])
@@ -105,4 +106,19 @@ def parse_specific_attributes(specific_attributes):
     return {
         item.split('=')[0].strip(): item.split('=')[1].strip()
             for item in specific_attributes.split('&')
-    } if specific_attributes else dict()
\ No newline at end of file
+    } if specific_attributes else dict()
+
+def bulk_create(db_model, objects, flt_param):
+    if objects:
+        if flt_param:
+            if 'postgresql' in settings.DATABASES["default"]["ENGINE"]:
+                return db_model.objects.bulk_create(objects)
+            else:
+                ids = list(db_model.objects.filter(**flt_param).values_list('id', flat=True))
+                db_model.objects.bulk_create(objects)
+
+                return list(db_model.objects.exclude(id__in=ids).filter(**flt_param))
+        else:
+            return db_model.objects.bulk_create(objects)
+
+    return []
@@ -15,6 +15,7 @@ from distutils.util import strtobool
 from tempfile import mkstemp, NamedTemporaryFile
 
 import cv2
+from django.db.models import Max
 from django.db.models.query import Prefetch
 import django_rq
 from django.apps import apps
@@ -25,6 +26,7 @@ from django.http import HttpResponse, HttpResponseNotFound, HttpResponseBadReque
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags
 from django_filters import rest_framework as filters
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg import openapi
@@ -290,7 +292,8 @@ class ProjectViewSet(auth.ProjectGetQuerySetMixin, viewsets.ModelViewSet):
     @action(detail=True, methods=['GET'], serializer_class=TaskSerializer)
     def tasks(self, request, pk):
         self.get_object() # force to call check_object_permissions
-        queryset = Task.objects.filter(project_id=pk).order_by('-id')
+        queryset = Task.objects.filter(project_id=pk) \
+            .annotate(jobs_updated_date=Max('segment__job__updated_date')).order_by('-id')
         queryset = auth.filter_task_queryset(queryset, request.user)
 
         page = self.paginate_queryset(queryset)
@@ -420,7 +423,7 @@ class TaskViewSet(auth.TaskGetQuerySetMixin, viewsets.ModelViewSet):
     queryset = Task.objects.all().prefetch_related(
             "label_set__attributespec_set",
             "segment_set__job_set",
-        ).order_by('-id')
+        ).annotate(jobs_updated_date=Max('segment__job__updated_date')).order_by('-id')
     serializer_class = TaskSerializer
     search_fields = ("name", "owner__username", "mode", "status")
     filterset_class = TaskFilter
@@ -522,7 +525,7 @@ class TaskViewSet(auth.TaskGetQuerySetMixin, viewsets.ModelViewSet):
 
             rq_job = queue.fetch_job(rq_id)
             if rq_job:
-                last_task_update_time = timezone.localtime(db_task.updated_date)
+                last_task_update_time = timezone.localtime(db_task.get_updated_date())
                 request_time = rq_job.meta.get('request_time', None)
                 if request_time is None or request_time < last_task_update_time:
                     rq_job.cancel()
@@ -781,10 +784,14 @@ class TaskViewSet(auth.TaskGetQuerySetMixin, viewsets.ModelViewSet):
                     filename=request.query_params.get("filename", "").lower(),
                 )
             else:
+                etag = dm.task.get_task_data_etag(pk)
+                if _etag_matches(request, etag):
+                    return Response(status=status.HTTP_304_NOT_MODIFIED,
+                        headers={'ETag': etag})
                 data = dm.task.get_task_data(pk)
                 serializer = LabeledDataSerializer(data=data)
                 if serializer.is_valid(raise_exception=True):
-                    return Response(serializer.data)
+                    return Response(serializer.data, headers={'ETag': etag})
         elif request.method == 'PUT':
             format_name = request.query_params.get('format')
             if format_name:
@@ -930,7 +937,19 @@ class JobViewSet(viewsets.GenericViewSet,
 
         return [perm() for perm in permissions]
 
-    @swagger_auto_schema(method='get', operation_summary='Method returns annotations for a specific job')
+    @swagger_auto_schema(method='get', operation_summary='Method returns annotations for a specific job',
+        manual_parameters=[
+            openapi.Parameter('since_version', in_=openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                required=False, description='Return only objects created, updated and deleted after the version'),
+            openapi.Parameter('start_frame', in_=openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                required=False, description='Return only objects visible on frames starting from the frame'),
+            openapi.Parameter('stop_frame', in_=openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                required=False, description='Return only objects visible on frames up to the frame'),
+            openapi.Parameter('bbox', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                required=False, description='Return only objects which intersect the box "x1,y1,x2,y2". '
+                    'Unlike the frame range, the box is checked on the server after all objects '
+                    'in the range are read from the database, so it reduces only the response size'),
+        ])
     @swagger_auto_schema(method='put', operation_summary='Method performs an update of all annotations in a specific job')
     @swagger_auto_schema(method='patch', manual_parameters=[
         openapi.Parameter('action', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
@@ -942,8 +961,32 @@ class JobViewSet(viewsets.GenericViewSet,
     def annotations(self, request, pk):
         self.get_object() # force to call check_object_permissions
         if request.method == 'GET':
-            data = dm.task.get_job_data(pk)
-            return Response(data)
+            since_version = request.query_params.get('since_version')
+            if since_version is not None:
+                try:
+                    data = dm.task.get_job_data_changes(pk, int(since_version))
+                except ValueError as e:
+                    return Response(data=str(e), status=status.HTTP_400_BAD_REQUEST)
+                return Response(data)
+
+            try:
+                start_frame = request.query_params.get('start_frame')
+                start_frame = int(start_frame) if start_frame is not None else None
+                stop_frame = request.query_params.get('stop_frame')
+                stop_frame = int(stop_frame) if stop_frame is not None else None
+                bbox = request.query_params.get('bbox')
+                bbox = [float(v) for v in bbox.split(',')] if bbox is not None else None
+                if bbox is not None and len(bbox) != 4:
+                    raise ValueError("bbox must contain 4 values: x1,y1,x2,y2")
+            except ValueError as e:
+                return Response(data=str(e), status=status.HTTP_400_BAD_REQUEST)
+
+            etag = dm.task.get_job_data_etag(pk)
+            if _etag_matches(request, etag):
+                return Response(status=status.HTTP_304_NOT_MODIFIED,
+                    headers={'ETag': etag})
+            data = dm.task.get_job_data(pk, start_frame, stop_frame, bbox)
+            return Response(data, headers={'ETag': etag})
         elif request.method == 'PUT':
             format_name = request.query_params.get("format", "")
             if format_name:
@@ -1510,6 +1553,10 @@ def rq_handler(job, exc_type, exc_value, tb):
 
     return True
 
+def _etag_matches(request, etag):
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return etag in etags or '*' in etags
+
 # TODO: Method should be reimplemented as a separated view
 # @swagger_auto_schema(method='put', manual_parameters=[openapi.Parameter('format', in_=openapi.IN_QUERY,
 #         description='A name of a loader\nYou can get annotation loaders from this API:\n/server/annotation/formats',
@@ -1591,10 +1638,7 @@ def _export_annotations(db_instance, rq_id, request, format_name, action, callba
 
     rq_job = queue.fetch_job(rq_id)
     if rq_job:
-        last_instance_update_time = timezone.localtime(db_instance.updated_date)
-        if isinstance(db_instance, Project):
-            tasks_update = list(map(lambda db_task: timezone.localtime(db_task.updated_date), db_instance.tasks.all()))
-            last_instance_update_time = max(tasks_update + [last_instance_update_time])
+        last_instance_update_time = timezone.localtime(db_instance.get_updated_date())
         request_time = rq_job.meta.get('request_time', None)
         if request_time is None or request_time < last_instance_update_time:
             rq_job.cancel()
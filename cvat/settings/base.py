@@ -374,6 +374,11 @@ os.makedirs(MIGRATIONS_LOGS_ROOT, exist_ok=True)
 CLOUD_STORAGE_ROOT = os.path.join(DATA_ROOT, 'storages')
 os.makedirs(CLOUD_STORAGE_ROOT, exist_ok=True)
 
+# The endpoint of an S3-compatible storage (e.g. MinIO), which is used by
+# AWS S3 cloud storages instead of AWS. It can be set only by the server
+# administrator, users can't make the server send requests to other hosts.
+CLOUD_STORAGE_S3_ENDPOINT_URL = os.getenv('CVAT_CLOUD_STORAGE_S3_ENDPOINT_URL') or None
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -447,6 +452,20 @@ DATA_UPLOAD_MAX_NUMBER_FIELDS = None   # this django check disabled
 LOCAL_LOAD_MAX_FILES_COUNT = 500
 LOCAL_LOAD_MAX_FILES_SIZE = 512 * 1024 * 1024  # 512 MB
 
+# Task creation from remote URLs: number of parallel downloads and
+# number of retries for a failed download
+REMOTE_FILES_DOWNLOAD_WORKERS = 8
+REMOTE_FILES_DOWNLOAD_RETRIES = 5
+
+# Number of parallel workers to copy files from the share when they
+# cannot be reflinked or hardlinked
+SHARE_COPY_WORKERS = 8
+
+# Resolution of images rendered from PDF pages and number of pages
+# rendered in parallel
+PDF_RENDERING_DPI = 200
+PDF_RENDERING_THREADS = 4
+
 RESTRICTIONS = {
     'user_agreements': [],
 
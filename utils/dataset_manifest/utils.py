@@ -39,11 +39,14 @@ def is_image(media_file):
         not data_type.startswith('image/svg')
 
 
-def _list_and_join(root):
-    files = os.listdir(root)
+def _list_and_join(root, scanner=None):
+    files = scanner.listdir(root) if scanner else os.listdir(root)
     for f in files:
         yield os.path.join(root, f)
 
+def _isdir(path, scanner=None):
+    return scanner.isdir(path) if scanner else os.path.isdir(path)
+
 def _prepare_context_list(files, base_dir):
     return sorted(map(lambda x: os.path.relpath(x, base_dir), filter(is_image, files)))
 
@@ -54,7 +57,7 @@ def _prepare_context_list(files, base_dir):
 #     00001_png/
 #       context_image_1.jpeg
 #       context_image_2.png
-def _detect_related_images_2D(image_paths, root_path):
+def _detect_related_images_2D(image_paths, root_path, scanner=None):
     related_images = {}
     latest_dirname = ''
     related_images_exist = False
@@ -70,15 +73,15 @@ def _detect_related_images_2D(image_paths, root_path):
         elif latest_dirname != dirname:
             # Update some data applicable for a subset of paths (within the current dirname)
             latest_dirname = dirname
-            related_images_exist = os.path.isdir(related_images_dirname)
+            related_images_exist = _isdir(related_images_dirname, scanner)
 
         if related_images_exist:
             related_images_dirname = os.path.join(
                 related_images_dirname, '_'.join(os.path.basename(image_path).rsplit('.', 1))
             )
 
-            if os.path.isdir(related_images_dirname):
-                related_images[rel_image_path] = _prepare_context_list(_list_and_join(related_images_dirname), root_path)
+            if _isdir(related_images_dirname, scanner):
+                related_images[rel_image_path] = _prepare_context_list(_list_and_join(related_images_dirname, scanner), root_path)
     return related_images
 
 # Possible 3D formats are:
@@ -107,7 +110,7 @@ def _detect_related_images_2D(image_paths, root_path):
 #        image_1.pcd
 #        context_1.png
 #        context_2.jpg
-def _detect_related_images_3D(image_paths, root_path):
+def _detect_related_images_3D(image_paths, root_path, scanner=None):
     related_images = {}
     latest_dirname = ''
     dirname_files = []
@@ -124,11 +127,11 @@ def _detect_related_images_3D(image_paths, root_path):
         if latest_dirname != dirname:
             # Update some data applicable for a subset of paths (within the current dirname)
             latest_dirname = dirname
-            related_images_exist = os.path.isdir(related_images_dirname)
-            dirname_files = list(_list_and_join(dirname))
+            related_images_exist = _isdir(related_images_dirname, scanner)
+            dirname_files = list(_list_and_join(dirname, scanner))
             velodyne_context_images_dirs = [directory for directory
-                in _list_and_join(os.path.normpath(os.path.join(dirname, '..', '..')))
-                if os.path.isdir(os.path.join(directory, 'data')) and re.search(r'image_\d.*', directory, re.IGNORECASE)
+                in _list_and_join(os.path.normpath(os.path.join(dirname, '..', '..')), scanner)
+                if _isdir(os.path.join(directory, 'data'), scanner) and re.search(r'image_\d.*', directory, re.IGNORECASE)
             ]
 
         filtered_dirname_files = list(filter(lambda x: x != image_path, dirname_files))
@@ -147,15 +150,15 @@ def _detect_related_images_3D(image_paths, root_path):
             related_images_dirname = os.path.join(
                 related_images_dirname, '_'.join(os.path.basename(image_path).rsplit('.', 1))
             )
-            if os.path.isdir(related_images_dirname):
+            if _isdir(related_images_dirname, scanner):
                 related_images[rel_image_path].extend(
-                    _prepare_context_list(_list_and_join(related_images_dirname), root_path)
+                    _prepare_context_list(_list_and_join(related_images_dirname, scanner), root_path)
                 )
 
         if dirname.endswith(os.path.join('velodyne_points', 'data')):
             # velodynepoints format
             for context_images_dir in velodyne_context_images_dirs:
-                context_files = _list_and_join(os.path.join(context_images_dir, 'data'))
+                context_files = _list_and_join(os.path.join(context_images_dir, 'data'), scanner)
                 context_files = list(
                     filter(lambda x: os.path.splitext(os.path.basename(x))[0] == name, context_files)
                 )
@@ -169,7 +172,9 @@ def _detect_related_images_3D(image_paths, root_path):
 # This function is expected to be called only for images tasks
 # image_path is expected to be a list of absolute path to images
 # root_path is expected to be a string (dataset root)
-def detect_related_images(image_paths, root_path):
+# scanner is an optional object with listdir(path) and isdir(path) methods,
+# which can be used to avoid listing of the same directories again
+def detect_related_images(image_paths, root_path, scanner=None):
     data_are_2d = False
     data_are_3d = False
 
@@ -183,7 +188,7 @@ def detect_related_images(image_paths, root_path):
     assert not (data_are_3d and data_are_2d), 'Combined data types 2D and 3D are not supported'
 
     if data_are_2d:
-        return _detect_related_images_2D(image_paths, root_path)
+        return _detect_related_images_2D(image_paths, root_path, scanner)
     elif data_are_3d:
-        return _detect_related_images_3D(image_paths, root_path)
+        return _detect_related_images_3D(image_paths, root_path, scanner)
     return {}